@@ -0,0 +1,225 @@
+""" In-memory EC2 and STS backend for offline benchmarks
+
+Answers botocore requests from a synthetic inventory, before anything
+is sent over the network, and counts API calls per operation. Filter
+values may use EC2 wildcards (see filters.from_wildcard). Created images
+and instances settle on the first describe call that sees them, so
+waiters finish in a single tick.
+
+Usage:
+    backend = Backend(instances=1000)
+    backend.install(boto3_session)
+"""
+
+import datetime
+import threading
+import collections
+
+from saw import filters
+
+
+def synthetic_instance(n, state='running'):
+    """Instance dict shaped like a describe_instances result"""
+    ip = '10.{}.{}.{}'.format(n // 65536 % 256, n // 256 % 256, n % 256)
+    return {
+        'InstanceId': 'i-{:017x}'.format(n),
+        'ImageId': 'ami-{:08x}'.format(n % 50),
+        'InstanceType': 't2.micro',
+        'KeyName': 'deploy',
+        'LaunchTime': datetime.datetime(2017, 1, 1) +
+                      datetime.timedelta(minutes=n),
+        'Placement': {'AvailabilityZone': 'us-east-1a', 'GroupName': '',
+                      'Tenancy': 'default'},
+        'PrivateDnsName': 'ip-{}.ec2.internal'.format(ip.replace('.', '-')),
+        'PrivateIpAddress': ip,
+        'PublicDnsName': '',
+        'PublicIpAddress': '54.0.{}.{}'.format(n // 256 % 256, n % 256),
+        'State': {'Code': 16, 'Name': state},
+        'SubnetId': 'subnet-0a1b2c3d',
+        'VpcId': 'vpc-0a1b2c3d',
+        'Architecture': 'x86_64',
+        'BlockDeviceMappings': [{
+            'DeviceName': '/dev/sda1',
+            'Ebs': {'AttachTime': datetime.datetime(2017, 1, 1),
+                    'DeleteOnTermination': True, 'Status': 'attached',
+                    'VolumeId': 'vol-{:017x}'.format(n)}}],
+        'NetworkInterfaces': [{
+            'NetworkInterfaceId': 'eni-{:017x}'.format(n),
+            'PrivateIpAddress': ip,
+            'Groups': [{'GroupId': 'sg-0a1b2c3d', 'GroupName': 'default'}],
+            'Status': 'in-use'}],
+        'SecurityGroups': [{'GroupId': 'sg-0a1b2c3d',
+                            'GroupName': 'default'}],
+        'Tags': [{'Key': 'Name', 'Value': 'web{}'.format(n)},
+                 {'Key': 'User', 'Value': 'dev'}]
+    }
+
+def synthetic_image(n, name=None, state='available'):
+    """Image dict shaped like a describe_images result"""
+    return {
+        'ImageId': 'ami-{:08x}'.format(n),
+        'Name': name or 'golden-{}'.format(n),
+        'State': state,
+        'CreationDate': '2017-01-01T00:00:00.000Z',
+        'Description': '',
+        'Architecture': 'x86_64'
+    }
+
+
+class Response(object):
+    """HTTP response stand-in accepted by botocore"""
+    status_code = 200
+    headers = {}
+
+
+class Backend(object):
+    """Synthetic EC2 inventory, serving requests of botocore clients
+
+    Attributes:
+        instances (list): Instance dicts, in launch order
+        images (list): Image dicts
+        addresses (list): Elastic IP address dicts
+        calls (Counter): Operation name -> number of calls
+    """
+
+    def __init__(self, instances=0, images=50):
+        self.instances = [synthetic_instance(n) for n in range(instances)]
+        self.images = [synthetic_image(n) for n in range(images)]
+        self.addresses = []
+        self.calls = collections.Counter()
+        self.selection = (None, None)
+        self.lock = threading.Lock()
+
+    def install(self, session):
+        """Serve all requests of clients created from a boto3 session"""
+        events = session._session.get_component('event_emitter')
+        events.register('before-parameter-build', self.keep_params)
+        events.register('before-call', self.respond)
+
+    def keep_params(self, params, context, **kwargs):
+        context['api_params'] = params
+
+    def respond(self, model, context, **kwargs):
+        handler = getattr(self, model.name, None)
+        if handler is None:
+            raise NotImplementedError(model.name)
+        # Requests come from several threads at once
+        with self.lock:
+            self.calls[model.name] += 1
+            return Response(), handler(dict(context['api_params']))
+
+    # Filtering and pagination
+
+    def value(self, resource, name):
+        """Values of a resource for an EC2 filter name"""
+        if name.startswith('tag:'):
+            return [t['Value'] for t in resource.get('Tags', [])
+                    if t['Key'] == name[len('tag:'):]]
+        getters = {
+            'instance-id': lambda r: r['InstanceId'],
+            'instance-state-name': lambda r: r['State']['Name'],
+            'instance-type': lambda r: r['InstanceType'],
+            'image-id': lambda r: r['ImageId'],
+            'name': lambda r: r['Name'],
+            'state': lambda r: r['State']
+        }
+        return [getters[name](resource)]
+
+    def select(self, resources, params, ids_param, id_key):
+        # Later pages of a listing reuse the selection of its first page
+        key = (id(resources), repr(params.get(ids_param)),
+               repr(params.get('Filters')))
+        if params.get('NextToken') and key == self.selection[0]:
+            return self.selection[1]
+        found = self.match(resources, params, ids_param, id_key)
+        self.selection = (key, found)
+        return found
+
+    def matcher(self, values):
+        """Test of a value against filter values, with EC2 wildcards"""
+        exact = set(v for v in values if not any(c in v for c in '*?\\'))
+        patterns = [filters.from_wildcard(v).match for v in values
+                    if v not in exact]
+        return lambda v: v in exact or any(p(v) for p in patterns)
+
+    def match(self, resources, params, ids_param, id_key):
+        ids = set(params.get(ids_param) or [])
+        tests = [(f['Name'], self.matcher(f['Values']))
+                 for f in params.get('Filters', [])]
+        return [r for r in resources
+                if (not ids or r[id_key] in ids) and
+                all(any(test(v) for v in self.value(r, name))
+                    for name, test in tests)]
+
+    def page(self, resources, params):
+        start = int(params.get('NextToken') or 0)
+        size = params.get('MaxResults') or len(resources) or 1
+        token = start + size
+        return resources[start:token], (str(token)
+                                         if token < len(resources) else None)
+
+    def settle(self, resources, state):
+        for r in resources:
+            if isinstance(r['State'], dict):
+                if r['State']['Name'] == 'pending':
+                    r['State'] = {'Code': 16, 'Name': state}
+            elif r['State'] == 'pending':
+                r['State'] = state
+
+    # EC2
+
+    def DescribeInstances(self, params):
+        found = self.select(self.instances, params, 'InstanceIds',
+                            'InstanceId')
+        found, token = self.page(found, params)
+        response = {'Reservations': [{'Instances': list(found)}]}
+        self.settle(found, 'running')
+        if token:
+            response['NextToken'] = token
+        return response
+
+    def DescribeImages(self, params):
+        found = self.select(self.images, params, 'ImageIds', 'ImageId')
+        response = {'Images': list(found)}
+        self.settle(found, 'available')
+        return response
+
+    def RunInstances(self, params):
+        created = []
+        for _ in range(params['MaxCount']):
+            instance = synthetic_instance(len(self.instances), 'pending')
+            instance['ImageId'] = params['ImageId']
+            for spec in params.get('TagSpecifications', []):
+                instance['Tags'] = list(spec['Tags'])
+            self.instances.append(instance)
+            created.append(instance)
+        return {'Instances': [dict(i) for i in created]}
+
+    def CreateImage(self, params):
+        image = synthetic_image(len(self.images), params['Name'], 'pending')
+        self.images.append(image)
+        return {'ImageId': image['ImageId']}
+
+    def DescribeAddresses(self, params):
+        return {'Addresses': [dict(a) for a in self.addresses]}
+
+    def AllocateAddress(self, params):
+        n = len(self.addresses)
+        address = {'PublicIp': '52.0.{}.{}'.format(n // 256 % 256, n % 256),
+                   'AllocationId': 'eipalloc-{:017x}'.format(n),
+                   'Domain': params.get('Domain', 'standard')}
+        self.addresses.append(address)
+        return dict(address)
+
+    def AssociateAddress(self, params):
+        address = [a for a in self.addresses
+                   if a['AllocationId'] == params['AllocationId']][0]
+        address['InstanceId'] = params['InstanceId']
+        address['AssociationId'] = 'eipassoc-' + address['AllocationId'][9:]
+        return {'AssociationId': address['AssociationId']}
+
+    # STS
+
+    def GetCallerIdentity(self, params):
+        return {'Account': '000000000000', 'UserId': 'AIDA0000000000000000',
+                'Arn': 'arn:aws:iam::000000000000:user/dev'}
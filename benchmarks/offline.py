@@ -0,0 +1,251 @@
+""" Offline benchmark suite
+
+Runs listings, filtering, name resolution, launches, publishing,
+Elastic IP assignment and listings answered by a warm daemon against an
+in-memory EC2/STS backend (see backend.py), for synthetic inventories of 100 to 100k instances. Each
+scenario and size runs in a fresh interpreter, reporting wall time, API
+calls and peak memory.
+
+Results are compared with the stored baseline, failing on regressions:
+any extra API call, or time or memory over their tolerance.
+
+Usage:
+    python benchmarks/offline.py [--sizes=SIZES] [--scenarios=NAMES]
+                                 [--save]
+
+Attributes:
+    SIZES (list): Default inventory sizes
+    BASELINE (string): Path of the stored baseline
+    TIME_TOLERANCE (tuple): Allowed time, as (factor, seconds) over baseline
+    MEMORY_TOLERANCE (tuple): Allowed memory, as (factor, MB) over baseline
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SIZES = [100, 1000, 10000, 100000]
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+TIME_TOLERANCE = (1.5, 0.05)
+MEMORY_TOLERANCE = (1.25, 5)
+
+
+def list_instances(size):
+    from saw import tabularize
+    from saw.config import config
+    tabularize.instances(page_size=config['page_size'])
+
+def filter_instances(size):
+    from saw import helpers, filters, tabularize
+    query = helpers.generate_filters({
+        'instances': True, 'filter': True, '--state': 'running',
+        '--image': 'golden-7', '--user': 'dev',
+        '--where': 'type~t2.* AND name!=web7'})
+    tabularize.instances(Filters=query.filters,
+                         predicate=filters.predicate(query))
+
+def resolve_names(size):
+    from saw import helpers
+    names = ['web{}'.format(n) for n in range(0, size, max(size // 100, 1))]
+    ids = helpers.instance_ids_from_names(names)
+    helpers.instance_names_from_ids(ids)
+    helpers.instance_ids_from_names(names)
+
+def launch(size):
+    from saw import saw
+    count = min(max(size // 100, 1), 1000)
+    saw.launch_instances({'--name': ['app{}'.format(n % 10)
+                                     for n in range(count)]})
+
+def publish(size):
+    from saw import saw
+    saw.publish({'--source': 'web0', '--dest': ['prod-a', 'prod-b'],
+                 '--count': '2', '--no-reboot': True})
+
+def assign(size):
+    from saw import saw
+    saw.assign_elastic_ips(['i-{:017x}'.format(n)
+                            for n in range(min(size, 50))])
+
+def serve(size):
+    import threading
+    from saw import saw, daemon
+    path = os.path.join(tempfile.mkdtemp(), 'saw.sock')
+    server = threading.Thread(target=daemon.serve, args=(saw.main, path))
+    server.daemon = True
+    server.start()
+    while not os.path.exists(path):
+        time.sleep(0.001)
+    # The second listing is answered from memory
+    for _ in range(2):
+        daemon.forward(['instances', 'filter', '--name=web7',
+                        '--output=csv'], path)
+
+SCENARIOS = [
+    ('list', list_instances),
+    ('filter', filter_instances),
+    ('resolve', resolve_names),
+    ('launch', launch),
+    ('publish', publish),
+    ('assign', assign),
+    ('serve', serve)
+]
+
+
+def proc_memory(field):
+    """A memory figure of this process from /proc/self/status, in MB"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024.0
+    raise IOError('No {} in /proc/self/status'.format(field))
+
+def reset_peak_memory():
+    """Reset the peak resident memory to the current one (Linux)
+
+    Imports and the backend's inventory reach their peak before the
+    scenario runs, so the peak since the process started says nothing
+    about the scenario itself.
+
+    Returns:
+        float: Resident memory the peak starts from, in MB
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return proc_memory('VmRSS')
+    except IOError:
+        return peak_memory()
+
+def peak_memory():
+    """Peak resident memory of this process, in MB
+
+    Since reset_peak_memory on Linux, since the process started
+    elsewhere.
+    """
+    try:
+        return proc_memory('VmHWM')
+    except IOError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def run(name, size):
+    """Run a scenario in this process and print measurements as JSON"""
+    import boto3
+    from backend import Backend
+    from saw import cache, clients, identity, scheduler
+    from saw.config import config
+
+    backend = Backend(instances=size)
+    session = boto3.Session(region_name='us-east-1',
+                            aws_access_key_id='offline',
+                            aws_secret_access_key='offline')
+    backend.install(session)
+    scheduler.install(session)
+    clients.sessions[None] = session
+    config['waiter'].update(delay=0.001, max_delay=0.001)
+    for bucket in config['scheduler']['buckets'].values():
+        bucket.update(rate=100000, burst=100000)
+    config['cache']['mode'] = 'refresh'
+    cache.CACHE_DIR = tempfile.mkdtemp()
+    identity.IDENTITY_DIR = cache.CACHE_DIR
+    # Load service models up front, leaving them out of measurements
+    clients.client('ec2')
+    clients.client('sts')
+
+    scenario = dict(SCENARIOS)[name]
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        gc.collect()
+        before = reset_peak_memory()
+        start = time.time()
+        scenario(size)
+        elapsed = time.time() - start
+    finally:
+        sys.stdout = stdout
+        shutil.rmtree(cache.CACHE_DIR, ignore_errors=True)
+    print json.dumps({'seconds': round(elapsed, 4),
+                      'calls': sum(backend.calls.values()),
+                      'memory': round(peak_memory() - before, 1)})
+
+def measure(name, size):
+    """Measure a scenario in a fresh interpreter"""
+    out = subprocess.check_output([sys.executable, __file__,
+                                   '--run=' + name,
+                                   '--sizes={}'.format(size)])
+    return json.loads(out.strip().splitlines()[-1])
+
+def regressions(result, baseline):
+    """Describe how a result regressed from its baseline"""
+    problems = []
+    if result['calls'] > baseline['calls']:
+        problems.append('{} API calls (baseline {})'.format(
+            result['calls'], baseline['calls']))
+    factor, slack = TIME_TOLERANCE
+    if result['seconds'] > baseline['seconds'] * factor + slack:
+        problems.append('{:.3f} s (baseline {:.3f} s)'.format(
+            result['seconds'], baseline['seconds']))
+    factor, slack = MEMORY_TOLERANCE
+    if result['memory'] > baseline['memory'] * factor + slack:
+        problems.append('{:.1f} MB (baseline {:.1f} MB)'.format(
+            result['memory'], baseline['memory']))
+    return problems
+
+def main():
+    sizes = SIZES
+    names = [name for name, _ in SCENARIOS]
+    save = False
+    run_name = None
+    for arg in sys.argv[1:]:
+        if arg.startswith('--sizes='):
+            sizes = [int(s) for s in arg.split('=', 1)[1].split(',')]
+        elif arg.startswith('--scenarios='):
+            names = arg.split('=', 1)[1].split(',')
+        elif arg.startswith('--run='):
+            run_name = arg.split('=', 1)[1]
+        elif arg == '--save':
+            save = True
+    if run_name:
+        run(run_name, sizes[0])
+        return
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+
+    failed = False
+    print "{:8} {:>7} {:>9} {:>6} {:>9}".format('scenario', 'size', 'time',
+                                              'calls', 'memory')
+    for name in names:
+        for size in sizes:
+            result = measure(name, size)
+            print "{:8} {:>7} {:>7.3f} s {:>6} {:>6.1f} MB".format(
+                name, size, result['seconds'], result['calls'],
+                result['memory'])
+            expected = baseline.get(name, {}).get(str(size))
+            problems = regressions(result, expected) if expected else []
+            if problems:
+                failed = True
+                print "    Regression: {}".format(', '.join(problems))
+            if save:
+                baseline.setdefault(name, {})[str(size)] = result
+
+    if save:
+        with open(BASELINE, 'w') as f:
+            json.dump(baseline, f, indent=4, sort_keys=True)
+            f.write('\n')
+        print "Baseline saved to {}".format(BASELINE)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+""" Listing memory and time benchmark
+
+Builds a synthetic describe_instances response of 50k instances, in pages
+of 1000, and turns it into listing rows in two ways, each in a fresh
+interpreter:
+
+- full: keeps the whole response, then extracts every row from it
+  (how listings used to be built)
+- projected: projects each page into records as it arrives and drops it
+  (records.project)
+
+Reports wall time and peak memory of each, and fails unless projection
+is lighter on both.
+
+Usage:
+    python benchmarks/records.py [--instances=N]
+"""
+
+import os
+import sys
+import time
+import json
+import resource
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend import synthetic_instance
+from saw import records
+from saw.config import config
+
+PAGE_SIZE = 1000
+MODES = ['full', 'projected']
+
+
+def pages(count):
+    """Generate describe_instances pages, as the paginator would"""
+    for start in range(0, count, PAGE_SIZE):
+        stop = min(start + PAGE_SIZE, count)
+        yield {'Reservations': [{'Instances': [synthetic_instance(n)]}
+                                for n in range(start, stop)]}
+
+def full_rows(count):
+    """Rows extracted from the whole response, kept until done"""
+    instances = []
+    for page in pages(count):
+        for r in page['Reservations']:
+            instances.extend(r['Instances'])
+    rows = []
+    for instance in instances:
+        row = []
+        for h in config['instance_attributes']:
+            if h == 'Name':
+                row.append(records.value(instance, h))
+            elif h == 'State':
+                row.append(instance['State']['Name'])
+            elif h in instance.keys():
+                row.append(str(instance[h]))
+            else:
+                row.append('')
+        rows.append(row)
+    return rows
+
+def projected_rows(count):
+    """Records projected page by page"""
+    rows = []
+    for page in pages(count):
+        rows.extend(records.project(
+            (i for r in page['Reservations'] for i in r['Instances']),
+            config['instance_attributes']))
+    return rows
+
+def peak_memory():
+    """Peak resident memory of this process, in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def run(mode, count):
+    """Build rows in this process and print the measurements as JSON"""
+    before = peak_memory()
+    start = time.time()
+    rows = (full_rows if mode == 'full' else projected_rows)(count)
+    elapsed = time.time() - start
+    print json.dumps({'rows': len(rows), 'seconds': elapsed,
+                      'memory': peak_memory() - before})
+
+def measure(mode, count):
+    """Measure a mode in a fresh interpreter"""
+    out = subprocess.check_output([sys.executable, __file__,
+                                   '--run=' + mode,
+                                   '--instances={}'.format(count)])
+    return json.loads(out)
+
+def main():
+    count = 50000
+    mode = None
+    for arg in sys.argv[1:]:
+        if arg.startswith('--instances='):
+            count = int(arg.split('=', 1)[1])
+        elif arg.startswith('--run='):
+            mode = arg.split('=', 1)[1]
+    if mode:
+        run(mode, count)
+        return
+
+    results = dict((m, measure(m, count)) for m in MODES)
+    for m in MODES:
+        print "{:10} {:>7.2f} s {:>8.1f} MB ({} rows)".format(
+            m + ':', results[m]['seconds'], results[m]['memory'],
+            results[m]['rows'])
+    full, projected = results['full'], results['projected']
+    if (projected['memory'] >= full['memory'] or
+            projected['seconds'] >= full['seconds']):
+        print "Projection is no lighter than the full response."
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+""" Startup time benchmark
+
+Measures the wall time of `saw -h` (interpreter start included) and of
+parsing typical command lines (saw.parse_args), and fails when either is over
+its budget. saw is run from shell loops and cron, so startup matters.
+
+Usage:
+    python benchmarks/startup.py [--runs=N]
+
+Attributes:
+    HELP_BUDGET (float): Budget for `saw -h`, in seconds
+    PARSE_BUDGET (float): Budget for parsing one command line, in seconds
+    HEAVY_MODULES (list): Modules that must not be imported by `saw -h`
+"""
+
+import os
+import sys
+import time
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from saw import saw
+
+HELP_BUDGET = 0.05
+PARSE_BUDGET = 0.005
+HEAVY_MODULES = ['boto3', 'botocore', 'requests', 'terminaltables']
+
+COMMAND_LINES = [
+    ['instances'],
+    ['instances', 'filter', '--state=running', '--name=web'],
+    ['images', 'filter', '--name=BACKUP', '--regions=all'],
+    ['launch', '--name', 'web1', '--name', 'web2'],
+    ['backup', '--id', 'i-1', '--id', 'i-2', '--name', 'nightly']
+]
+
+HELP_SCRIPT = """
+import sys
+sys.argv = ['saw', '-h']
+from saw import saw
+try:
+    saw.main()
+except SystemExit:
+    pass
+heavy = [m for m in {modules!r} if m in sys.modules]
+sys.stderr.write(','.join(heavy))
+"""
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def time_help(runs):
+    """Median wall time of `saw -h` in a fresh interpreter
+
+    Returns:
+        tuple: (seconds, list of heavy modules imported)
+    """
+    script = HELP_SCRIPT.format(modules=HEAVY_MODULES)
+    timings = []
+    heavy = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(runs):
+            start = time.time()
+            p = subprocess.Popen([sys.executable, '-c', script], cwd=ROOT,
+                                 stdout=devnull, stderr=subprocess.PIPE)
+            _, err = p.communicate()
+            timings.append(time.time() - start)
+            heavy = [m for m in err.strip().split(',') if m]
+    return median(timings), heavy
+
+def time_parse(runs):
+    """Median time of parsing one command line with docopt"""
+    timings = []
+    for _ in range(runs):
+        for argv in COMMAND_LINES:
+            start = time.time()
+            saw.parse_args(argv)
+            timings.append(time.time() - start)
+    return median(timings)
+
+def main():
+    runs = 10
+    for arg in sys.argv[1:]:
+        if arg.startswith('--runs='):
+            runs = int(arg.split('=', 1)[1])
+
+    help_time, heavy = time_help(runs)
+    parse_time = time_parse(runs)
+    failed = False
+
+    print "saw -h:  {:.1f} ms (budget {:.1f} ms)".format(help_time * 1000,
+                                                        HELP_BUDGET * 1000)
+    print "docopt:  {:.2f} ms (budget {:.2f} ms)".format(parse_time * 1000,
+                                                        PARSE_BUDGET * 1000)
+    if help_time > HELP_BUDGET or parse_time > PARSE_BUDGET:
+        print "Over budget."
+        failed = True
+    if heavy:
+        print "saw -h imported: {}".format(', '.join(heavy))
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+""" Elastic IPs for whole fleets of instances
+
+Assignment reconciles a fleet at once: one describe_addresses call finds
+the addresses already associated with the fleet and the spare ones, only
+the shortfall is allocated, and all associations are made concurrently,
+as fast as the scheduler allows mutating calls. Instances already
+holding an address are left alone, so assigning again is harmless.
+"""
+
+import collections
+
+import lazy
+import clients
+import helpers
+
+exceptions = lazy.module('botocore.exceptions')
+
+
+def result(instance_id):
+    """Pending result of an instance, as reported by assign"""
+    return {'InstanceId': instance_id, 'PublicIp': '', 'AllocationId': '',
+            'State': 'pending', 'Reason': ''}
+
+def spare(addresses):
+    """VPC addresses not associated with anything, in address order
+
+    Args:
+        addresses (list): Address dicts, as in describe_addresses
+
+    Returns:
+        list: Spare address dicts
+    """
+    return sorted((a for a in addresses
+                   if a.get('Domain') == 'vpc' and
+                   not a.get('AssociationId')),
+                  key=lambda a: a['PublicIp'])
+
+def allocate(client, count):
+    """Allocate VPC addresses, all at once
+
+    Args:
+        client (EC2.Client): boto3 EC2 client
+        count (int): Number of addresses to allocate
+
+    Returns:
+        tuple: (list of allocated address dicts, error message of the
+            first failure or '')
+    """
+    def start(n):
+        try:
+            response = client.allocate_address(Domain='vpc')
+            yield {'PublicIp': response['PublicIp'],
+                   'AllocationId': response['AllocationId'],
+                   'Domain': 'vpc'}, ''
+        except exceptions.ClientError as e:
+            yield None, e.response['Error']['Message']
+
+    allocated, errors = [], []
+    for _, (address, error) in helpers.fan_out(range(count), start):
+        if address:
+            allocated.append(address)
+        else:
+            errors.append(error)
+    return allocated, errors[0] if errors else ''
+
+def associate(client, results):
+    """Associate addresses with instances, all at once
+
+    Args:
+        client (EC2.Client): boto3 EC2 client
+        results (list): Results (see result) with AllocationId set,
+            updated in place
+    """
+    by_instance = dict((r['InstanceId'], r) for r in results)
+
+    def start(instance_id):
+        try:
+            # Never take over an address associated in the meantime
+            client.associate_address(
+                InstanceId=instance_id,
+                AllocationId=by_instance[instance_id]['AllocationId'],
+                AllowReassociation=False)
+            yield 'associated', ''
+        except exceptions.ClientError as e:
+            yield 'failed', e.response['Error']['Message']
+
+    for instance_id, (state, reason) in helpers.fan_out(by_instance.keys(),
+                                                        start):
+        by_instance[instance_id].update(State=state, Reason=reason)
+
+def assign(instance_ids, region=None):
+    """Make sure every instance has an Elastic IP
+
+    Args:
+        instance_ids (list): Instance IDs
+        region (string, optional): Region name. Session default if None.
+
+    Returns:
+        list: Result dict per instance with InstanceId, PublicIp,
+            AllocationId, State ('existing', 'associated' or 'failed')
+            and Reason
+    """
+    client = clients.client('ec2', region)
+    results = collections.OrderedDict((i, result(i)) for i in instance_ids)
+    addresses = client.describe_addresses()['Addresses']
+
+    for a in addresses:
+        if a.get('InstanceId') in results:
+            results[a['InstanceId']].update(
+                PublicIp=a['PublicIp'], AllocationId=a.get('AllocationId', ''),
+                State='existing')
+    waiting = [r for r in results.values() if r['State'] == 'pending']
+
+    available = spare(addresses)[:len(waiting)]
+    reason = ''
+    if len(available) < len(waiting):
+        allocated, reason = allocate(client, len(waiting) - len(available))
+        available.extend(allocated)
+
+    for r, a in zip(waiting, available):
+        r.update(PublicIp=a['PublicIp'], AllocationId=a['AllocationId'])
+    for r in waiting[len(available):]:
+        r.update(State='failed', Reason=reason)
+    associate(client, waiting[:len(available)])
+    return results.values()
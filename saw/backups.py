@@ -0,0 +1,108 @@
+""" Bulk backups (AMIs) of EC2 instances
+
+Images are started concurrently, with at most a configured number of
+them pending at any time, and all pending images are tracked in one
+shared poll loop.
+"""
+
+import lazy
+import clients
+import helpers
+import resolver
+import waiters
+from config import config
+
+exceptions = lazy.module('botocore.exceptions')
+
+
+def image_name(prefix, instance_name, secs_since_epoch):
+    """Compose a unique image name for an instance backup
+
+    Args:
+        prefix (string): Image name prefix (e.g. 'BACKUP')
+        instance_name (string): Name (or ID) of the instance
+        secs_since_epoch (int): Backup timestamp
+
+    Returns:
+        string: Image name
+    """
+    return '{}_{}_{}'.format(prefix, instance_name, secs_since_epoch)
+
+def targets_from_filters(filters):
+    """Find instances to back up
+
+    Args:
+        filters (list): EC2 filters selecting instances
+
+    Returns:
+        list: List of Instance IDs
+    """
+    client = clients.client('ec2')
+    inst_ids = []
+    for page in helpers.paginate(client, 'describe_instances',
+                                 Filters=filters):
+        for r in page['Reservations']:
+            resolver.add_instances(r['Instances'])
+            inst_ids.extend(i['InstanceId'] for i in r['Instances'])
+    return inst_ids
+
+def run(targets, desc='', max_in_flight=None, no_reboot=False):
+    """Create images for many instances
+
+    Args:
+        targets (list): List of (Instance ID, image name) pairs
+        desc (string, optional): Description of the images
+        max_in_flight (int, optional): Maximum number of pending images
+        no_reboot (bool, optional): Image running instances as they are,
+            without rebooting them first. Faster, at the risk of an
+            inconsistent file system in the image.
+
+    Returns:
+        list: Result dict per target with InstanceId, ImageName,
+            ImageId, State, Reason and Image (details from describe_images)
+    """
+    max_in_flight = max_in_flight or config['backup']['max_in_flight']
+    client = clients.client('ec2')
+
+    def start(target):
+        inst_id, name = target
+        result = {'InstanceId': inst_id, 'ImageName': name,
+                  'ImageId': '', 'State': 'pending', 'Reason': '',
+                  'Image': None}
+        try:
+            response = client.create_image(InstanceId=inst_id, Name=name,
+                                           Description=desc,
+                                           NoReboot=no_reboot)
+            result['ImageId'] = response['ImageId']
+        except exceptions.ClientError as e:
+            result['State'] = 'failed'
+            result['Reason'] = e.response['Error']['Message']
+        yield result
+
+    pending = list(targets)
+    in_flight = set()
+    by_image = {}
+    results = []
+
+    def start_batch():
+        # Start as many images as there are free slots
+        slots = max_in_flight - len(in_flight)
+        batch = pending[:slots]
+        del pending[:slots]
+        for _, result in helpers.fan_out(batch, start, max_in_flight):
+            results.append(result)
+            if result['ImageId']:
+                in_flight.add(result['ImageId'])
+                by_image[result['ImageId']] = result
+
+    while pending or in_flight:
+        start_batch()
+        for image_id, state, reason, image in waiters.poll(
+                'image', in_flight, callback=waiters.progress):
+            by_image[image_id]['State'] = state
+            by_image[image_id]['Reason'] = reason
+            by_image[image_id]['Image'] = image
+            start_batch()
+
+    order = dict((t[0], n) for n, t in enumerate(targets))
+    return sorted(results, key=lambda r: order[r['InstanceId']])
@@ -0,0 +1,209 @@
+""" On-disk cache for EC2 describe_* responses
+
+Responses are stored page by page (one JSON document per line), keyed by
+region, account and request arguments, so repeated listings are served
+locally without calling the EC2 API.
+
+Attributes:
+    CACHE_DIR (string): Directory holding cache entries
+    memory (OrderedDict): Entry key -> (mtime, pages) of entries read
+        last, kept parsed by long-running processes (see daemon). None
+        when entries are read from disk every time.
+"""
+
+import os
+import json
+import time
+import hashlib
+import datetime
+
+import clients
+import helpers
+from config import config
+
+CACHE_DIR = os.path.expanduser(config['cache']['path'])
+memory = None
+
+
+def serialize(value):
+    """JSON serializer for values json can't handle (e.g. datetime)"""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+def key(client, operation, **kwargs):
+    """Compose cache key for a describe request
+
+    Args:
+        client (EC2.Client): boto3 EC2 client
+        operation (string): Client method name (e.g. 'describe_instances')
+        **kwargs: Arguments of the request (filters, IDs, etc.)
+
+    Returns:
+        string: Hex digest identifying the request
+    """
+    request = {
+        'operation': operation,
+        'region': client.meta.region_name,
+        'account': clients.account(),
+        'args': kwargs
+    }
+    return hashlib.sha1(json.dumps(request, sort_keys=True)).hexdigest()
+
+def entry_path(entry_key):
+    """Path of the file holding a cache entry"""
+    return os.path.join(CACHE_DIR, entry_key + '.jsonl')
+
+def read(entry_key, ttl=None):
+    """Read a cache entry, page by page
+
+    Args:
+        entry_key (string): Cache key
+        ttl (int, optional): Maximum age in seconds. No limit if None.
+
+    Returns:
+        generator: Response pages, or None for a missing or stale entry
+    """
+    path = entry_path(entry_key)
+    try:
+        age = time.time() - os.path.getmtime(path)
+        f = open(path)
+    except (IOError, OSError):
+        return None
+    if ttl is not None and age > ttl:
+        f.close()
+        return None
+
+    def pages():
+        with f:
+            for line in f:
+                yield json.loads(line)
+    return pages()
+
+def write(entry_key, pages):
+    """Store response pages while passing them through
+
+    The entry is only committed once all pages have been consumed, so an
+    interrupted listing never leaves a partial entry behind.
+
+    Args:
+        entry_key (string): Cache key
+        pages (iterable): Response pages
+
+    Yields:
+        dict: Response page
+    """
+    if not os.path.isdir(CACHE_DIR):
+        try:
+            os.makedirs(CACHE_DIR)
+        except OSError:
+            pass
+    path = entry_path(entry_key)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    committed = False
+    try:
+        with open(tmp_path, 'w') as f:
+            for page in pages:
+                page.pop('ResponseMetadata', None)
+                f.write(json.dumps(page, default=serialize) + '\n')
+                yield page
+        os.rename(tmp_path, path)
+        committed = True
+    finally:
+        if not committed and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    evict()
+
+def evict(max_size=None):
+    """Remove least recently used entries beyond the size limit
+
+    Args:
+        max_size (int, optional): Size limit in bytes. From config if None.
+    """
+    if max_size is None:
+        max_size = config['cache']['max_size_mb'] * 1024 * 1024
+    entries = []
+    try:
+        for name in os.listdir(CACHE_DIR):
+            if name.endswith('.jsonl'):
+                path = os.path.join(CACHE_DIR, name)
+                stat = os.stat(path)
+                entries.append((stat.st_atime, stat.st_size, path))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+def held(entry_key, mtime, pages):
+    """Pages of an entry from memory, parsing them once per version
+
+    Args:
+        entry_key (string): Cache key
+        mtime (float): Modification time of the entry's file
+        pages (iterable): Response pages read from the file
+
+    Returns:
+        list: Response pages
+    """
+    found = memory.pop(entry_key, None)
+    # Entries replaced or removed by other processes change their mtime
+    if found is None or found[0] != mtime:
+        found = (mtime, list(pages))
+    memory[entry_key] = found
+    while len(memory) > config['cache']['memory_entries']:
+        memory.popitem(last=False)
+    return found[1]
+
+def invalidate():
+    """Drop all cached responses (after resources were created/changed)"""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for name in os.listdir(CACHE_DIR):
+        try:
+            os.remove(os.path.join(CACHE_DIR, name))
+        except OSError:
+            pass
+
+def paginate(client, operation, page_size=None, **kwargs):
+    """Cached equivalent of helpers.paginate
+
+    Behaviour depends on config['cache']['mode']:
+        'ttl' (default): use entries younger than the configured TTL
+        'cached': use any existing entry, however old
+        'refresh': always call the API and update the entry
+
+    Args:
+        client (EC2.Client): boto3 EC2 client
+        operation (string): Client method name (e.g. 'describe_instances')
+        page_size (int, optional): Maximum number of results per page
+        **kwargs: Arguments passed on to the operation
+
+    Yields:
+        dict: Response page
+    """
+    mode = config['cache'].get('mode', 'ttl')
+    entry_key = key(client, operation, **kwargs)
+    pages = None
+    if mode != 'refresh':
+        ttl = None if mode == 'cached' else config['cache']['ttl']
+        pages = read(entry_key, ttl)
+    if pages is not None:
+        # Record access time for LRU eviction, keeping mtime for the TTL
+        path = entry_path(entry_key)
+        mtime = os.path.getmtime(path)
+        os.utime(path, (time.time(), mtime))
+        if memory is not None:
+            pages = held(entry_key, mtime, pages)
+    else:
+        pages = write(entry_key, helpers.paginate(client, operation,
+                                                  page_size=page_size,
+                                                  **kwargs))
+    for page in pages:
+        yield page
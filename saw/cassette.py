@@ -0,0 +1,249 @@
+""" Recording and replaying of AWS and Slack calls
+
+Recording writes every botocore call (service, operation, arguments,
+status, parsed response and latency) and every Slack post of a real run
+to a cassette, one compact JSON document per line (gzipped if its name
+ends with .gz). Replaying answers calls from a cassette without any
+network access or credentials, optionally sleeping for the recorded
+latencies (scaled), so slow runs can be reproduced and saw's own
+overhead measured apart from AWS.
+
+A call is answered by the recorded call of the same operation with the
+most arguments in common, the earliest one among equals, so repeated
+polls are answered in recorded order and calls made concurrently still
+get their own responses. Each recorded call answers once.
+
+Handlers are installed on every session (see clients.session) and do
+nothing unless recording or replaying, so either can start at any time.
+From the command line, set SAW_RECORD or SAW_REPLAY to the path of a
+cassette, and SAW_REPLAY_LATENCY to a latency factor (e.g. 1 for the
+recorded latencies).
+
+Attributes:
+    Response (namedtuple): Replayed HTTP response
+    mode (string): 'record', 'replay' or None
+    latency (float): Factor of recorded latencies slept when replaying
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+import collections
+
+import lazy
+import cache
+
+gzip = lazy.module('gzip')
+requests = lazy.module('requests')
+
+Response = collections.namedtuple('Response', ['status_code', 'content',
+                                               'headers'])
+
+mode = None
+latency = 0
+cassette_path = None
+output = None
+interactions = {}
+lock = threading.Lock()
+
+
+def open_cassette(path, flags='r'):
+    """Open a cassette, gzipped if its name ends with .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, flags + 'b')
+    return open(path, flags)
+
+def record(path):
+    """Start recording calls to a cassette, replacing it
+
+    Args:
+        path (string): Cassette path
+    """
+    global mode, cassette_path, output
+    stop()
+    with lock:
+        output = open_cassette(path, 'w')
+        cassette_path = path
+        mode = 'record'
+
+def replay(path, latency_factor=0):
+    """Start answering calls from a cassette
+
+    Args:
+        path (string): Cassette path
+        latency_factor (float, optional): Factor of the recorded latency
+            to sleep for on every call. No sleeping if 0.
+    """
+    global mode, latency, cassette_path
+    stop()
+    loaded = {}
+    with open_cassette(path) as f:
+        for line in f:
+            if line.strip():
+                interaction = json.loads(line)
+                key = (interaction['service'], interaction['operation'])
+                loaded.setdefault(key, []).append(interaction)
+    with lock:
+        interactions.update(loaded)
+        cassette_path = path
+        latency = latency_factor
+        mode = 'replay'
+
+def stop():
+    """Stop recording or replaying"""
+    global mode, latency, cassette_path, output
+    with lock:
+        if output:
+            output.close()
+        mode, latency, cassette_path, output = None, 0, None, None
+        interactions.clear()
+
+# Registered on import, ahead of slack's flush, so it runs after it
+atexit.register(stop)
+
+def from_environment(environ=None):
+    """Record or replay as set by SAW_RECORD or SAW_REPLAY, if not already
+
+    Args:
+        environ (dict, optional): Environment variables. os.environ if None.
+    """
+    environ = os.environ if environ is None else environ
+    if mode:
+        return
+    if environ.get('SAW_REPLAY'):
+        replay(environ['SAW_REPLAY'],
+               float(environ.get('SAW_REPLAY_LATENCY') or 0))
+    elif environ.get('SAW_RECORD'):
+        record(environ['SAW_RECORD'])
+
+def normalize(value):
+    """Value as read back from a cassette (e.g. datetimes as strings)"""
+    return json.loads(json.dumps(value, default=cache.serialize))
+
+def write(interaction):
+    """Append an interaction to the cassette being recorded"""
+    line = json.dumps(interaction, default=cache.serialize,
+                      separators=(',', ':'))
+    with lock:
+        if output:
+            output.write(line + '\n')
+            output.flush()
+
+def similarity(recorded, params):
+    """Number of arguments of a call equal to those of a recorded call"""
+    recorded = recorded or {}
+    return sum(1 for k, v in (params or {}).items() if recorded.get(k) == v)
+
+def take(service, operation, params=None):
+    """Take the recorded call answering a call (see module docstring)
+
+    Args:
+        service (string): Service name (e.g. 'ec2', 'slack')
+        operation (string): Operation name (e.g. 'DescribeInstances')
+        params (dict, optional): Arguments of the call, normalized
+
+    Returns:
+        dict: Recorded call
+
+    Raises:
+        LookupError: No recorded call of the operation is left
+    """
+    with lock:
+        queue = interactions.get((service, operation))
+        if not queue:
+            raise LookupError("No {} {} call left in {}".format(
+                service, operation, cassette_path))
+        best = max(range(len(queue)),
+                   key=lambda n: (similarity(queue[n].get('params'), params),
+                                  -n))
+        interaction = queue.pop(best)
+    if latency:
+        time.sleep(interaction.get('seconds', 0) * latency)
+    return interaction
+
+def pause(seconds):
+    """Sleep between polls, only as long as latencies when replaying"""
+    if mode == 'replay':
+        seconds *= latency
+    if seconds > 0:
+        time.sleep(seconds)
+
+def post(session, url, **kwargs):
+    """POST with a requests session, recording or replaying it
+
+    Args:
+        session (requests.Session): Session posting when not replaying
+        url (string): URL
+        **kwargs: Arguments of session.post
+
+    Returns:
+        requests.Response: Response (a Response tuple when replaying)
+    """
+    if mode == 'replay':
+        interaction = take('slack', 'post')
+        if 'error' in interaction:
+            raise requests.exceptions.ConnectionError(interaction['error'])
+        return Response(interaction['status'],
+                        interaction['body'].encode('utf-8'), {})
+    start = time.time()
+    try:
+        r = session.post(url, **kwargs)
+    except requests.exceptions.RequestException as e:
+        if mode == 'record':
+            write({'service': 'slack', 'operation': 'post',
+                   'error': str(e),
+                   'seconds': round(time.time() - start, 4)})
+        raise
+    if mode == 'record':
+        write({'service': 'slack', 'operation': 'post',
+               'status': r.status_code, 'body': r.content,
+               'seconds': round(time.time() - start, 4)})
+    return r
+
+def install(session):
+    """Hook recording and replaying into a boto3 session's clients
+
+    Args:
+        session (boto3.Session): Session whose clients are hooked
+    """
+    events = session._session.get_component('event_emitter')
+    events.register('before-parameter-build', keep_params)
+    # Replayed calls are still scheduled, and a miss (LookupError) frees
+    # its slot, as the scheduler holds it around the whole call
+    events.register('before-call', before_call)
+    events.register('after-call', after_call)
+
+def keep_params(params, context, **kwargs):
+    if mode:
+        context['cassette'] = {'params': params}
+
+def before_call(event_name, context, **kwargs):
+    call = context.get('cassette')
+    if call is None:
+        return None
+    if mode == 'record':
+        call['start'] = time.time()
+        return None
+    _, service, operation = event_name.split('.', 2)
+    interaction = take(service, operation, normalize(call['params']))
+    parsed = interaction['response']
+    parsed['ResponseMetadata'] = {'HTTPStatusCode': interaction['status'],
+                                  'RetryAttempts': 0}
+    return Response(interaction['status'], '', {}), parsed
+
+def after_call(event_name, context, http_response=None, parsed=None,
+               **kwargs):
+    call = context.pop('cassette', None)
+    if mode != 'record' or call is None:
+        return
+    _, service, operation = event_name.split('.', 2)
+    response = dict(parsed or {})
+    response.pop('ResponseMetadata', None)
+    write({'service': service, 'operation': operation,
+           'params': call['params'],
+           'status': getattr(http_response, 'status_code', 200),
+           'response': response,
+           'seconds': round(time.time() - call.get('start', time.time()),
+                            4)})
@@ -0,0 +1,178 @@
+""" Local catalog of EC2 instance types
+
+Specifications of every instance type of a region are fetched with
+describe_instance_types on refresh, and stored in one compact JSON file
+per region. Types are kept in size order, with an index of their
+positions by name, so lookups are binary searches and size queries stop
+at the first match. Reading the catalog never calls the API.
+
+Attributes:
+    CATALOG_DIR (string): Directory holding one catalog file per region
+    Spec (namedtuple): Specifications of an instance type. Memory in MiB,
+        EBS bandwidth in Mbps (0 if unknown), storage 'EBS' for types
+        without instance storage or its total size in GB otherwise.
+    HEADER (list): Column headers of listed types (see row)
+"""
+
+import os
+import json
+import time
+import collections
+
+import clients
+import helpers
+from config import config
+
+CATALOG_DIR = os.path.expanduser(config['catalog']['path'])
+
+Spec = collections.namedtuple('Spec', [
+    'name', 'vcpus', 'memory', 'storage', 'network', 'ebs_mbps',
+    'architectures', 'current'])
+HEADER = ['InstanceType', 'vCPU', 'Mem (GiB)', 'Storage',
+          'Network', 'EBS Bandwidth (Mbps)', 'Architectures']
+
+catalogs = {}
+
+
+def region_name(region=None):
+    """Name of a region, the session default if None"""
+    return region or clients.session().region_name
+
+def catalog_path(region):
+    """Path of the file holding the catalog of a region"""
+    return os.path.join(CATALOG_DIR, '{}.json'.format(region))
+
+def spec(details):
+    """Specifications of an instance type
+
+    Args:
+        details (dict): Instance type, as in describe_instance_types
+
+    Returns:
+        Spec: Specifications
+    """
+    storage = 'EBS'
+    if details.get('InstanceStorageSupported'):
+        storage = str(details['InstanceStorageInfo']['TotalSizeInGB'])
+    ebs = details.get('EbsInfo', {}).get('EbsOptimizedInfo', {})
+    return Spec(details['InstanceType'],
+                details['VCpuInfo']['DefaultVCpus'],
+                details['MemoryInfo']['SizeInMiB'],
+                storage,
+                details.get('NetworkInfo', {}).get('NetworkPerformance', ''),
+                ebs.get('BaselineBandwidthInMbps', 0),
+                ','.join(details.get('ProcessorInfo', {})
+                         .get('SupportedArchitectures', [])),
+                details.get('CurrentGeneration', False))
+
+def size_key(s):
+    """Sort key of types by size, current generation first among equals"""
+    return (s.vcpus, s.memory, not s.current, s.name)
+
+def refresh(region=None):
+    """Fetch all instance types of a region and store them
+
+    Args:
+        region (string, optional): Region name. Session default if None.
+
+    Returns:
+        int: Number of instance types stored
+    """
+    region = region_name(region)
+    client = clients.client('ec2', region)
+    specs = [spec(t) for page in helpers.paginate(
+                 client, 'describe_instance_types', page_size=100)
+             for t in page['InstanceTypes']]
+    specs.sort(key=size_key)
+    index = sorted(range(len(specs)), key=lambda n: specs[n].name)
+    document = {'region': region, 'updated': int(time.time()),
+                'types': [list(s) for s in specs], 'index': index}
+
+    if not os.path.isdir(CATALOG_DIR):
+        os.makedirs(CATALOG_DIR)
+    path = catalog_path(region)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(document, f, separators=(',', ':'))
+    os.rename(tmp_path, path)
+    catalogs.pop(region, None)
+    return len(specs)
+
+def load(region=None):
+    """Read the catalog of a region
+
+    Args:
+        region (string, optional): Region name. Session default if None.
+
+    Returns:
+        dict: Catalog with 'types' (lists of Spec fields, in size order)
+            and 'index' (positions of types in name order), or None if
+            never refreshed
+    """
+    region = region_name(region)
+    if region not in catalogs:
+        try:
+            with open(catalog_path(region)) as f:
+                catalogs[region] = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+    return catalogs[region]
+
+def lookup(name, region=None):
+    """Find an instance type by name
+
+    Args:
+        name (string): Instance type (e.g. 't2.medium')
+        region (string, optional): Region name. Session default if None.
+
+    Returns:
+        Spec: Specifications, or None if unknown or without a catalog
+    """
+    found = load(region)
+    if found is None:
+        return None
+    types, index = found['types'], found['index']
+    low, high = 0, len(index)
+    while low < high:
+        middle = (low + high) // 2
+        if types[index[middle]][0] < name:
+            low = middle + 1
+        else:
+            high = middle
+    if low < len(index) and types[index[low]][0] == name:
+        return Spec(*types[index[low]])
+    return None
+
+def query(min_vcpus=0, min_memory=0, region=None, limit=None):
+    """Find instance types of at least a given size, smallest first
+
+    Args:
+        min_vcpus (int, optional): Minimum number of vCPUs
+        min_memory (float, optional): Minimum memory in GiB
+        region (string, optional): Region name. Session default if None.
+        limit (int, optional): Most types to return. All if None.
+
+    Returns:
+        list: Specs in size order, or None without a catalog
+    """
+    found = load(region)
+    if found is None:
+        return None
+    min_mib = min_memory * 1024
+    specs = []
+    for values in found['types']:
+        if values[1] >= min_vcpus and values[2] >= min_mib:
+            specs.append(Spec(*values))
+            if limit and len(specs) >= limit:
+                break
+    return specs
+
+def smallest(min_vcpus=0, min_memory=0, region=None):
+    """Smallest instance type of at least a given size (see query)"""
+    specs = query(min_vcpus, min_memory, region, limit=1)
+    return specs[0] if specs else None
+
+def row(s):
+    """Table row of an instance type, under HEADER"""
+    return [s.name, str(s.vcpus), '{:g}'.format(s.memory / 1024.0),
+            s.storage, s.network, str(s.ebs_mbps or ''), s.architectures]
@@ -0,0 +1,112 @@
+""" Process-wide registry of boto3 sessions, clients and resources
+
+Clients are created once per service, region and profile and then shared
+by every module (and thread), so one command reuses the same endpoint
+resolution, credentials and HTTPS connection pool for all its calls.
+
+Attributes:
+    sessions (dict): Profile -> boto3.Session
+    registry (dict): (kind, service, region, profile) -> client/resource
+"""
+
+import threading
+
+import lazy
+import tracing
+import cassette
+import scheduler
+from config import config
+
+boto3 = lazy.module('boto3')
+botocore_config = lazy.module('botocore.config')
+
+sessions = {}
+registry = {}
+accounts = {}
+lock = threading.RLock()
+
+
+def client_config():
+    """botocore Config for all clients, from config['clients']
+
+    Returns:
+        botocore.config.Config: Pool size, retries and timeouts
+    """
+    settings = config['clients']
+    return botocore_config.Config(
+        max_pool_connections=settings['max_pool_connections'],
+        connect_timeout=settings['connect_timeout'],
+        read_timeout=settings['read_timeout'],
+        retries={'mode': settings['retry_mode'],
+                 'max_attempts': settings['max_attempts']})
+
+def session(profile=None):
+    """Get the shared session of a profile
+
+    Args:
+        profile (string, optional): AWS profile. From config if None.
+
+    Returns:
+        boto3.Session: Session
+    """
+    profile = profile or config['clients']['profile']
+    with lock:
+        if profile not in sessions:
+            sessions[profile] = boto3.Session(profile_name=profile)
+            scheduler.install(sessions[profile])
+            cassette.install(sessions[profile])
+            if tracing.enabled:
+                tracing.instrument(sessions[profile])
+        return sessions[profile]
+
+def get(kind, service, region=None, profile=None):
+    """Get a shared client or resource, creating it on first use
+
+    Creation is serialized, as boto3 sessions aren't thread-safe.
+
+    Args:
+        kind (string): 'client' or 'resource'
+        service (string): AWS service name (e.g. 'ec2')
+        region (string, optional): Region name. Session default if None.
+        profile (string, optional): AWS profile. From config if None.
+
+    Returns:
+        Client or resource
+    """
+    profile = profile or config['clients']['profile']
+    key = (kind, service, region, profile)
+    with lock:
+        if key not in registry:
+            factory = getattr(session(profile), kind)
+            registry[key] = factory(service, region_name=region,
+                                    config=client_config())
+        return registry[key]
+
+def client(service, region=None, profile=None):
+    """Get a shared boto3 client (see get)"""
+    return get('client', service, region, profile)
+
+def resource(service, region=None, profile=None):
+    """Get a shared boto3 resource (see get)
+
+    Resources aren't thread-safe, unlike clients: only use them from
+    the main thread.
+    """
+    return get('resource', service, region, profile)
+
+def account(profile=None):
+    """Identify the credentials of a profile without an API call
+
+    Args:
+        profile (string, optional): AWS profile. From config if None.
+
+    Returns:
+        string: Profile name and access key ID
+    """
+    profile = profile or config['clients']['profile']
+    with lock:
+        if profile not in accounts:
+            credentials = session(profile).get_credentials()
+            access_key = credentials.access_key if credentials else ''
+            accounts[profile] = '{}:{}'.format(profile, access_key)
+        return accounts[profile]
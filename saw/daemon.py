@@ -0,0 +1,279 @@
+""" Warm daemon answering listings over a Unix socket
+
+`saw serve` keeps a process running with clients, credentials and
+connections ready, and listing responses held in memory (see
+cache.memory). While it runs, the CLI hands it listings and prints what
+it sends back; without it, or if anything goes wrong on the way, the CLI
+runs them itself as usual. Commands that change resources, ask for
+confirmation, watch or trace always run in the CLI.
+
+The daemon answers one command at a time, as their output is captured
+by swapping sys.stdout and sys.stderr. Output is sent as it comes, in
+frames of about config['daemon']['chunk'] bytes and on every flush, so
+long listings print as they would in process. The daemon only answers
+clients with the same AWS_* and SAW_* environment variables as its own,
+so listings never come from another account, region or cassette than
+asked for.
+
+Attributes:
+    SOCKET_PATH (string): Path of the daemon's socket
+    FORWARDED (tuple): Commands the daemon answers
+    LOCAL (tuple): Arguments keeping a command in the CLI
+"""
+
+import os
+import sys
+import json
+import operator
+import itertools
+import collections
+
+import lazy
+import cache
+import clients
+import resolver
+from config import config
+
+# Only needed when a daemon runs, so saw doesn't pay for them otherwise
+socket = lazy.module('socket')
+StringIO = lazy.module('StringIO')
+traceback = lazy.module('traceback')
+
+SOCKET_PATH = os.path.expanduser(config['daemon']['path'])
+FORWARDED = ('instances', 'images', 'elastic_ips', 'instance_types')
+LOCAL = ('assign', 'prune', 'refresh', '--watch', '--trace', '--trace-json')
+
+
+def forwarded(argv):
+    """Whether the daemon answers a command
+
+    Args:
+        argv (list): Command line arguments, without the program name
+
+    Returns:
+        bool: True for listings, False for anything else
+    """
+    if not argv or argv[0] not in FORWARDED:
+        return False
+    return not any(a.split('=', 1)[0] in LOCAL for a in argv[1:])
+
+def environment():
+    """AWS_* and SAW_* environment variables, which select credentials,
+    region and cassette (see cassette)"""
+    return dict((k, v) for k, v in os.environ.items()
+                if k.startswith(('AWS_', 'SAW_')))
+
+def receive(path, message):
+    """Send a message to the daemon and iterate over its answer
+
+    Answers are frames, one JSON object per line: a single
+    {'declined': True}, or any number of {'stdout': ...} and
+    {'stderr': ...} frames followed by {'status': ...}.
+
+    Args:
+        path (string): Socket path
+        message (dict): Message
+
+    Yields:
+        dict: Frames of the answer. Stops early if the daemon couldn't be
+            reached, didn't answer in time or sent something else.
+    """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(config['daemon']['connect_timeout'])
+    try:
+        connection.connect(path)
+        connection.settimeout(config['daemon']['timeout'])
+        connection.sendall(json.dumps(message) + '\n')
+        for line in connection.makefile('rb'):
+            yield json.loads(line)
+    except (socket.error, ValueError):
+        return
+    finally:
+        connection.close()
+
+def forward(argv, path=None):
+    """Run a command in the daemon, if one is running and answers it
+
+    Args:
+        argv (list): Command line arguments, without the program name
+        path (string, optional): Socket path. SOCKET_PATH if None.
+
+    Returns:
+        int: Exit status of the command, or None if it has to run in
+            this process
+    """
+    path = path or SOCKET_PATH
+    if not forwarded(argv) or not os.path.exists(path):
+        return None
+    received, status = False, None
+    for frame in receive(path, {'argv': argv, 'env': environment()}):
+        if frame.get('declined'):
+            return None
+        received = True
+        if 'stdout' in frame:
+            sys.stdout.write(frame['stdout'].encode('utf-8'))
+            sys.stdout.flush()
+        if 'stderr' in frame:
+            sys.stderr.write(frame['stderr'].encode('utf-8'))
+        if 'status' in frame:
+            status = frame['status']
+    if received and status is None:
+        # Part of the output is printed already, so the command can't
+        # run again in process
+        print >> sys.stderr, "The daemon stopped answering"
+        return 1
+    return status
+
+class Frames(object):
+    """Output of a command, sent to a client in frames (see receive)
+
+    Writes to stdout and stderr are kept in order, and sent once about
+    config['daemon']['chunk'] bytes are pending or on flush.
+
+    Args:
+        write (function): Sends a frame
+    """
+
+    def __init__(self, write):
+        self.write = write
+        self.pending = []
+        self.size = 0
+
+    def add(self, key, text):
+        """Add text written to stdout or stderr"""
+        self.pending.append((key, text))
+        self.size += len(text)
+        if self.size >= config['daemon']['chunk']:
+            self.flush()
+
+    def flush(self):
+        """Send pending text, a frame per run of the same stream"""
+        pending, self.pending, self.size = self.pending, [], 0
+        for key, parts in itertools.groupby(pending, operator.itemgetter(0)):
+            self.write({key: ''.join(text for _, text in parts)})
+
+class Stream(object):
+    """File-like end of Frames, standing in for sys.stdout or sys.stderr
+
+    Args:
+        frames (Frames): Output of the command
+        key (string): 'stdout' or 'stderr'
+    """
+
+    def __init__(self, frames, key):
+        self.frames = frames
+        self.key = key
+
+    def write(self, text):
+        self.frames.add(self.key, text)
+
+    def flush(self):
+        self.frames.flush()
+
+def run(command, argv, write):
+    """Run a command, sending its output and exit status as frames
+
+    Names resolved by earlier commands are forgotten first (see
+    resolver), as instances and images may have come and gone since.
+
+    Args:
+        command (function): Entry point, taking command line arguments
+        argv (list): Command line arguments, without the program name
+        write (function): Sends a frame (see receive)
+    """
+    resolver.clear()
+    frames = Frames(write)
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = Stream(frames, 'stdout'), Stream(frames, 'stderr')
+    status = 0
+    try:
+        command(argv)
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            status = e.code
+        elif e.code is not None:
+            print >> sys.stderr, e.code
+            status = 1
+    except Exception:
+        traceback.print_exc()
+        status = 1
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+    frames.flush()
+    write({'status': status})
+
+def answer(connection, command):
+    """Answer the message of a client (see forward)"""
+    connection.settimeout(config['daemon']['timeout'])
+    line = connection.makefile('rb').readline()
+    try:
+        message = json.loads(line)
+    except ValueError:
+        # Not a message, e.g. a stray connection
+        return
+    def write(frame):
+        connection.sendall(json.dumps(frame) + '\n')
+
+    argv = message.get('argv') or []
+    if message.get('env') != environment() or not forwarded(argv):
+        write({'declined': True})
+    else:
+        run(command, argv, write)
+
+def listen(path):
+    """Bind the socket of the daemon, readable by the current user only
+
+    Exits with a message if a daemon already serves on it.
+
+    Args:
+        path (string): Socket path
+
+    Returns:
+        socket.socket: Listening socket
+    """
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, 0o700)
+    if os.path.exists(path):
+        if next(receive(path, {}), None) is not None:
+            sys.exit("Already serving on {}".format(path))
+        # Left behind by a daemon that didn't stop cleanly
+        os.remove(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    server.listen(16)
+    return server
+
+def serve(command, path=None):
+    """Answer commands of other saw processes until interrupted
+
+    Args:
+        command (function): Entry point, taking command line arguments
+        path (string, optional): Socket path. SOCKET_PATH if None.
+    """
+    path = path or SOCKET_PATH
+    # Load the EC2 service model before the first command needs it, and
+    # fail before listening if no client can be made (e.g. no region)
+    clients.client('ec2')
+    server = listen(path)
+    cache.memory = collections.OrderedDict()
+    print "Serving on {}. Ctrl-C to stop.".format(path)
+    sys.stdout.flush()
+    try:
+        while True:
+            connection, _ = server.accept()
+            try:
+                answer(connection, command)
+            except socket.error:
+                pass
+            finally:
+                connection.close()
+    except KeyboardInterrupt:
+        print
+    finally:
+        server.close()
+        os.remove(path)
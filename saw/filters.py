@@ -0,0 +1,290 @@
+""" Filter expressions for listings
+
+Expressions are terms joined with AND, e.g.
+
+    tag:Team=data AND state IN (running,stopped) AND type~m5.*
+
+Operators are = (equals), != (differs), ~ (matches a regular expression)
+and IN / NOT IN (one of a list of values). As much as possible is compiled
+into EC2 Filters, so the API only returns matching resources. Terms EC2
+can't express (negations, complex patterns, a field used twice) are left
+to a predicate run over the fetched resources.
+
+Attributes:
+    FIELDS (dict): Per resource kind, field -> (EC2 filter name, getter)
+    Term (namedtuple): Field, operator and list of values of a term
+    Query (namedtuple): EC2 Filters and the terms left to the client
+"""
+
+import re
+import collections
+
+import resolver
+
+
+def attribute(name):
+    """Getter of a top-level attribute of a resource"""
+    return lambda resource: resource.get(name)
+
+def tag(key):
+    """Getter of a tag value of a resource"""
+    return lambda resource: resource_tag(resource, key)
+
+def resource_tag(resource, key):
+    for t in resource.get('Tags') or []:
+        if t['Key'] == key:
+            return t['Value']
+    return None
+
+def instance_state(resource):
+    return resource['State']['Name']
+
+def availability_zone(resource):
+    return resource.get('Placement', {}).get('AvailabilityZone')
+
+FIELDS = {
+    'instance': {
+        'id': ('instance-id', attribute('InstanceId')),
+        'name': ('tag:Name', lambda r: resolver.tag_name(r.get('Tags'))),
+        'user': ('tag:User', tag('User')),
+        'state': ('instance-state-name', instance_state),
+        'type': ('instance-type', attribute('InstanceType')),
+        'image': ('image-id', attribute('ImageId')),
+        'zone': ('availability-zone', availability_zone),
+        'ip': ('ip-address', attribute('PublicIpAddress')),
+        'private-ip': ('private-ip-address', attribute('PrivateIpAddress')),
+        'vpc': ('vpc-id', attribute('VpcId')),
+        'subnet': ('subnet-id', attribute('SubnetId')),
+        'key': ('key-name', attribute('KeyName'))
+    },
+    'image': {
+        'id': ('image-id', attribute('ImageId')),
+        'name': ('name', attribute('Name')),
+        'state': ('state', attribute('State')),
+        'description': ('description', attribute('Description')),
+        'architecture': ('architecture', attribute('Architecture'))
+    }
+}
+
+Term = collections.namedtuple('Term', ['field', 'op', 'values'])
+Query = collections.namedtuple('Query', ['filters', 'client', 'kind'])
+
+TERM = re.compile(r"""
+    \s*(?P<field>[\w:.-]+)\s*
+    (?:
+        (?P<op>!=|=|~)\s*(?P<value>"[^"]*"|'[^']*'|\S+)
+      | \s(?P<in>(?:NOT\s+)?IN)\s*\((?P<values>[^)]*)\)
+    )\s*""", re.VERBOSE | re.IGNORECASE)
+AND = re.compile(r'AND\s', re.IGNORECASE)
+
+
+def unquote(value):
+    value = value.strip()
+    if len(value) > 1 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    return value
+
+def parse(expression):
+    """Parse a filter expression into terms
+
+    Args:
+        expression (string): Terms joined with AND
+
+    Returns:
+        list: List of Terms. Operator is '=', '!=', '~', 'in' or 'not in'.
+
+    Raises:
+        ValueError: Expression isn't valid
+    """
+    terms = []
+    position = 0
+    while position < len(expression):
+        if terms:
+            joint = AND.match(expression, position)
+            if not joint:
+                raise ValueError("Expected AND at: {}".format(
+                    expression[position:]))
+            position = joint.end()
+        match = TERM.match(expression, position)
+        if not match:
+            raise ValueError("Invalid filter term at: {}".format(
+                expression[position:]))
+        if match.group('in'):
+            op = ' '.join(match.group('in').lower().split())
+            values = [unquote(v) for v in match.group('values').split(',')]
+            values = [v for v in values if v]
+        else:
+            op = match.group('op')
+            values = [unquote(match.group('value'))]
+        terms.append(Term(match.group('field'), op, values))
+        position = match.end()
+    return terms
+
+def field(kind, name):
+    """Look up the EC2 filter name and getter of a field
+
+    Raises:
+        ValueError: Unknown field
+    """
+    if name.startswith('tag:'):
+        return name, tag(name[len('tag:'):])
+    fields = FIELDS[kind]
+    if name not in fields:
+        raise ValueError("Unknown {} field: {} (known: {}, tag:KEY)".format(
+            kind, name, ', '.join(sorted(fields))))
+    return fields[name]
+
+def escape(value):
+    """Escape EC2 filter wildcards, for exact matches"""
+    return value.replace('\\', '\\\\').replace('*', '\\*').replace('?', '\\?')
+
+def wildcards(value):
+    """Whether an EC2 filter value has wildcards (unescaped * or ?)"""
+    return re.search(r'(?<!\\)(?:\\\\)*[*?]', value) is not None
+
+def from_wildcard(value):
+    """Compile an EC2 filter value into a regular expression
+
+    '*' matches any characters, '?' any single one, and a backslash
+    escapes the next character.
+
+    Returns:
+        re pattern: Pattern matching whole values
+    """
+    parts = []
+    i = 0
+    while i < len(value):
+        c = value[i]
+        if c == '\\' and i + 1 < len(value):
+            i += 1
+            parts.append(re.escape(value[i]))
+        elif c == '*':
+            parts.append('.*')
+        elif c == '?':
+            parts.append('.')
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return re.compile(''.join(parts) + r'\Z', re.DOTALL)
+
+def to_wildcard(pattern):
+    """Translate a regular expression to an EC2 filter wildcard pattern
+
+    Only literals, '.' and '.*' can be translated.
+
+    Returns:
+        string: Wildcard pattern, or None if not translatable
+    """
+    wildcard = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith('.*', i):
+            wildcard.append('*')
+            i += 2
+            continue
+        if c == '.':
+            wildcard.append('?')
+        elif c == '\\' and i + 1 < len(pattern) and \
+                not pattern[i + 1].isalnum():
+            i += 1
+            wildcard.append(escape(pattern[i]))
+        elif c.isalnum() or c in '-_:/@ ':
+            wildcard.append(c)
+        else:
+            return None
+        i += 1
+    return ''.join(wildcard)
+
+def compile_query(expression, kind, terms=None):
+    """Compile an expression into EC2 Filters and client-side terms
+
+    Args:
+        expression (string): Filter expression (may be empty)
+        kind (string): 'instance' or 'image'
+        terms (list, optional): Terms to prepend to the expression's
+            (e.g. from --name). Their values go to EC2 as given, so EC2
+            wildcards (* and ?) work in them, whereas '=' in an
+            expression is an exact match.
+
+    Returns:
+        Query: Filters for the API, and terms to check on results
+
+    Raises:
+        ValueError: Invalid expression or unknown field
+    """
+    given = len(terms or [])
+    terms = list(terms or []) + parse(expression or '')
+    filters = []
+    client = []
+    for n, t in enumerate(terms):
+        name, _ = field(kind, t.field)
+        if t.op == '~':
+            try:
+                re.compile(t.values[0])
+            except re.error as e:
+                raise ValueError("Invalid pattern {}: {}".format(
+                    t.values[0], e))
+        if name in [f['Name'] for f in filters]:
+            client.append(t)
+        elif t.op in ('=', 'in'):
+            values = t.values if n < given else [escape(v) for v in t.values]
+            filters.append({'Name': name, 'Values': values})
+        elif t.op == '~' and to_wildcard(t.values[0]) is not None:
+            filters.append({'Name': name,
+                            'Values': [to_wildcard(t.values[0])]})
+        else:
+            client.append(t)
+    return Query(filters, client, kind)
+
+def matcher(term):
+    """Compile a client-side term into a test of a single value"""
+    if term.op == '~':
+        pattern = re.compile(r'(?:{})\Z'.format(term.values[0]))
+        return lambda v: v is not None and bool(pattern.match(v))
+    values = set(term.values)
+    if term.op in ('=', 'in'):
+        return lambda v: v in values
+    return lambda v: v not in values
+
+def predicate(query):
+    """Compile the client-side terms of a query into a predicate
+
+    Args:
+        query (Query): Compiled query
+
+    Returns:
+        function: Takes a resource dict, returns whether it matches.
+            None if all terms were compiled into EC2 Filters.
+    """
+    if not query.client:
+        return None
+    checks = [(field(query.kind, t.field)[1], matcher(t)) for t in query.client]
+    return lambda resource: all(check(get(resource))
+                                for get, check in checks)
+
+def describe(term):
+    if term.op in ('in', 'not in'):
+        return '{} {} ({})'.format(term.field, term.op.upper(),
+                                   ', '.join(term.values))
+    return '{} {} {}'.format(term.field, term.op, term.values[0])
+
+def explain(query):
+    """Describe which parts of a query run on the server or the client
+
+    Args:
+        query (Query): Compiled query
+
+    Returns:
+        string: Human-readable split
+    """
+    lines = ['Server-side (EC2 Filters):']
+    lines.extend('    {}: {}'.format(f['Name'], ', '.join(f['Values']))
+                 for f in query.filters)
+    if not query.filters:
+        lines.append('    (none)')
+    lines.append('Client-side (predicate):')
+    lines.extend('    ' + describe(t) for t in query.client)
+    if not query.client:
+        lines.append('    (none)')
+    return '\n'.join(lines)
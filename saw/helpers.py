@@ -6,43 +6,19 @@ Attributes:
 """
 
 import os
+import sys
 import json
-import time
+import Queue
+import threading
 from collections import OrderedDict
 
-import boto3
-
+import clients
+import filters
 import tabularize
+import resolver
 from config import config
 
 
-def allocate_elastic_ip():
-    """Allocate a new standard Elastic IP for default region
-    
-    Returns:
-        string: Public Elastic IP address allocated
-    """
-    client = boto3.client('ec2')
-    response = client.allocate_address(Domain='standard')
-    return response['PublicIp']
-
-def associate_elastic_ip(elastic_ip, instance_id):
-    """Associate given Elastic IP address with instance 
-    
-    Args:
-        elastic_ip (string): Elastic IP address
-        instance_id (string): ID of instance
-    
-    Returns:
-        bool: Success/Failure of the association
-    """
-    client = boto3.client('ec2')
-    response = client.associate_address(
-        InstanceId=instance_id,
-        PublicIp=elastic_ip
-    )
-    return bool(response['AssociationId'])
-
 def confirm_launch():
     """Confirm launch of instance(s) from user
     
@@ -59,6 +35,19 @@ def confirm_publish():
     choice = raw_input("\nAre you sure you want to publish?: ([y]/n) ") or 'y'
     return (choice == 'y' or choice == 'Y')
 
+def confirm_backup(count, reboot=True):
+    """Ask for confirmation before backing up several instances"""
+    rebooting = ', rebooting them' if reboot else ''
+    choice = raw_input("\nAre you sure you want to back up {} instance(s)"
+                       "{}?: (y/[n]) ".format(count, rebooting)) or 'n'
+    return (choice == 'y' or choice == 'Y')
+
+def confirm_prune(count):
+    """Ask for confirmation before removing images"""
+    choice = raw_input("\nAre you sure you want to remove {} image(s) and "
+                       "their snapshots?: (y/[n]) ".format(count)) or 'n'
+    return (choice == 'y' or choice == 'Y')
+
 def sanitize_headers(headers):
     """Reformat column headers for tabulation
     
@@ -91,22 +80,6 @@ def compose_public_dns_name(instance):
                                                   region=region,
                                                   subdomain=subdomain)
 
-def convert_tags_to_string(tags):
-    """Convert Tags (key-value pairs) to string for tabulation 
-    
-    Args:
-        tags (list): List of tag key-value pairs
-    
-    Returns:
-        string: String formed by concatenating tags
-    """
-    tag_str = ''
-    temp_tags = []
-    for tag in tags:
-        temp_tags.append("{key} = {value}".format(key=tag['Key'],
-                                                  value=tag['Value']))
-    return ', '.join(temp_tags)
-
 def extract_attributes(details, req_attrs):
     """Extract required attribute values from resource details
     
@@ -127,6 +100,105 @@ def extract_attributes(details, req_attrs):
         rows.append(row)
     return rows
 
+def paginate(client, operation, page_size=None, **kwargs):
+    """Iterate over response pages of an EC2 describe operation
+
+    Uses the client's paginator so that NextToken is followed, falling
+    back to a single call for operations without one (e.g. describe_addresses)
+
+    Args:
+        client (EC2.Client): boto3 EC2 client
+        operation (string): Client method name (e.g. 'describe_instances')
+        page_size (int, optional): Maximum number of results per page
+        **kwargs: Arguments passed on to the operation
+
+    Yields:
+        dict: Response page
+    """
+    if not client.can_paginate(operation):
+        yield getattr(client, operation)(**kwargs)
+        return
+    pagination_config = {}
+    if page_size:
+        pagination_config['PageSize'] = page_size
+    paginator = client.get_paginator(operation)
+    for page in paginator.paginate(PaginationConfig=pagination_config,
+                                   **kwargs):
+        yield page
+
+def fan_out(items, fn, max_workers=None):
+    """Run a generator function over items on a bounded thread pool
+
+    Values are handed back as soon as any worker yields them, so the total
+    time is close to that of the slowest item rather than the sum of all.
+    At most a few values per worker are buffered at any time, and workers
+    stop once the generator is closed (e.g. the caller breaks out early).
+
+    Args:
+        items (list): Items to process (e.g. region names)
+        fn (function): Generator function called with each item
+        max_workers (int, optional): Upper bound on concurrent workers
+
+    Yields:
+        tuple: (item, value) for every value yielded by fn(item)
+    """
+    max_workers = max_workers or config['max_workers']
+    pending = Queue.Queue()
+    for item in items:
+        pending.put(item)
+    results = Queue.Queue(maxsize=2 * max_workers)
+    stop = threading.Event()
+    done = object()
+
+    def put(result):
+        # Give up once the consumer is gone, rather than block forever
+        while not stop.is_set():
+            try:
+                results.put(result, True, 0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def worker():
+        while not stop.is_set():
+            try:
+                item = pending.get_nowait()
+            except Queue.Empty:
+                break
+            try:
+                for value in fn(item):
+                    if not put((item, value, None)):
+                        return
+            except Exception:
+                put((item, None, sys.exc_info()))
+        put(done)
+
+    workers = [threading.Thread(target=worker)
+               for _ in range(min(max_workers, len(items)))]
+    for w in workers:
+        w.daemon = True
+        w.start()
+
+    remaining = len(workers)
+    try:
+        while remaining:
+            # Block with a timeout, otherwise Ctrl-C is ignored while waiting
+            try:
+                result = results.get(True, 1)
+            except Queue.Empty:
+                continue
+            if result is done:
+                remaining -= 1
+                continue
+            item, value, exc_info = result
+            if exc_info:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            yield item, value
+    finally:
+        # Also run when the consumer stops early (an exception, a break)
+        stop.set()
+
 def generate_pm2_config(args):
     """Generates PM2 configuration files
     
@@ -177,6 +249,23 @@ def generate_pm2_config(args):
     create_config_file('backend')
     create_config_file('frontend')
 
+def regions_from_arg(regions):
+    """Parse the --regions command line argument
+
+    Args:
+        regions (string): Comma-separated region names, or 'all'
+
+    Returns:
+        list: List of region names. Empty list when not supplied.
+    """
+    if not regions:
+        return []
+    if regions == 'all':
+        client = clients.client('ec2')
+        response = client.describe_regions()
+        return sorted(r['RegionName'] for r in response['Regions'])
+    return [r.strip() for r in regions.split(',') if r.strip()]
+
 def image_ids_from_names(image_names):
     """Get Image IDs from given Image Names
     
@@ -186,12 +275,7 @@ def image_ids_from_names(image_names):
     Returns:
         list: List of Image IDs
     """
-    ec2 = boto3.resource('ec2')
-    images = ec2.images.filter(Filters=[{
-        'Name': 'name',
-        'Values': image_names
-    }])
-    return [i.image_id for i in images]
+    return resolver.image_ids(image_names)
 
 def instance_ids_from_names(inst_names):
     """Get Instance IDs from Instance Names
@@ -202,12 +286,7 @@ def instance_ids_from_names(inst_names):
     Returns:
         list: List of Instance IDs
     """
-    ec2 = boto3.resource('ec2')
-    instances = ec2.instances.filter(Filters=[{
-        'Name': 'tag-value',
-        'Values': inst_names
-    }])
-    return [i.instance_id for i in instances]
+    return resolver.instance_ids(inst_names)
 
 def instance_names_from_ids(inst_ids):
     """Return Instance names from given Instance IDs
@@ -218,98 +297,42 @@ def instance_names_from_ids(inst_ids):
     Returns:
         list: List of Instance Names
     """
-    ec2 = boto3.resource('ec2')
-    instances = ec2.instances.filter(
-                    Filters=[{
-                        'Name': 'instance-id',
-                        'Values': inst_ids
-                }])
-    inst_names = []
-    for i in instances:
-        for t in i.tags:
-            if 'Key' == 'Name':
-                inst_names.append(t['Value'])
-    return inst_names
-
-def poll_image_till_available(image):
-    """Poll for image to be 'available'
-    
-    Args:
-        image (ec2.Image): Image to poll 
-    
-    Returns:
-        bool: True if Image available, False otherwise
-    """
-    # print "Waiting for image state to be 'available'..."
-    # print "\nIt might take upto 5 minutes. Please wait...\n"
-    
-    start_time = time.time()
-    while True:
-        status = image.state
-        if status == "available":
-            # print "\nCreated Image is now 'available'.\n"
-            return True
-        else:
-            if (time.time() - start_time) > 300:
-                print "\nWaited for ~5 minutes. Backup image creation failed.\n"
-                return False
-            time.sleep(15)
-            image.reload()
-            continue
+    return resolver.instance_names(inst_ids)
 
 def generate_filters(args):
-    """Generate Filters from command line arguments
+    """Generate a filter query from command line arguments
+
+    The --state, --image, --name and --user flags are turned into terms
+    ahead of any --where expression. Names and users match the 'Name' and
+    'User' tags only.
     
     Args:
         args (dict): Command line arguments parsed using Docopt
     
     Returns:
-        list: List of filters as key-value pairs. Empty list for insufficent data.
+        filters.Query: EC2 Filters and client-side terms (see filters)
+
+    Raises:
+        ValueError: Invalid --where expression
     """
-    def compose_filters(name, values):
-        return [{
-            'Name': name,
-            'Values': values
-        }]
-
-    # AMI Image Filters
-    if args.get('images'):
-        if args.get('--name'):
-            name = 'name'
-            values = args.get('--name')
-            return compose_filters(name, values)
-        else:
-            return []
-
-    # EC2 Instance Filters
-    if args.get('instances'):
-        filters = []
-
-        # Filter: Instance State Name (running, pending, etc.)
-        if args.get('--state'):
-            name = 'instance-state-name'
-            values = [args.get('--state')]
-            filters.extend(compose_filters(name, values))
-        
-        # Filter: Image ID (from supplied Image name)
-        if args.get('--image'):
-            name = 'image-id'
-            values = image_ids_from_names([args.get('--image')])
-            filters.extend(compose_filters(name, values))
-        
-        # Filter: Supplied name against tag values (independent of key)
-        if args.get('--name'):
-            name = 'tag-value'
-            values = args.get('--name')
-            filters.extend(compose_filters(name, values))
-        
-        # Filter: Supplied user name against tag values
-        if args.get('--user'):
-            name = 'tag-value'
-            values = [args.get('--user')]
-            filters.extend(compose_filters(name, values))
-
-        # Return final list of filters
-        return filters
-
-    return []
+    kind = 'image' if args.get('images') else 'instance'
+    terms = []
+
+    # Filter: Instance State Name (running, pending, etc.)
+    if kind == 'instance' and args.get('--state'):
+        terms.append(filters.Term('state', '=', [args.get('--state')]))
+
+    # Filter: Image ID (from supplied Image name)
+    if kind == 'instance' and args.get('--image'):
+        ids = image_ids_from_names([args.get('--image')])
+        terms.append(filters.Term('image', 'in', ids))
+
+    # Filter: Instance or Image name
+    if args.get('--name'):
+        terms.append(filters.Term('name', 'in', args.get('--name')))
+
+    # Filter: User who launched the instance ('User' tag)
+    if kind == 'instance' and args.get('--user'):
+        terms.append(filters.Term('user', '=', [args.get('--user')]))
+
+    return filters.compile_query(args.get('--where'), kind, terms)
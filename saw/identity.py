@@ -0,0 +1,125 @@
+""" Identity of the caller, for tagging and naming resources
+
+The caller is identified once with STS get_caller_identity, which works
+for IAM users as well as assumed roles and SSO, and the result is kept
+on disk for a configured time, so commands don't repeat the round trip.
+It is kept per profile and access key (see clients.account), so that
+credentials from the environment or a newly assumed role are looked up
+again rather than taken for those of the profile.
+
+Attributes:
+    IDENTITY_DIR (string): Directory holding one identity file per
+        profile and access key
+"""
+
+import os
+import json
+import hashlib
+import time
+import threading
+
+import clients
+from config import config
+
+IDENTITY_DIR = os.path.expanduser(config['identity']['path'])
+
+identities = {}
+lock = threading.Lock()
+
+
+def username_from_arn(arn):
+    """Derive a username from the ARN of a caller
+
+    Args:
+        arn (string): Caller ARN, e.g. arn:aws:iam::123456789012:user/alice
+            or arn:aws:sts::123456789012:assumed-role/Deploy/alice@corp.com
+
+    Returns:
+        string: IAM user name, role session name (without any e-mail
+            domain), federated user name, or 'root'
+    """
+    resource = arn.split(':', 5)[-1]
+    if resource == 'root':
+        return 'root'
+    parts = resource.split('/')
+    if parts[0] == 'assumed-role' and len(parts) > 2:
+        name = parts[2]
+    else:
+        name = parts[-1]
+    return name.split('@')[0]
+
+def identity_path(account):
+    """Path of the file holding the identity of some credentials
+
+    Args:
+        account (string): Profile and access key ID (see clients.account)
+    """
+    digest = hashlib.sha1(account).hexdigest()
+    return os.path.join(IDENTITY_DIR, '{}.json'.format(digest))
+
+def read(account, ttl=None):
+    """Read the stored identity of some credentials
+
+    Args:
+        account (string): Profile and access key ID (see clients.account)
+        ttl (int, optional): Maximum age in seconds. No limit if None.
+
+    Returns:
+        dict: Identity, or None if missing or stale
+    """
+    path = identity_path(account)
+    try:
+        age = time.time() - os.path.getmtime(path)
+        with open(path) as f:
+            found = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if ttl is not None and age > ttl:
+        return None
+    return found
+
+def write(account, found):
+    """Store the identity of some credentials, replacing any previous one"""
+    if not os.path.isdir(IDENTITY_DIR):
+        try:
+            os.makedirs(IDENTITY_DIR)
+        except OSError:
+            pass
+    path = identity_path(account)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(found, f)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        # Not being able to store it only costs a lookup next time
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def caller(profile=None):
+    """Identify the caller of a profile
+
+    Args:
+        profile (string, optional): AWS profile. From config if None.
+
+    Returns:
+        dict: Account, Arn, UserId and UserName of the caller
+    """
+    profile = profile or config['clients']['profile']
+    account = clients.account(profile)
+    with lock:
+        if account not in identities:
+            found = read(account, config['identity']['ttl'])
+            if found is None:
+                sts = clients.client('sts', profile=profile)
+                response = sts.get_caller_identity()
+                found = dict((k, response[k])
+                             for k in ('Account', 'Arn', 'UserId'))
+                found['UserName'] = username_from_arn(found['Arn'])
+                write(account, found)
+            identities[account] = found
+        return identities[account]
+
+def username(profile=None):
+    """Get the username of the caller (see caller)"""
+    return caller(profile)['UserName']
@@ -0,0 +1,32 @@
+""" Lazy imports of heavy dependencies
+
+boto3, botocore, requests and terminaltables take far longer to import
+than saw itself. Modules refer to them through lazy proxies, so they are
+only imported by the subcommands that use them (and never for saw -h).
+"""
+
+import sys
+import types
+import importlib
+
+
+class LazyModule(types.ModuleType):
+    """Proxy importing a module on first attribute access"""
+
+    def __getattr__(self, attr):
+        module = sys.modules.get(self.__name__)
+        if module is None or module is self:
+            module = importlib.import_module(self.__name__)
+        # Always delegate, so that later changes to the module are seen
+        return getattr(module, attr)
+
+def module(name):
+    """Get a module, deferring its import until it is used
+
+    Args:
+        name (string): Absolute module name (e.g. 'botocore.exceptions')
+
+    Returns:
+        module: The module if already imported, a lazy proxy otherwise
+    """
+    return sys.modules.get(name) or LazyModule(name)
@@ -0,0 +1,56 @@
+""" Machine-readable output of listings
+
+Records are written to the stream as soon as their page arrives, without
+building the full listing in memory, so large inventories can be piped
+into other tools in constant memory.
+
+Attributes:
+    FORMATS (list): Supported output formats ('table' is tabularize's)
+"""
+
+import sys
+import csv
+import json
+
+FORMATS = ['table', 'jsonl', 'csv', 'tsv']
+
+
+def encode(value):
+    """Encode a value for csv, which only handles byte strings"""
+    if value is None:
+        return ''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+def write(header, pages, fmt, stream=None):
+    """Write rows page by page in the given format
+
+    Args:
+        header (list): Column headers (keys of JSON records)
+        pages (iterable): Lists of rows, one list per page
+        fmt (string): 'jsonl', 'csv' or 'tsv'
+        stream (file, optional): Output stream. sys.stdout if None.
+
+    Returns:
+        int: Number of records written
+    """
+    stream = stream or sys.stdout
+    count = 0
+    if fmt == 'jsonl':
+        for rows in pages:
+            for row in rows:
+                stream.write(json.dumps(dict(zip(header, row)),
+                                        default=str) + '\n')
+            count += len(rows)
+            stream.flush()
+        return count
+
+    writer = csv.writer(stream, delimiter='\t' if fmt == 'tsv' else ',',
+                        lineterminator='\n')
+    writer.writerow([encode(h) for h in header])
+    for rows in pages:
+        writer.writerows([encode(v) for v in row] for row in rows)
+        count += len(rows)
+        stream.flush()
+    return count
@@ -0,0 +1,71 @@
+""" Compact records projected from describe_* responses
+
+Resources are projected as soon as their page arrives, down to the
+attributes listed in config.json, into namedtuples (tuples with empty
+__slots__). The full response dicts can then be dropped right away.
+
+Attributes:
+    types (dict): Attribute names -> record type, created on first use
+"""
+
+import collections
+
+import resolver
+
+types = {}
+
+
+def record_type(attrs):
+    """Get the record type for a list of attributes
+
+    Args:
+        attrs (list): Attribute names
+
+    Returns:
+        type: namedtuple class with one field per attribute
+    """
+    key = tuple(attrs)
+    if key not in types:
+        types[key] = collections.namedtuple('Record', attrs, rename=True)
+    return types[key]
+
+def value(resource, attr):
+    """Value of an attribute of a resource, as shown in listings
+
+    Args:
+        resource (dict): Resource details from a describe_* response
+        attr (string): Attribute name
+
+    Returns:
+        string: Value. Empty string if missing.
+    """
+    if attr == 'Name' and 'Name' not in resource:
+        v = resolver.tag_name(resource.get('Tags'))
+    elif attr == 'Tags':
+        v = ', '.join('{} = {}'.format(t['Key'], t['Value'])
+                      for t in resource.get('Tags', []))
+    elif attr == 'State' and isinstance(resource.get(attr), dict):
+        v = resource[attr]['Name']
+    else:
+        v = resource.get(attr)
+    if v is None:
+        return ''
+    return v if isinstance(v, basestring) else str(v)
+
+def project(resources, attrs, region=None):
+    """Project resources down to the given attributes
+
+    Args:
+        resources (iterable): Resource dicts
+        attrs (list): Attribute names
+        region (string, optional): Region, added as first field if set
+
+    Returns:
+        list: One record per resource
+    """
+    if region:
+        make = record_type(['Region'] + attrs)._make
+        return [make([region] + [value(r, a) for a in attrs])
+                for r in resources]
+    make = record_type(attrs)._make
+    return [make([value(r, a) for a in attrs]) for r in resources]
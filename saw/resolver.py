@@ -0,0 +1,173 @@
+""" Name <-> ID resolution for EC2 instances and images
+
+All names (or IDs) asked for at once are resolved with a single describe
+call. Results are kept in a bidirectional in-process index, so later
+lookups in the same command don't hit the EC2 API again.
+
+Attributes:
+    index (dict): Per resource type, maps of name -> list of IDs ('ids')
+        and ID -> name ('names')
+"""
+
+import clients
+import filters
+import helpers
+
+index = {
+    'instance': {'ids': {}, 'names': {}},
+    'image': {'ids': {}, 'names': {}}
+}
+
+
+def tag_name(tags):
+    """Value of the 'Name' tag, if any
+
+    Args:
+        tags (list): List of tag key-value pairs
+
+    Returns:
+        string: Name, or None when the resource isn't named
+    """
+    for t in tags or []:
+        if t['Key'] == 'Name':
+            return t['Value']
+    return None
+
+def add(resource_type, resource_id, name):
+    """Record a resource in the index
+
+    Args:
+        resource_type (string): 'instance' or 'image'
+        resource_id (string): Instance or Image ID
+        name (string): Name of the resource (None if unnamed)
+    """
+    entries = index[resource_type]
+    entries['names'][resource_id] = name
+    if name is not None:
+        ids = entries['ids'].setdefault(name, [])
+        if resource_id not in ids:
+            ids.append(resource_id)
+
+def add_instances(instances):
+    """Index instances from a describe_instances response
+
+    Args:
+        instances (list): List of instance dicts
+    """
+    for i in instances:
+        add('instance', i['InstanceId'], tag_name(i.get('Tags')))
+
+def add_images(images):
+    """Index images from a describe_images response
+
+    Args:
+        images (list): List of image dicts
+    """
+    for i in images:
+        add('image', i['ImageId'], i.get('Name'))
+
+def clear():
+    """Forget all indexed resources, e.g. between commands of a daemon"""
+    for entries in index.values():
+        entries['ids'].clear()
+        entries['names'].clear()
+
+def describe_instances(filters):
+    """Fetch and index all instances matching filters"""
+    client = clients.client('ec2')
+    for page in helpers.paginate(client, 'describe_instances',
+                                 Filters=filters):
+        for r in page['Reservations']:
+            add_instances(r['Instances'])
+
+def describe_images(filters):
+    """Fetch and index all images matching filters"""
+    client = clients.client('ec2')
+    for page in helpers.paginate(client, 'describe_images',
+                                 Filters=filters):
+        add_images(page['Images'])
+
+def resolve(resource_type, keys, by, describe, filter_name):
+    """Look up keys in the index, fetching unknown ones in one batch
+
+    Keys not found by the API are remembered as missing, so they aren't
+    looked up again either. Names with EC2 wildcards (* and ?) are sent
+    along every time and never remembered, as they stand for whatever
+    resources match them: they get the IDs of all indexed resources
+    whose names match.
+
+    Args:
+        resource_type (string): 'instance' or 'image'
+        keys (list): Names or IDs to resolve
+        by (string): Index to look keys up in ('ids' or 'names')
+        describe (function): Fetches and indexes resources given filters
+        filter_name (string): EC2 filter matching keys
+
+    Returns:
+        dict: Key -> list of IDs (by 'ids') or name (by 'names')
+    """
+    entries = index[resource_type][by]
+    patterns = sorted(set(k for k in keys
+                          if by == 'ids' and filters.wildcards(k)))
+    unknown = sorted(set(k for k in keys
+                         if k not in entries and k not in patterns))
+    if unknown or patterns:
+        describe([{'Name': filter_name, 'Values': unknown + patterns}])
+        for k in unknown:
+            entries.setdefault(k, [] if by == 'ids' else None)
+    found = dict((k, entries[k]) for k in keys if k not in patterns)
+    for pattern in patterns:
+        match = filters.from_wildcard(pattern).match
+        found[pattern] = [i for name, ids in sorted(entries.items())
+                          if match(name) for i in ids]
+    return found
+
+def instance_ids(names):
+    """Get Instance IDs from Instance Names ('Name' tag)
+
+    Args:
+        names (list): List of Instance Names
+
+    Returns:
+        list: List of Instance IDs
+    """
+    entries = resolve('instance', names, 'ids', describe_instances,
+                      'tag:Name')
+    return [i for n in names for i in entries[n]]
+
+def instance_names(ids):
+    """Get Instance Names ('Name' tag) from Instance IDs
+
+    Args:
+        ids (list): List of Instance IDs
+
+    Returns:
+        list: List of Instance Names. Unnamed instances are left out.
+    """
+    entries = resolve('instance', ids, 'names', describe_instances,
+                      'instance-id')
+    return [entries[i] for i in ids if entries[i] is not None]
+
+def image_ids(names):
+    """Get Image IDs from Image Names
+
+    Args:
+        names (list): List of Image Names
+
+    Returns:
+        list: List of Image IDs
+    """
+    entries = resolve('image', names, 'ids', describe_images, 'name')
+    return [i for n in names for i in entries[n]]
+
+def image_names(ids):
+    """Get Image Names from Image IDs
+
+    Args:
+        ids (list): List of Image IDs
+
+    Returns:
+        list: List of Image Names. Unnamed images are left out.
+    """
+    entries = resolve('image', ids, 'names', describe_images, 'image-id')
+    return [entries[i] for i in ids if entries[i] is not None]
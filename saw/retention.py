@@ -0,0 +1,276 @@
+""" Retention of backup images (AMIs), and pruning of the rest
+
+Backup images are named <PREFIX>_<SOURCE>_<EPOCH> by backup and
+<PREFIX>_<SOURCE>_<USER>_<EPOCH> by publish (user names upper-cased), and
+are grouped by source instance name. A name ending with an upper-case
+segment reads both ways (BACKUP_api_V2_<EPOCH> is a backup of api_V2,
+or one of api published by V2): it is settled by which of the instance
+names exists or, when neither does (the instance was removed), by
+whether V2 is a known user. Images it doesn't settle are left alone.
+Within a source, an image is kept if any rule keeps it:
+
+- the newest N images
+- images newer than D days
+- grandfather-father-son: the newest image of each of the last N days,
+  weeks and months that have images
+
+All other images are deregistered along with their EBS snapshots, many
+at once, as fast as the scheduler allows. Calls still throttled once
+botocore gives up are retried with backoff.
+
+Attributes:
+    Backup (namedtuple): Source instance name (None if ambiguous), user
+        ('' for backup images), creation time (seconds since epoch) and
+        image dict
+    NAME (regex): Backup image name, after its prefix
+    USER (regex): User name, as written by publish
+    AMBIGUOUS (string): Rule given for images of ambiguous source
+    PERIODS (list): GFS rules, as (name, function of a time giving its
+        period)
+"""
+
+import re
+import time
+import datetime
+import calendar
+import collections
+
+import lazy
+import clients
+import helpers
+import tracing
+import waiters
+from config import config
+
+exceptions = lazy.module('botocore.exceptions')
+
+Backup = collections.namedtuple('Backup', ['source', 'user', 'time',
+                                           'image'])
+
+NAME = re.compile(r'_(?P<source>.+)_(?P<epoch>\d{9,})$')
+USER = re.compile(r'[A-Z0-9.@+=,-]*[A-Z][A-Z0-9.@+=,-]*$')
+AMBIGUOUS = 'ambiguous name'
+
+utc = datetime.datetime.utcfromtimestamp
+PERIODS = [
+    ('daily', lambda t: utc(t).date()),
+    ('weekly', lambda t: utc(t).isocalendar()[:2]),
+    ('monthly', lambda t: (utc(t).year, utc(t).month))
+]
+
+
+def creation_time(image):
+    """Creation time of an image, in seconds since epoch"""
+    created = image.get('CreationDate', '')[:19]
+    try:
+        return calendar.timegm(time.strptime(created, '%Y-%m-%dT%H:%M:%S'))
+    except ValueError:
+        return 0
+
+def readings(source):
+    """Possible (source, user) pairs of a name between prefix and epoch"""
+    found = [(source, '')]
+    rest, _, user = source.rpartition('_')
+    if rest and USER.match(user):
+        found.append((rest, user))
+    return found
+
+def candidates(images, prefix='BACKUP'):
+    """Instance names settling the source of ambiguous backup names
+
+    Args:
+        images (iterable): Image dicts
+        prefix (string, optional): Image name prefix
+
+    Returns:
+        list: Instance names to look up (see parse)
+    """
+    names = set()
+    for image in images:
+        name = image.get('Name') or ''
+        if not name.startswith(prefix):
+            continue
+        match = NAME.match(name[len(prefix):])
+        if match:
+            found = readings(match.group('source'))
+            if len(found) > 1:
+                names.update(source for source, _ in found)
+    return sorted(names)
+
+def parse(image, prefix='BACKUP', sources=None, users=None):
+    """Read the source, user and time of a backup image from its name
+
+    Args:
+        image (dict): Image, as in describe_images
+        prefix (string, optional): Image name prefix
+        sources (set, optional): Existing instance names, settling
+            ambiguous names (see candidates)
+        users (set, optional): Known user names, upper-cased, settling
+            ambiguous names of backups of removed instances
+
+    Returns:
+        Backup: Backup, or None if not named as one. Its source is None
+            if the name reads as the backup of several instances and
+            sources don't tell which.
+    """
+    name = image.get('Name') or ''
+    if not name.startswith(prefix):
+        return None
+    match = NAME.match(name[len(prefix):])
+    if not match:
+        return None
+    found = readings(match.group('source'))
+    if len(found) > 1:
+        existing = [r for r in found if r[0] in (sources or ())]
+        if not existing:
+            existing = [r for r in found if r[1] in (users or ())]
+        found = existing
+    source, user = found[0] if len(found) == 1 else (None, '')
+    return Backup(source, user, int(match.group('epoch')), image)
+
+def group(images, prefix='BACKUP', sources=None, users=None):
+    """Group backup images by source, newest first
+
+    Args:
+        images (iterable): Image dicts
+        prefix (string, optional): Image name prefix
+        sources (set, optional): Existing instance names (see parse)
+        users (set, optional): Known user names (see parse)
+
+    Returns:
+        dict: Source instance name -> list of Backups. Backups of
+            ambiguous source are under None.
+    """
+    by_source = collections.defaultdict(list)
+    for image in images:
+        backup = parse(image, prefix, sources, users)
+        if backup:
+            by_source[backup.source].append(backup)
+    for backups in by_source.values():
+        backups.sort(key=lambda b: (b.time, creation_time(b.image)),
+                     reverse=True)
+    return dict(by_source)
+
+def retain(backups, keep=1, days=None, daily=0, weekly=0, monthly=0,
+           now=None):
+    """Apply retention rules to the backups of a source
+
+    Args:
+        backups (list): Backups, newest first
+        keep (int, optional): Keep the newest images
+        days (float, optional): Keep images newer than this many days
+        daily (int, optional): Keep the newest image of as many days
+        weekly (int, optional): Keep the newest image of as many weeks
+        monthly (int, optional): Keep the newest image of as many months
+        now (float, optional): Current time. time.time() if None.
+
+    Returns:
+        dict: Image ID -> list of rules keeping it, for kept images
+    """
+    now = now or time.time()
+    kept = collections.defaultdict(list)
+    for b in backups[:keep]:
+        kept[b.image['ImageId']].append('last {}'.format(keep))
+    if days is not None:
+        for b in backups:
+            if b.time >= now - days * 86400:
+                kept[b.image['ImageId']].append(
+                    'newer than {:g} days'.format(days))
+    counts = {'daily': daily, 'weekly': weekly, 'monthly': monthly}
+    for name, period in PERIODS:
+        seen = set()
+        for b in backups:
+            if len(seen) >= counts[name]:
+                break
+            key = period(b.time)
+            if key not in seen:
+                seen.add(key)
+                kept[b.image['ImageId']].append(name)
+    return dict(kept)
+
+def plan(images, prefix='BACKUP', sources=None, users=None, **rules):
+    """Decide which backup images to keep
+
+    Images of ambiguous source are always kept, as they can't be told
+    apart from the backups of another instance.
+
+    Args:
+        images (iterable): Image dicts
+        prefix (string, optional): Image name prefix
+        sources (set, optional): Existing instance names (see parse)
+        users (set, optional): Known user names (see parse)
+        **rules: Retention rules (see retain)
+
+    Returns:
+        list: (Backup, list of rules keeping it) pairs by source, newest
+            first. Images to prune have no rules.
+    """
+    groups = group(images, prefix, sources, users)
+    ambiguous = groups.pop(None, [])
+    decisions = []
+    for source, backups in sorted(groups.items()):
+        kept = retain(backups, **rules)
+        decisions.extend((b, kept.get(b.image['ImageId'], []))
+                         for b in backups)
+    decisions.extend((b, [AMBIGUOUS]) for b in ambiguous)
+    return decisions
+
+def snapshot_ids(image):
+    """EBS snapshot IDs of an image"""
+    mappings = image.get('BlockDeviceMappings', [])
+    return [m['Ebs']['SnapshotId'] for m in mappings
+            if m.get('Ebs', {}).get('SnapshotId')]
+
+def call(method, **kwargs):
+    """Make an API call, retrying it while throttled
+
+    Args:
+        method (function): Client method
+        **kwargs: Arguments of the call
+
+    Returns:
+        dict: Response
+    """
+    delays = waiters.backoff()
+    for attempt in range(config['prune']['retries'] + 1):
+        try:
+            return method(**kwargs)
+        except exceptions.ClientError as e:
+            code = e.response['Error']['Code']
+            if (code not in tracing.THROTTLE_CODES or
+                    attempt == config['prune']['retries']):
+                raise
+        time.sleep(next(delays))
+
+def prune(images):
+    """Deregister images and delete their snapshots, many at once
+
+    Snapshots are deleted once their image is deregistered, as they
+    can't be deleted while in use.
+
+    Args:
+        images (list): Image dicts, as in describe_images
+
+    Returns:
+        list: Result dict per image with ImageId, ImageName, Snapshots
+            (number deleted), State ('deleted' or 'failed') and Reason
+    """
+    client = clients.client('ec2')
+    by_image = dict((i['ImageId'], i) for i in images)
+
+    def delete(image_id):
+        image = by_image[image_id]
+        result = {'ImageId': image['ImageId'], 'ImageName': image['Name'],
+                  'Snapshots': 0, 'State': 'deleted', 'Reason': ''}
+        try:
+            call(client.deregister_image, ImageId=image['ImageId'])
+            for snapshot_id in snapshot_ids(image):
+                call(client.delete_snapshot, SnapshotId=snapshot_id)
+                result['Snapshots'] += 1
+        except exceptions.ClientError as e:
+            result['State'] = 'failed'
+            result['Reason'] = e.response['Error']['Message']
+        yield result
+
+    results = dict(helpers.fan_out(by_image.keys(), delete))
+    return [results[i['ImageId']] for i in images]
@@ -4,22 +4,49 @@
 saw - Command line utility for AWS EC2 scaffolding and backup.
 
 Usage:
-    saw launch --name INSTANCE_NAME ... [--id=IMAGE_ID]
-    saw publish --source SOURCE_INSTANCE_NAME --dest DEST_INSTANCE_NAME
-    saw backup --id INSTANCE_ID --name IMAGE_NAME [--desc=DESCRIPTION]
-    saw images [filter --name=IMAGE_NAME]
+    saw launch --name INSTANCE_NAME ... [--id=IMAGE_ID] [--eip]
+               [--trace] [--trace-json=FILE]
+    saw publish --source SOURCE_INSTANCE_NAME --dest DEST_INSTANCE_NAME ...
+                [--count=COUNT] [--no-reboot] [--trace] [--trace-json=FILE]
+    saw backup (--id INSTANCE_ID ... | --tag TAG | --all-running)
+               [--name IMAGE_NAME] [--desc=DESCRIPTION] [--no-reboot]
+               [--trace] [--trace-json=FILE]
+    saw images [filter --name=IMAGE_NAME] [--where=EXPRESSION [--explain]]
+               [--page-size=PAGE_SIZE]
+               [--regions=REGIONS] [--refresh | --cached] [--output=FORMAT]
+               [--trace] [--trace-json=FILE]
+    saw images prune [--name=IMAGE_NAME] [--keep=N] [--days=DAYS]
+                     [--daily=N] [--weekly=N] [--monthly=N] [--dry-run]
+                     [--trace] [--trace-json=FILE]
     saw instances [filter [--state=INSTANCE_STATE] [--image=IMAGE_NAME] 
                                  [--name=INSTANCE_NAME] [--user=USER]]
-    saw elastic_ips
+                  [--where=EXPRESSION [--explain]]
+                  [--page-size=PAGE_SIZE] [--regions=REGIONS]
+                  [--refresh | --cached] [--output=FORMAT] [--watch]
+                  [--trace] [--trace-json=FILE]
+    saw elastic_ips [--regions=REGIONS] [--refresh | --cached]
+                    [--output=FORMAT] [--trace] [--trace-json=FILE]
+    saw elastic_ips assign (--id INSTANCE_ID ... | --name INSTANCE_NAME ...)
+                    [--trace] [--trace-json=FILE]
+    saw instance_types refresh [--regions=REGIONS]
+                       [--trace] [--trace-json=FILE]
+    saw instance_types [--vcpus=VCPUS] [--memory=MEMORY] [--smallest]
+                       [--output=FORMAT]
+    saw serve
     saw -h | --help
 
 Commands:
     launch                            Launches new EC2 instance(s)  
     publish                           Publish to production from staging instance
-    backup                            Create backup AMI Image from EC2 Instance                           
+    backup                            Create backup AMI Images from EC2 Instances                           
     instances                         Lists all instances in current region
     images                            Lists all images owned by you
+    prune                             Remove backup images beyond retention rules
     elastic_ips                       Lists all elastic IPs
+    assign                            Give instances Elastic IPs, allocating as needed
+    instance_types                    Lists instance types from local catalog
+    refresh                           Update local instance type catalog
+    serve                             Answer listings from a warm process
     filter                            Apply filter on resource
 
 Arguments:
@@ -32,7 +59,22 @@ Arguments:
     INSTANCE_STATE                    Current state of the instance (running | terminated | 
                                       shutting-down | pending | stopping | stopped)
     IMAGE_ID                          Amazon Machine Image ID
-    IMAGE_NAME                        Amazon Machine Image Name
+    IMAGE_NAME                        Amazon Machine Image Name (or name prefix)
+    TAG                               Tag to select instances by (KEY=VALUE)
+    FORMAT                            Output format (table | jsonl | csv | tsv)
+    PAGE_SIZE                         Number of results fetched per API call
+    REGIONS                           Comma-separated region names, or 'all'
+    FILE                              Path of the file to write
+    COUNT                             Number of instances per name
+    N                                 Number of images (or periods) to keep
+    DAYS                              Number of days
+    VCPUS                             Minimum number of vCPUs
+    MEMORY                            Minimum memory in GiB
+    EXPRESSION                        Terms joined with AND, each FIELD=VALUE,
+                                      FIELD!=VALUE, FIELD~REGEX or
+                                      FIELD [NOT] IN (VALUE,...). Fields are
+                                      id, name, state, tag:KEY and more, e.g.
+                                      "tag:Team=data AND type~m5.*"
 
 Options:
     --name RESOURCE_NAME              AWS Resource Name
@@ -43,181 +85,653 @@ Options:
     --state INSTANCE_STATE            AWS EC2 Instance State Name
     --image IMAGE_NAME                AMI Name
     --user USER                       User Name
+    --count COUNT                     Instances to launch per destination
+    --no-reboot                       Create images without rebooting instances
+    --tag TAG                         Back up instances with given tag (KEY=VALUE)
+    --all-running                     Back up all running instances
+    --eip                             Give launched instances Elastic IPs
+    --keep N                          Keep the newest N backups per instance [default: 1]
+    --days DAYS                       Keep backups newer than DAYS days
+    --daily N                         Keep the newest backup of each of the last N days
+    --weekly N                        Keep the newest backup of each of the last N weeks
+    --monthly N                       Keep the newest backup of each of the last N months
+    --dry-run                         Show what would be pruned, without pruning
+    --page-size PAGE_SIZE             Results per API call (default from config.json)
+    --regions REGIONS                 AWS Regions to query in parallel
+    --refresh                         Bypass local cache and update it
+    --cached                          Use local cache regardless of its age
+    --where EXPRESSION                Filter expression
+    --explain                         Show what is filtered by EC2 and locally
+    --watch                           Keep showing instances as they change
+    --vcpus VCPUS                     Instance types with at least VCPUS vCPUs
+    --memory MEMORY                   Instance types with at least MEMORY GiB
+    --smallest                        Only the smallest matching instance type
+    --trace                           Show time spent in API calls at exit
+    --trace-json FILE                 Write every API call as JSON at exit
+    --output FORMAT                   Output format [default: table]
     -h, --help                        Show help message
 """
 
 import os
+import re
 import sys
 import time
+import atexit
 import json
 import collections
 
 from docopt import docopt
-import boto3
-from botocore.exceptions import ClientError
-from terminaltables import AsciiTable
 
+import clients
+import filters
 import tabularize
 import helpers
+import identity
 import slack
+import tracing
+import scheduler
+import cache
+import cassette
+import daemon
+import catalog
+import backups
+import addresses
+import retention
+import resolver
+import waiters
+import watch
+import snapshot
+import output
 from config import config
     
+# Options repeated in any usage pattern, which docopt always makes lists
+REPEATED = set(re.findall(r'(--[\w-]+)(?:[ =][A-Z_]+)? \.\.\.', __doc__))
+
+def backup_targets(args):
+    """Get IDs of instances to back up from command line arguments
+
+    Args:
+        args (dict): User-supplied command line arguments
+
+    Returns:
+        list: List of Instance IDs
+    """
+    if args.get('--all-running'):
+        return backups.targets_from_filters([{
+            'Name': 'instance-state-name',
+            'Values': ['running']
+        }])
+    if args.get('--tag'):
+        key, equals, value = args.get('--tag').partition('=')
+        if not key or not equals:
+            sys.exit("--tag takes KEY=VALUE, not {}".format(args.get('--tag')))
+        return backups.targets_from_filters([{
+            'Name': 'tag:' + key,
+            'Values': [value]
+        }, {
+            'Name': 'instance-state-name',
+            'Values': ['running', 'stopped']
+        }])
+    inst_ids = args.get('--id')
+    if type(inst_ids) is not list:
+        inst_ids = [inst_ids]
+    return inst_ids
 
 def backup(args):
-    """Creates AMI (Image) for an EC2 instance.
+    """Creates AMIs (Images) for EC2 instances.
+
+    With a single instance, --name is used as the image name. Otherwise
+    (or without --name) images are named <PREFIX>_<INSTANCE NAME>_<EPOCH>,
+    with --name as prefix if supplied, 'BACKUP' otherwise.
+
+    Asks for confirmation first when instances are selected by --tag or
+    --all-running, or when there are several of them.
 
     Args:
         args (dict): User-supplied command line arguments
     
     Returns:
-        ec2.Image: Image resource
+        list: Result dict per instance (see backups.run), or None if
+            not confirmed
     """
-    print "Creating backup. This might take upto 5 minutes."
-    print "Go, have a cup of coffee and offer one to the developer as well!\n"
-
-    ec2 = boto3.resource('ec2')
     ami_name = args.get('--name')
     if type(ami_name) is list:
-        ami_name = ami_name[0]
+        ami_name = ami_name[0] if ami_name else None
     desc = args.get('--desc')
-    inst_id = args.get('--id')
-    instance = ec2.Instance(inst_id)
+    no_reboot = bool(args.get('--no-reboot'))
+    inst_ids = backup_targets(args)
+    if not inst_ids:
+        return []
+    if ((args.get('--tag') or args.get('--all-running') or
+            len(inst_ids) > 1) and
+            not helpers.confirm_backup(len(inst_ids), not no_reboot)):
+        return None
+
+    print "Creating backup(s). This might take upto 5 minutes."
+    print "Go, have a cup of coffee and offer one to the developer as well!\n"
 
-    new_args = {}
-    new_args['Name'] = ami_name
-    new_args['Description'] = desc if desc else ''
+    if len(inst_ids) == 1 and ami_name:
+        targets = [(inst_ids[0], ami_name)]
+    else:
+        resolver.instance_names(inst_ids)
+        names = resolver.index['instance']['names']
+        secs_since_epoch = int(time.time())
+        targets = [(i, backups.image_name(ami_name or 'BACKUP',
+                                          names.get(i) or i,
+                                          secs_since_epoch))
+                   for i in inst_ids]
+
+    results = backups.run(targets, desc if desc else '',
+                          no_reboot=no_reboot)
+    cache.invalidate()
+    return results
+
+def available_images(results):
+    """Snapshot of images of successful backups
 
-    image = instance.create_image(**new_args)
-    is_available = helpers.poll_image_till_available(image)
-    if is_available:
-        image.reload()
-    return image
+    Args:
+        results (list): Backup results (see backups.run)
+
+    Returns:
+        snapshot.Snapshot: Images that are available
+    """
+    return snapshot.images(r['Image'] for r in results
+                           if r['State'] == 'available')
+
+def launch_configs(names, username, image_id=None):
+    """Compose run_instances arguments for instances to launch
+
+    Tags are applied to all instances of a request, so there is one
+    request per distinct name, for as many instances as it is given.
 
-def launch_instances(args):
+    Args:
+        names (list): Instance names, repeated for several instances
+        username (string): Value of the 'User' tag
+        image_id (string, optional): AMI to launch. From config if None.
+
+    Returns:
+        OrderedDict: Instance name -> run_instances arguments
+    """
+    counts = collections.OrderedDict()
+    for name in names:
+        counts[name] = counts.get(name, 0) + 1
+
+    configs = collections.OrderedDict()
+    for name, count in counts.items():
+        launch_config = dict(config['launch'])
+        if image_id:
+            launch_config['ImageId'] = image_id
+        launch_config['MaxCount'] = count
+        launch_config['MinCount'] = min(launch_config['MinCount'], count)
+        launch_config['TagSpecifications'] = [{
+            'ResourceType': 'instance',
+            'Tags': [{'Key': 'Name', 'Value': name},
+                     {'Key': 'User', 'Value': username}]
+        }]
+        configs[name] = launch_config
+    return configs
+
+def start_instances(configs):
+    """Launch instances, all requests at once, and wait for them to run
+
+    Args:
+        configs (OrderedDict): Instance name -> run_instances arguments
+
+    If a request fails, the instances launched by the others are listed
+    before its error is raised, as they keep running.
+
+    Returns:
+        snapshot.Snapshot: Instances created
+    """
+    client = clients.client('ec2')
+
+    def create(name):
+        try:
+            response = client.run_instances(**configs[name])
+        except Exception:
+            yield None, sys.exc_info()
+            return
+        yield [i['InstanceId'] for i in response['Instances']], None
+
+    created, failed = {}, []
+    for name, (ids, exc_info) in helpers.fan_out(configs.keys(), create):
+        if exc_info:
+            failed.append((name, exc_info))
+        else:
+            created[name] = ids
+    if failed:
+        cache.invalidate()
+        for name in configs:
+            if name in created:
+                print "Launched {}: {}".format(name, ', '.join(created[name]))
+        name, exc_info = failed[0]
+        print "Launching {} failed.".format(name)
+        raise exc_info[0], exc_info[1], exc_info[2]
+    inst_ids = [i for name in configs for i in created[name]]
+
+    # Wait for the whole fleet to enter running state
+    states = waiters.wait('instance', inst_ids, callback=waiters.progress)
+    for inst_id, (state, reason, _) in states.items():
+        if state != 'running':
+            print "Instance {} is {}. {}".format(inst_id, state, reason)
+    cache.invalidate()
+
+    # Details from the last poll are reported, without describing again
+    return snapshot.instances(states[i][2] for i in inst_ids)
+
+def launch_instances(args, username=None):
     """Launch EC2 instance(s) from given configuration
     
     Args:
         args (dict): User-supplied command line arguments
+        username (string, optional): Value of the 'User' tag. Caller's
+            username (see identity) if None.
     
     Returns:
-        list: List of ec2.Instance resources created
+        snapshot.Snapshot: Instances created
     """
     # Use AMI image ID, if supplied
-    if args.get('--id'):
-        image_id = args.get('--id')
-        if image_id:
-            config['launch']['ImageId'] = image_id
+    image_id = args.get('--id')
+    if type(image_id) is list:
+        image_id = image_id[0] if image_id else None
 
-    # Set number of instances to launch
-    i_count = len(args['--name'])
-    if i_count > 1:
-        config['launch']['MaxCount'] = i_count
-    
-    # Create instance(s) 
-    ec2 = boto3.resource('ec2')
-    instances = ec2.create_instances(**config['launch'])
-
-    # Get current user's name to add as tag
-    iam = boto3.resource('iam')
-    username = iam.CurrentUser().user_name
-
-    for element in zip(instances, args['--name']):
-        i = element[0]
-        name = element[1]
-        # Wait for instance to enter running state
-        i.wait_until_running()
-        # Reload instance attributes
-        i.load()
-        # Add Name Tag to instance
-        i.create_tags(Tags=[{'Key': 'Name',
-                             'Value': name},
-                            {'Key': 'User',
-                             'Value': username}])
-    return instances
+    username = username or identity.username()
+    return start_instances(launch_configs(args['--name'], username,
+                                          image_id))
 
 def publish(args):
-    """Publish to a production instance from staging instance
+    """Publish to production instances from a staging instance
     Creates an AMI from given source instance and launches the 
-    production instance from this AMI
+    production instances from this AMI, all at once
+
+    The caller and the source instance are looked up concurrently, and
+    launch requests are ready before the AMI is.
 
     Args:
         args (dict): User-supplied command line arguments
     
     Returns:
-        list: List of production ec2.Instance resources 
+        snapshot.Snapshot: Production instances
     """
     source_inst_name = args.get('--source')
-    dest_inst_name = args.get('--dest')
-    new_args = {}
-    
-    # Get current user's name
-    iam = boto3.resource('iam')
-    username = iam.CurrentUser().user_name
+    dest_inst_names = args.get('--dest')
+    if type(dest_inst_names) is not list:
+        dest_inst_names = [dest_inst_names]
+    count = int(args.get('--count') or 1)
+    new_args = {'--no-reboot': args.get('--no-reboot')}
+
+    def lookup(step):
+        if step == 'username':
+            yield identity.username()
+        else:
+            yield helpers.instance_ids_from_names([source_inst_name])
+
+    found = dict(helpers.fan_out(['username', 'source'], lookup))
+    username = found['username']
+    inst_ids = found['source']
 
     secs_since_epoch = int(time.time())
     new_args['--name'] = ('BACKUP_' + source_inst_name +
                           '_' + username.upper() + '_' + 
                           str(secs_since_epoch))
 
-    inst_ids = helpers.instance_ids_from_names([source_inst_name])
     if len(inst_ids):
         new_args['--id'] = inst_ids[0]
     else:
         print "No instance found with given source name. Exiting.\n"
         sys.exit()
 
+    configs = launch_configs([n for n in dest_inst_names
+                              for _ in range(count)], username)
+
     # Create AMI from source instance
-    try:
-        image = backup(new_args)
-    except ClientError as e:
-        print e
+    results = backup(new_args)
+    images = available_images(results)
+    if not images.resources:
+        if results:
+            print "Backup failed: {} {}".format(results[0]['State'],
+                                                results[0]['Reason'])
+        else:
+            print "Backup failed: no image was created."
         print "\nExiting.\n"
         sys.exit()
+    slack.report(images)
+    image = images.resources[0]
 
-    # Launch Production Instance from this Image
-    print "Launching Production Instance...\n"
-    instances = launch_instances({'--id': image.image_id,
-                                  '--name': [dest_inst_name]})
-    
-    ## TODO
-    # slack.post(instances)
-    # slack.post(image(s))
-    return instances
-
-def main():
-    """Entry point to saw"""
-    args = docopt(__doc__)
+    # Launch Production Instances from this Image
+    print "Launching Production Instance(s)...\n"
+    for launch_config in configs.values():
+        launch_config['ImageId'] = image['ImageId']
+    return start_instances(configs)
+
+def prune_images(args):
+    """Remove backup images beyond retention rules (see retention)
+
+    Images named with --name as prefix ('BACKUP' if not supplied) are
+    grouped by instance. Pending images are left alone, and so are images
+    whose names don't tell which instance they back up (listed apart).
+
+    Args:
+        args (dict): User-supplied command line arguments
+
+    Returns:
+        list: Result dict per removed image (see retention.prune), or
+            None if nothing was removed
+    """
+    prefix = args.get('--name')
+    if type(prefix) is list:
+        prefix = prefix[0] if prefix else None
+    prefix = prefix or 'BACKUP'
+    days = args.get('--days')
+    rules = {
+        'keep': int(args.get('--keep') or 1),
+        'days': float(days) if days else None,
+        'daily': int(args.get('--daily') or 0),
+        'weekly': int(args.get('--weekly') or 0),
+        'monthly': int(args.get('--monthly') or 0)
+    }
+
+    # Always list afresh, as the cache may hold images already removed
+    client = clients.client('ec2')
+    pages = helpers.paginate(client, 'describe_images', Owners=['self'],
+                             Filters=[{'Name': 'name',
+                                       'Values': [prefix + '_*']},
+                                      {'Name': 'state',
+                                       'Values': ['available', 'failed',
+                                                  'error', 'invalid']}])
+    images = [i for page in pages for i in page['Images']]
+    # Settle names reading as backups of several instances
+    names = retention.candidates(images, prefix)
+    resolver.instance_ids(names)
+    sources = set(n for n in names if resolver.index['instance']['ids'][n])
+    # Publish backups of removed instances are told by their user
+    users = set([identity.username().upper()]) if names else set()
+    decisions = retention.plan(images, prefix, sources, users, **rules)
+    doomed = [b.image for b, kept in decisions if not kept]
+    ambiguous = [b.image['Name'] for b, kept in decisions
+                 if kept == [retention.AMBIGUOUS]]
+
+    tabularize.retention([d for d in decisions
+                          if d[1] != [retention.AMBIGUOUS]])
+    if ambiguous:
+        print ("{} image(s) are never pruned, as their names don't tell "
+               "which instance they back up:".format(len(ambiguous)))
+        for name in ambiguous:
+            print "    " + name
+        print
+    if args.get('--dry-run'):
+        print "{} of {} backup images would be pruned.\n".format(
+            len(doomed), len(decisions))
+        return None
+    if not doomed:
+        print "Nothing to prune.\n"
+        return None
+    if not helpers.confirm_prune(len(doomed)):
+        return None
+    results = retention.prune(doomed)
+    cache.invalidate()
+    return results
+
+def assign_elastic_ips(inst_ids, instances=None):
+    """Make sure instances have Elastic IPs (see addresses.assign)
+
+    Args:
+        inst_ids (list): Instance IDs
+        instances (snapshot.Snapshot, optional): Snapshot of the instances,
+            updated with their new public IPs
+
+    Returns:
+        list: Result dict per instance (see addresses.assign)
+    """
+    results = addresses.assign(inst_ids)
+    cache.invalidate()
+    if instances:
+        ips = dict((r['InstanceId'], r['PublicIp']) for r in results
+                   if r['State'] != 'failed')
+        for i in instances.resources:
+            i['PublicIpAddress'] = ips.get(i['InstanceId'],
+                                           i.get('PublicIpAddress'))
+    return results
+
+def listing_query(args):
+    """Filter query for listings, from command line arguments
+
+    Exits with a message if the --where expression isn't valid.
+
+    Args:
+        args (dict): User-supplied command line arguments
+
+    Returns:
+        filters.Query: Query, or None when not filtering
+    """
+    if not args.get('filter') and not args.get('--where'):
+        return None
+    try:
+        return helpers.generate_filters(args)
+    except ValueError as e:
+        sys.exit(str(e))
+
+def page_size(args):
+    """Page size for listings, from command line or configuration
+
+    Args:
+        args (dict): User-supplied command line arguments
+
+    Returns:
+        int: Number of results to fetch per API call
+    """
+    size = args.get('--page-size')
+    return int(size) if size else config['page_size']
+
+def cache_mode(args):
+    """Cache mode for listings, from command line arguments
+
+    Args:
+        args (dict): User-supplied command line arguments
+
+    Returns:
+        string: 'refresh', 'cached' or 'ttl' (see cache.paginate)
+    """
+    if args.get('--refresh'):
+        return 'refresh'
+    if args.get('--cached'):
+        return 'cached'
+    return 'ttl'
+
+def report_calls(table=True, path=None):
+    """Report traced API calls, once queued Slack messages are posted
+
+    Args:
+        table (bool, optional): Print a summary table on stderr
+        path (string, optional): Write all calls as JSON to this file
+    """
+    slack.flush()
+    if path:
+        tracing.write(path)
+    if table:
+        rows = [[str(v) for v in row] for row in tracing.summary()]
+        sys.stderr.write('\nAPI calls\n\n{}\n'.format(
+            tabularize.tabularize([tracing.SUMMARY_HEADER] + rows)))
+        rows = [[str(v) for v in row] for row in scheduler.metrics()]
+        sys.stderr.write('\nScheduler\n\n{}\n'.format(
+            tabularize.tabularize([scheduler.METRICS_HEADER] + rows)))
+
+def command_usage(command):
+    """Usage text narrowed down to the patterns of a command
+
+    docopt tries every usage pattern on every run, so its cost grows
+    with the number of commands. Only patterns of the command given are
+    kept, along with the rest of the text (options, etc.).
+
+    Args:
+        command (string): First command line argument
+
+    Returns:
+        string: Usage text, in full if no pattern is of the command
+    """
+    head, _, rest = __doc__.partition('Usage:\n')
+    patterns, _, tail = rest.partition('\n\n')
+    selected = []
+    keep = False
+    for line in patterns.split('\n'):
+        words = line.split()
+        if words[0] == 'saw':
+            keep = words[1] == command
+        if keep:
+            selected.append(line)
+    if not selected:
+        return __doc__
+    return '{}Usage:\n{}\n\n{}'.format(head, '\n'.join(selected), tail)
+
+def parse_args(argv):
+    """Parse command line arguments (see command_usage)
+
+    Args:
+        argv (list): Command line arguments, without the program name
+
+    Returns:
+        dict: Arguments, with only those of the given command. Options
+            repeated in any pattern (see REPEATED) are lists.
+    """
+    doc = __doc__
+    if argv and not argv[0].startswith('-'):
+        doc = command_usage(argv[0])
+    args = docopt(doc, argv)
+    # Keep them lists when the patterns of the command don't repeat them
+    for option in REPEATED:
+        if option in args and not isinstance(args[option], list):
+            args[option] = [] if args[option] is None else [args[option]]
+    return args
+
+def main(argv=None):
+    """Entry point to saw
+
+    Listings are answered by the daemon when it runs (see daemon).
+
+    Args:
+        argv (list, optional): Command line arguments, without the
+            program name. From sys.argv if None.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+        status = daemon.forward(argv)
+        if status is not None:
+            sys.exit(status)
+    args = parse_args(argv)
+    cassette.from_environment()
+    if args.get('--trace') or args.get('--trace-json'):
+        tracing.enable()
+        atexit.register(report_calls, args.get('--trace'),
+                        args.get('--trace-json'))
     # print args
+    config['cache']['mode'] = cache_mode(args)
+
+    # Commands without --output in their usage (see parse_args) get none
+    fmt = args.get('--output') or 'table'
+    if fmt not in output.FORMATS:
+        sys.exit("Unknown output format: {}".format(fmt))
+    # Headings only go with tables, leaving other formats parseable
+    heading = fmt == 'table'
+
+    # Show how a listing would be filtered, without listing
+    if args.get('--explain'):
+        print filters.explain(listing_query(args))
+        return
+
+    # Answer listings of other saw processes, keeping everything warm
+    if args.get('serve'):
+        daemon.serve(main)
 
     # Enlist EC2 instances
-    if args.get('instances'):
-        print "\nInstances\n"
-        kwargs = {}
-        if args.get('filter'):
-            filters = helpers.generate_filters(args)
-            kwargs['Filters'] = filters
+    elif args.get('instances'):
+        if args.get('--watch') and (fmt != 'table' or args.get('--regions')):
+            sys.exit("--watch only shows tables, for the default region")
+        query = listing_query(args)
+        if heading:
+            print "\nInstances\n"
+        kwargs = {'fmt': fmt}
+        if query:
+            kwargs['Filters'] = query.filters
+            kwargs['predicate'] = filters.predicate(query)
+        kwargs['page_size'] = page_size(args)
+        if args.get('--watch'):
+            try:
+                watch.watch(kwargs.get('Filters'), kwargs.get('predicate'))
+            except KeyboardInterrupt:
+                print
+            return
+        kwargs['regions'] = helpers.regions_from_arg(args.get('--regions'))
         tabularize.instances(**kwargs)
     
+    # Prune backup images (AMIs)
+    elif args.get('images') and args.get('prune'):
+        print "\nPruning backup images\n"
+        results = prune_images(args)
+        if results:
+            tabularize.prunes(results)
+
     # Enlist images (AMIs)
     elif args.get('images'):
-        print "\nImages\n"
-        kwargs = {}
-        if args.get('filter'):
-            filters = helpers.generate_filters(args)
-            kwargs['Filters'] = filters
+        query = listing_query(args)
+        if heading:
+            print "\nImages\n"
+        kwargs = {'fmt': fmt}
+        if query:
+            kwargs['Filters'] = query.filters
+            kwargs['predicate'] = filters.predicate(query)
+        kwargs['page_size'] = page_size(args)
+        kwargs['regions'] = helpers.regions_from_arg(args.get('--regions'))
         tabularize.images(**kwargs)
 
+    # Give instances Elastic IPs
+    elif args.get('elastic_ips') and args.get('assign'):
+        print "\nAssigning Elastic IPs\n"
+        inst_ids = (args.get('--id') or
+                    helpers.instance_ids_from_names(args.get('--name')))
+        if not inst_ids:
+            print "No instances found.\n"
+            return
+        tabularize.assignments(assign_elastic_ips(inst_ids))
+
     # Enlist Elastic IPs
     elif args.get('elastic_ips'):
-        print "\nElastic IPs\n"
-        tabularize.elastic_ips()
+        if heading:
+            print "\nElastic IPs\n"
+        regions = helpers.regions_from_arg(args.get('--regions'))
+        tabularize.elastic_ips(regions, fmt)
+
+    # Update or query the instance type catalog
+    elif args.get('instance_types'):
+        if args.get('refresh'):
+            def refresh(region):
+                yield catalog.refresh(region)
+
+            regions = helpers.regions_from_arg(args.get('--regions'))
+            for region, count in helpers.fan_out(regions or [None], refresh):
+                print "{} instance types in {}".format(
+                    count, catalog.region_name(region))
+            return
+        specs = catalog.query(int(args.get('--vcpus') or 0),
+                              float(args.get('--memory') or 0),
+                              limit=1 if args.get('--smallest') else None)
+        if specs is None:
+            sys.exit("No instance type catalog for {}. Run 'saw "
+                     "instance_types refresh' first.".format(
+                         catalog.region_name()))
+        if heading:
+            print "\nInstance Types\n"
+        tabularize.instance_types(specs, fmt)
 
     # Create Backup (Triggered)
     elif args.get('backup'):
         print "\nBackup\n"
-        image = backup(args)
-        slack.post(slack.parse(image))
-        tabularize.images([image.image_id])
+        results = backup(args)
+        if results is not None:
+            if not results:
+                print "No instances found to back up.\n"
+            else:
+                tabularize.backups(results)
+            slack.report(available_images(results))
 
     # Publish to production
     elif args.get('publish'):
@@ -225,23 +739,31 @@ def main():
             print "\nPublishing...\n"
             instances = publish(args)
             
-            slack.parse(instances)
+            slack.report(instances)
             
-            tabularize.instances([i.instance_id for i in instances])
+            tabularize.snapshot(instances)
 
     # Confirm and Launch EC2 Instance(s)
     elif args.get('launch'):
         if helpers.confirm_launch():
             print "\nLaunching instance(s)...\n"
             instances = launch_instances(args)
+            if not instances.resources:
+                print "No instance was launched (see above). Exiting.\n"
+                sys.exit(1)
             print "Done.\n"
-            tabularize.instances([i.instance_id for i in instances])
+            if args.get('--eip'):
+                print "Assigning Elastic IPs...\n"
+                tabularize.assignments(assign_elastic_ips(
+                    [i['InstanceId'] for i in instances.resources],
+                    instances))
+            tabularize.snapshot(instances)
             
-            slack.parse(instances)
+            slack.report(instances)
 
             # Generate PM2 configuration files
             helpers.generate_pm2_config({
-                'host': instances[0].public_ip_address
+                'host': instances.resources[0].get('PublicIpAddress')
             })
 
             print "Let's Do This!\n"
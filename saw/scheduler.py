@@ -0,0 +1,224 @@
+""" Process-wide scheduling of API calls
+
+Every call to AWS (made by clients of a scheduled session, see install)
+and to Slack goes through the scheduler, whichever thread makes it:
+
+- Calls of a service wait for one of its concurrency slots. The number
+  of slots adapts (AIMD): it grows by one for every round of calls that
+  went through, and is halved whenever a call is throttled.
+- Every attempt then takes a token from the bucket of its service and
+  category, refilled at the rate the API allows (e.g. EC2 allows far
+  more describe calls than mutating ones).
+
+Attributes:
+    METRICS_HEADER (list): Column headers of metrics rows
+    services (dict): Service name -> state of its concurrency control
+    buckets (dict): (service, category) -> token bucket (see token_bucket)
+"""
+
+import time
+import threading
+
+import tracing
+from config import config
+
+METRICS_HEADER = ['Service', 'Calls', 'Throttles', 'Concurrency',
+                  'Peak queue', 'Queued (s)']
+# Non-mutating EC2 actions have a bucket of their own
+DESCRIBE_PREFIXES = ('Describe', 'Get', 'List', 'Search')
+
+services = {}
+buckets = {}
+lock = threading.Lock()
+# Ticket of the call being made by each thread, for botocore's handlers
+calls = threading.local()
+
+
+def token_bucket(rate, burst=1):
+    """Make a token bucket, shared by all threads calling it
+
+    Args:
+        rate (float): Tokens added per second
+        burst (int, optional): Capacity of the bucket, i.e. the most
+            calls allowed at once after a quiet period
+
+    Returns:
+        function: Blocks until a token is available, then takes it
+    """
+    bucket_lock = threading.Lock()
+    bucket = {'tokens': float(burst), 'time': time.time()}
+
+    def acquire():
+        with bucket_lock:
+            now = time.time()
+            tokens = min(burst, bucket['tokens'] +
+                         (now - bucket['time']) * rate)
+            bucket['time'] = now
+            # Tokens go negative while callers queue up behind each other
+            bucket['tokens'] = tokens - 1
+            delay = (1 - tokens) / rate if tokens < 1 else 0
+        if delay > 0:
+            time.sleep(delay)
+    return acquire
+
+def category(service, operation):
+    """Rate limit category of an operation
+
+    Args:
+        service (string): Service name (e.g. 'ec2', 'slack')
+        operation (string): Operation name (e.g. 'DescribeInstances')
+
+    Returns:
+        string: 'describe', 'mutating', or the service name for services
+            with a bucket of their own in config (e.g. 'slack')
+    """
+    if service in config['scheduler']['buckets']:
+        return service
+    if operation.startswith(DESCRIBE_PREFIXES):
+        return 'describe'
+    return 'mutating'
+
+def bucket(service, name):
+    """Get the token bucket of a service and category, creating it"""
+    with lock:
+        if (service, name) not in buckets:
+            settings = config['scheduler']['buckets'][name]
+            buckets[(service, name)] = token_bucket(settings['rate'],
+                                                    settings['burst'])
+        return buckets[(service, name)]
+
+def state(service):
+    """Get the concurrency control state of a service, creating it"""
+    with lock:
+        if service not in services:
+            services[service] = {
+                'limit': float(config['scheduler']['concurrency']['initial']),
+                'active': 0, 'waiting': 0, 'peak': 0, 'queued': 0.0,
+                'calls': 0, 'throttles': 0,
+                'condition': threading.Condition(threading.Lock())
+            }
+        return services[service]
+
+def acquire(service, operation):
+    """Wait for a slot and a token for a call
+
+    Args:
+        service (string): Service name (e.g. 'ec2', 'slack')
+        operation (string): Operation name (e.g. 'DescribeInstances')
+
+    Returns:
+        dict: Ticket, to hand to retry, throttled and release
+    """
+    s = state(service)
+    with s['condition']:
+        if s['active'] >= int(s['limit']):
+            start = time.time()
+            s['waiting'] += 1
+            s['peak'] = max(s['peak'], s['waiting'])
+            # Wait with a timeout, otherwise Ctrl-C is ignored meanwhile
+            while s['active'] >= int(s['limit']):
+                s['condition'].wait(1)
+            s['waiting'] -= 1
+            s['queued'] += time.time() - start
+        s['active'] += 1
+    ticket = {'service': service,
+              'bucket': bucket(service, category(service, operation)),
+              'attempts': 0, 'throttled': False}
+    ticket['bucket']()
+    return ticket
+
+def retry(ticket):
+    """Wait for a token before an attempt, after the first one"""
+    ticket['bucket']()
+
+def throttled(ticket):
+    """Report a throttled attempt, halving the concurrency of its service"""
+    s = state(ticket['service'])
+    settings = config['scheduler']['concurrency']
+    with s['condition']:
+        s['throttles'] += 1
+        if not ticket['throttled']:
+            s['limit'] = max(settings['min'], s['limit'] / 2)
+        ticket['throttled'] = True
+
+def release(ticket):
+    """Free the slot of a finished call
+
+    Calls that went through without throttling grow the concurrency of
+    their service, by one slot for as many calls as there are slots.
+    """
+    s = state(ticket['service'])
+    settings = config['scheduler']['concurrency']
+    with s['condition']:
+        s['active'] -= 1
+        s['calls'] += 1
+        if not ticket['throttled']:
+            s['limit'] = min(settings['max'], s['limit'] + 1 / s['limit'])
+        s['condition'].notify_all()
+
+class Scheduled(object):
+    """Client base class holding a slot for the whole of every call
+
+    The slot is freed however the call ends, even if an event handler
+    raises before the request is made (e.g. a replay miss, see cassette).
+    Calls answered by handlers without any request are scheduled too.
+    """
+
+    def _make_api_call(self, operation_name, api_params):
+        service = self.meta.service_model.service_id.hyphenize()
+        ticket = acquire(service, operation_name)
+        calls.ticket = ticket
+        try:
+            return super(Scheduled, self)._make_api_call(operation_name,
+                                                         api_params)
+        finally:
+            calls.ticket = None
+            release(ticket)
+
+def install(session):
+    """Schedule all calls of a boto3 session's clients
+
+    Args:
+        session (boto3.Session): Session whose clients are scheduled
+    """
+    events = session._session.get_component('event_emitter')
+    events.register('creating-client-class', scheduled_class)
+    events.register('request-created', request_created)
+    events.register('response-received', response_received)
+
+def scheduled_class(base_classes, **kwargs):
+    base_classes.insert(0, Scheduled)
+
+def request_created(**kwargs):
+    ticket = getattr(calls, 'ticket', None)
+    if ticket is None:
+        return
+    ticket['attempts'] += 1
+    # The first attempt took its token along with its slot
+    if ticket['attempts'] > 1:
+        retry(ticket)
+
+def response_received(response_dict=None, parsed_response=None, **kwargs):
+    ticket = getattr(calls, 'ticket', None)
+    if ticket is None:
+        return
+    code = (parsed_response or {}).get('Error', {}).get('Code')
+    if ((response_dict or {}).get('status_code') == 429 or
+            code in tracing.THROTTLE_CODES):
+        throttled(ticket)
+
+def metrics():
+    """Metrics of every service scheduled so far
+
+    Returns:
+        list: Rows (see METRICS_HEADER)
+    """
+    rows = []
+    with lock:
+        items = sorted(services.items())
+    for service, s in items:
+        with s['condition']:
+            rows.append([service, s['calls'], s['throttles'],
+                         int(s['limit']), s['peak'],
+                         round(s['queued'], 3)])
+    return rows
@@ -1,98 +1,195 @@
-import sys
-import json
+""" Slack notifications
+
+Messages are queued and posted by a background worker, so commands never
+wait on Slack. Messages queued together are merged into one post, and
+whatever is still queued at exit is flushed within a time limit.
+"""
 
-import requests
-import boto3
+import json
+import time
+import atexit
+import Queue
+import threading
 
+import lazy
+import tracing
+import cassette
+import scheduler
+import waiters
+import records
 from config import config, SLACK_URL
 
+requests = lazy.module('requests')
+
+messages = Queue.Queue()
+worker = None
+session = None
+
 
 def post(payload):
-    """Makes POST request to Slack Webhook URL
-    
+    """Makes POST request to Slack Webhook URL, retrying on failures
+
     Args:
-        payload (dict/string): Request payload as dict/JSON string 
-    
+        payload (dict/string): Request payload as dict/JSON string
+
     Returns:
         bool: True for successful request, False otherwise
     """
+    global session
     if isinstance(payload, dict):
         payload = json.dumps(payload)
+    if session is None:
+        session = requests.Session()
 
     headers = {'Content-Type': 'application/json'}
-    try:
-        r = requests.post(SLACK_URL,
-                          data=payload, 
-                          headers=headers)
-        
-        if r.status_code != 200:
-            print "\nFailed to post on Slack. Reason: {}\n".format(r.content)
-            return False
-        else:
-            print "\nSuccessfully posted to Slack.\n"
+    delays = waiters.backoff(1, 10)
+    start = time.time()
+    throttles = 0
+    received = 0
+    for attempt in range(config['slack']['retries'] + 1):
+        if attempt:
+            time.sleep(next(delays))
+        ticket = scheduler.acquire('slack', 'post')
+        try:
+            r = cassette.post(session, SLACK_URL,
+                              data=payload,
+                              headers=headers,
+                              timeout=config['slack']['timeout'])
+        except requests.exceptions.RequestException as e:
+            scheduler.release(ticket)
+            reason = e
+            continue
+        if r.status_code == 429:
+            scheduler.throttled(ticket)
+        scheduler.release(ticket)
+        received += len(r.content)
+        if r.status_code == 200:
+            tracing.record('slack', 'post', start, attempt, throttles,
+                           len(payload) * (attempt + 1), received)
             return True
-    except requests.exceptions.RequestException as e:
-        print e
-        sys.exit(1)
+        reason = r.content
+        throttles += r.status_code == 429
+        # Only server errors and rate limiting are worth retrying
+        if r.status_code < 500 and r.status_code != 429:
+            break
+    tracing.record('slack', 'post', start, attempt, throttles,
+                   len(payload) * (attempt + 1), received, str(reason))
+    print "\nFailed to post on Slack. Reason: {}\n".format(reason)
+    return False
+
+def batch(payloads):
+    """Merge several messages into a single payload
+
+    Args:
+        payloads (list): Message payloads (dicts)
+
+    Returns:
+        dict: Payload with one attachment per message
+    """
+    if len(payloads) == 1:
+        return payloads[0]
+    return {'text': 'saw - {} notifications'.format(len(payloads)),
+            'attachments': payloads}
+
+def run():
+    """Worker loop posting queued messages, merging those queued together"""
+    while True:
+        payloads = [messages.get()]
+        while True:
+            try:
+                payloads.append(messages.get_nowait())
+            except Queue.Empty:
+                break
+        try:
+            post(batch(payloads))
+        finally:
+            for _ in payloads:
+                messages.task_done()
+
+def notify(payload):
+    """Queue a message for posting to Slack
+
+    Args:
+        payload (dict): Message payload
+    """
+    global worker
+    if not SLACK_URL or not payload:
+        return
+    if worker is None:
+        worker = threading.Thread(target=run)
+        worker.daemon = True
+        worker.start()
+    messages.put(payload)
+
+def flush(timeout=None):
+    """Wait for queued messages to be posted
+
+    Args:
+        timeout (float, optional): Maximum seconds to wait
+
+    Returns:
+        bool: True if all messages were handled, False on timeout
+    """
+    if timeout is None:
+        timeout = config['slack']['flush_timeout']
+    deadline = time.time() + timeout
+    with messages.all_tasks_done:
+        while messages.unfinished_tasks:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                print "\nGave up on {} Slack message(s).\n".format(
+                    messages.unfinished_tasks)
+                return False
+            messages.all_tasks_done.wait(remaining)
+    return True
+
+atexit.register(flush)
+
+def fields(resource, attrs):
+    """Compose Slack attachment fields from resource details
+
+    Args:
+        resource (dict): Image or instance details
+        attrs (list): Attributes to be shown
+
+    Returns:
+        list: List of field dicts
+    """
+    fields = []
+    for attr in attrs:
+        fields.append({'title': attr,
+                       'value': records.value(resource, attr),
+                       'short': True})
+    return fields
 
 def parse(data):
-    client = boto3.client('ec2')
-    
-    # If data is instance of ec2.Image
-    if str(type(data)) == "<class 'boto3.resources.factory.ec2.Image'>":
-        attrs = config['image_attributes']
-        image_details = client.describe_images(
-                            ImageIds=[data.image_id]
-                        )['Images'][0]
-        
-        # Pick attributes 
-        fields = []
-        for k, v in image_details.iteritems():
-            if k in attrs:
-                fields.append({'title': k,
-                               'value': v,
-                               'short': True})
-
-        # Compose payload
+    """Compose Slack messages from a snapshot of resources
+
+    Args:
+        data (snapshot.Snapshot): Images backed up or instances launched
+
+    Returns:
+        list: Message payload per resource
+    """
+    payloads = []
+    for resource in data.resources:
         payload = {}
-        payload['title'] = 'saw - Backup created'
-        payload['text'] = 'Backup Details'
-        payload['fields'] = fields
-        return payload
-
-    # If data is collection of ec2.Instances
-    elif str(type(data)) == "<class 'boto3.resources.collection.ec2.instancesCollection'>":
-        attrs = config['instance_attributes']
-        instances = []
-        reservations = client.describe_instances(
-                            InstanceIds=[i.instance_id for i in data]
-                       )['Reservations']
-        for r in reservations:
-            instances.extend(r['Instances'])
-
-        # Pick attributes
-        for i in instances:
-            fields = []
-            for attr in attrs:
-                if attr == 'State':
-                    v = i[attr]['Name']
-                elif attr == 'Name':
-                    v = [t['Value'] for t in i['Tags'] if t['Key'] == 'Name'][0]
-                else:
-                    v = i[attr]
-                fields.append({
-                              'title': attr,
-                              'value': v,
-                              'short': True})
-
-            # Compose payload 
-            payload = {}
+        if data.kind == 'image':
+            payload['title'] = 'saw - Backup created'
+            payload['text'] = 'Backup Details'
+            payload['fields'] = fields(resource, config['image_attributes'])
+        else:
             payload['text'] = "saw - Instances launched/published"
-            payload['fields'] = fields
-            # print json.dumps(payload, indent=2)
-
-            # Post to Slack
-            post(payload)
+            payload['fields'] = fields(resource,
+                                       config['instance_attributes'])
+        payloads.append(payload)
+    return payloads
 
-    return {}
+def report(data):
+    """Queue Slack messages for a snapshot of resources
 
+    Args:
+        data (snapshot.Snapshot): Images backed up or instances launched
+    """
+    for payload in parse(data):
+        notify(payload)
@@ -0,0 +1,37 @@
+""" Snapshots of resource state already fetched by a command
+
+Commands return the resource details they fetched (e.g. from their last
+waiter tick), so that reports (tables, Slack) don't describe them again.
+
+Attributes:
+    Snapshot (namedtuple): Resource kind ('image' or 'instance') and the
+        list of resource dicts, as returned by describe_images or
+        describe_instances
+"""
+
+import collections
+
+Snapshot = collections.namedtuple('Snapshot', ['kind', 'resources'])
+
+
+def images(resources):
+    """Snapshot of images
+
+    Args:
+        resources (iterable): Image dicts (None entries are left out)
+
+    Returns:
+        Snapshot: Snapshot of kind 'image'
+    """
+    return Snapshot('image', [r for r in resources if r])
+
+def instances(resources):
+    """Snapshot of instances
+
+    Args:
+        resources (iterable): Instance dicts (None entries are left out)
+
+    Returns:
+        Snapshot: Snapshot of kind 'instance'
+    """
+    return Snapshot('instance', [r for r in resources if r])
@@ -5,13 +5,20 @@ various AWS resources and their details
 """
 
 import json
+import time
 
-import boto3
-from terminaltables import AsciiTable
+import lazy
+import clients
 import helpers
 import slack
+import cache
+import catalog
+import output
+import records
 from config import config
 
+terminaltables = lazy.module('terminaltables')
+
 
 def tabularize(table_data):
     """Returns table data as string for tabulation
@@ -22,98 +29,255 @@ def tabularize(table_data):
     Returns:
         string: String repr of terminaltables.AsciiTable
     """
-    return AsciiTable(table_data).table
+    return terminaltables.AsciiTable(table_data).table
+
+def show(header, pages, resource, fmt=None, numbered=False):
+    """Print each page of rows as soon as it arrives
+
+    Tables are printed one per page. Other formats are streamed
+    record by record (see output.write).
+
+    Args:
+        header (list): Column headers
+        pages (iterable): Lists of rows, one list per page
+        resource (string): Resource name used when nothing is shown
+        fmt (string, optional): Output format. 'table' if None.
+        numbered (bool, optional): Add serial numbers to tables
+    """
+    if fmt and fmt != 'table':
+        output.write(header, pages, fmt)
+        return
+    if numbered:
+        header = ['S.No.'] + header
+    count = 0
+    for rows in pages:
+        if rows:
+            if numbered:
+                rows = [[str(count + n + 1)] + list(row)
+                        for n, row in enumerate(rows)]
+            print tabularize([header] + [list(row) for row in rows])
+            count += len(rows)
+    if not count:
+        print "\nSorry! No {} to show.\n".format(resource)
+
+def fetch(operation, regions=None, page_size=None, **kwargs):
+    """Fetch response pages for an EC2 describe operation
+
+    With regions supplied, all regions are queried at once and their
+    pages are interleaved as they arrive.
+
+    Args:
+        operation (string): Client method name (e.g. 'describe_instances')
+        regions (list, optional): Region names. Default region if empty.
+        page_size (int, optional): Number of results per API call
+        **kwargs: Arguments passed on to the operation
+
+    Yields:
+        tuple: (region, page). Region is None for the default region.
+    """
+    if not regions:
+        client = clients.client('ec2')
+        for page in cache.paginate(client, operation,
+                                   page_size=page_size, **kwargs):
+            yield None, page
+        return
+
+    def region_pages(region):
+        return cache.paginate(clients.client('ec2', region), operation,
+                              page_size=page_size, **kwargs)
+
+    for region, page in helpers.fan_out(regions, region_pages):
+        yield region, page
+
+def with_region(header, regions):
+    """Add Region column to header for multi-region listings"""
+    return ['Region'] + header if regions else header
+
+def image_rows(pages, predicate=None):
+    """Generate table rows for images, page by page
+    
+    Args:
+        pages (iterable): (region, page) pairs of describe_images responses
+        predicate (function, optional): Keeps only images it's true for
+    
+    Yields:
+        list: Records (see records.project) for a single page
+    """
+    for region, page in pages:
+        images = page['Images']
+        if predicate:
+            images = (i for i in images if predicate(i))
+        yield records.project(images, config['image_attributes'], region)
 
-def images(image_ids=[], **kwargs):
+def images(image_ids=[], page_size=None, regions=None, fmt=None,
+           predicate=None, **kwargs):
     """Tabulate Amazon Machine Images (AMIs)
     
     Args:
         image_ids (list, optional): List of Image IDs
+        page_size (int, optional): Number of images per API call
+        regions (list, optional): Regions to list images from
+        fmt (string, optional): Output format (see output.FORMATS)
+        predicate (function, optional): Client-side filter (see filters)
     """
-    client = boto3.client('ec2')
     args = {'Owners': ['self']}
     if 'Filters' in kwargs:
         args['Filters'] = kwargs['Filters']
     if len(image_ids):
         args['ImageIds'] = image_ids
-    response = client.describe_images(**args)
-    images = response['Images']
-    image_attrs = config['image_attributes']
-    header = image_attrs
-    table_data = [header]
-    for image in images:
-        row = []
-        for key, val in image.iteritems():
-            if key in image_attrs:
-                row.append(val)
-        table_data.append(row)
-    if len(table_data) == 1:
-        print "\nSorry! No images to show.\n"
-    else:
-        print tabularize(table_data)
+        page_size = None
+    pages = fetch('describe_images', regions, page_size, **args)
+    header = with_region(config['image_attributes'], regions)
+    show(header, image_rows(pages, predicate), 'images', fmt)
 
-def instances(instance_ids=[], **kwargs):
+def instance_rows(pages, predicate=None):
+    """Generate table rows for instances, page by page
+    
+    Args:
+        pages (iterable): (region, page) pairs of describe_instances responses
+        predicate (function, optional): Keeps only instances it's true for
+    
+    Yields:
+        list: Records (see records.project) for a single page
+    """
+    for region, page in pages:
+        instances = (i for r in page['Reservations'] for i in r['Instances']
+                     if not predicate or predicate(i))
+        yield records.project(instances, config['instance_attributes'],
+                              region)
+
+def instances(instance_ids=[], page_size=None, regions=None, fmt=None,
+              predicate=None, **kwargs):
     """Tabulate EC2 Instances
     
     Args:
         instance_ids (None, optional): List of instance IDs
+        page_size (int, optional): Number of instances per API call
+        regions (list, optional): Regions to list instances from
+        fmt (string, optional): Output format (see output.FORMATS)
+        predicate (function, optional): Client-side filter (see filters)
     """
-    client = boto3.client('ec2')
     args = {}
     if 'Filters' in kwargs:
         args['Filters'] = kwargs['Filters']
     if len(instance_ids):
         args['InstanceIds'] = instance_ids
-    response = client.describe_instances(**args)
-    reservations = response['Reservations']
-    instances = []
-    for r in reservations:
-        instances.extend(r['Instances'])
-    header = ['S.No.'] + config['instance_attributes']
-    table_data = [header]
-    for index, instance in enumerate(instances):
-        s_no = str(index + 1)
-        row = [s_no]
-        for h in header:
-            if h == 'Name':
-                for t in instance['Tags']:
-                    if t['Key'] == 'Name':
-                        row.append(t['Value'])
-                        break
-            elif h == 'Tags':
-                tags = helpers.convert_tags_to_string(instance['Tags'])
-                row.append(tags)
-            elif h == 'State':
-                row.append(instance['State']['Name'])        
-            elif h in instance.keys():
-                row.append(str(instance[h])) 
-        table_data.append(row)
-
-    # Show table only when there're data rows in table_data
-    if len(table_data) == 1:  # table_data has only header
-        print "\nSorry! No instances to show.\n"
+        page_size = None
+    pages = fetch('describe_instances', regions, page_size, **args)
+    header = with_region(config['instance_attributes'], regions)
+    show(header, instance_rows(pages, predicate), 'instances', fmt,
+         numbered=True)
+
+def snapshot(data):
+    """Tabulate a snapshot of resources, without calling the API
+    
+    Args:
+        data (snapshot.Snapshot): Images or instances
+    """
+    if data.kind == 'image':
+        header = config['image_attributes']
+        show(header, [records.project(data.resources, header)], 'images')
     else:
-        print tabularize(table_data)
+        header = config['instance_attributes']
+        show(header, [records.project(data.resources, header)],
+             'instances', numbered=True)
+
+def assignments(results):
+    """Tabulate summary of Elastic IP assignments
+
+    Args:
+        results (list): Assignment results (see addresses.assign)
+    """
+    header = ['InstanceId', 'PublicIp', 'AllocationId', 'State', 'Reason']
+    table_data = [header]
+    table_data.extend(helpers.extract_attributes(results, header))
+    print tabularize(table_data)
+
+def retention(decisions):
+    """Tabulate which backup images are kept and which pruned
+
+    Args:
+        decisions (list): Retention decisions (see retention.plan)
+    """
+    header = ['Instance', 'ImageName', 'ImageId', 'Created', 'Action',
+              'Kept by']
+    rows = [[b.source or '', b.image['Name'], b.image['ImageId'],
+             time.strftime('%Y-%m-%d %H:%M', time.gmtime(b.time)),
+             'keep' if kept else 'prune', ', '.join(kept)]
+            for b, kept in decisions]
+    show(header, [rows], 'backup images')
+
+def prunes(results):
+    """Tabulate summary of pruned images
+
+    Args:
+        results (list): Pruning results (see retention.prune)
+    """
+    header = ['ImageId', 'ImageName', 'Snapshots', 'State', 'Reason']
+    table_data = [header]
+    table_data.extend(helpers.extract_attributes(
+        [dict(r, Snapshots=str(r['Snapshots'])) for r in results], header))
+    print tabularize(table_data)
+
+def backups(results):
+    """Tabulate summary of backups
+    
+    Args:
+        results (list): Backup results (see backups.run)
+    """
+    header = ['InstanceId', 'ImageName', 'ImageId', 'State', 'Reason']
+    table_data = [header]
+    table_data.extend(helpers.extract_attributes(results, header))
+    print tabularize(table_data)
 
 def instance_type(instance_type):
-    """Tabulate Instance Type details
+    """Tabulate Instance Type details, from the local catalog
     
     Args:
         instance_type (string): Type of EC2 Instance
     """
+    spec = catalog.lookup(instance_type)
+    if spec is None:
+        print ("No details of {} in the instance type catalog. "
+               "Run 'saw instance_types refresh' to update it.".format(
+                   instance_type))
+        return
     headers = ['Resource', 'Specification']
     table_data = [headers]
-    details = config['instance_type_details'][instance_type]
-    for key, value in details.iteritems():
-        table_data.append([key, value])
+    table_data.extend([k, v] for k, v in zip(catalog.HEADER,
+                                            catalog.row(spec)))
     print tabularize(table_data)
 
-def elastic_ips():
-    """Tabulate Elastic IPs"""
-    client = boto3.client('ec2')
-    response = client.describe_addresses()
-    addrs = response['Addresses']
-    header = config['elastic_ip_attributes']
-    table_data = [header]
-    table_data.extend(helpers.extract_attributes(addrs, header))
-    print tabularize(table_data)
\ No newline at end of file
+def instance_types(specs, fmt=None):
+    """Tabulate instance types
+
+    Args:
+        specs (list): Instance types (see catalog.Spec)
+        fmt (string, optional): Output format (see output.FORMATS)
+    """
+    show(catalog.HEADER, [[catalog.row(s) for s in specs]],
+         'instance types', fmt)
+
+def elastic_ip_rows(pages):
+    """Generate table rows for Elastic IPs, page by page
+    
+    Args:
+        pages (iterable): (region, page) pairs of describe_addresses responses
+    
+    Yields:
+        list: Records (see records.project) for a single page
+    """
+    for region, page in pages:
+        yield records.project(page['Addresses'],
+                              config['elastic_ip_attributes'], region)
+
+def elastic_ips(regions=None, fmt=None):
+    """Tabulate Elastic IPs
+    
+    Args:
+        regions (list, optional): Regions to list Elastic IPs from
+        fmt (string, optional): Output format (see output.FORMATS)
+    """
+    pages = fetch('describe_addresses', regions)
+    header = with_region(config['elastic_ip_attributes'], regions)
+    show(header, elastic_ip_rows(pages), 'elastic IPs', fmt)
@@ -0,0 +1,153 @@
+""" Tracing of outbound API calls
+
+When enabled, every call made through botocore (EC2, IAM, ...) and every
+Slack post is recorded with its latency, retries, throttled attempts and
+payload sizes. botocore events are only hooked into once tracing is
+enabled, so tracing costs nothing when off.
+
+Attributes:
+    Call (namedtuple): Details of a single call
+    THROTTLE_CODES (set): Error codes of throttled requests
+    SUMMARY_HEADER (list): Column headers of summary rows
+    enabled (bool): Whether calls are being recorded
+    calls (list): Recorded calls
+"""
+
+import json
+import time
+import threading
+import collections
+
+Call = collections.namedtuple('Call', [
+    'service', 'operation', 'start', 'latency', 'retries', 'throttles',
+    'sent', 'received', 'error'])
+
+THROTTLE_CODES = set([
+    'Throttling', 'ThrottlingException', 'ThrottledException',
+    'RequestThrottled', 'RequestThrottledException', 'RequestLimitExceeded',
+    'TooManyRequestsException', 'SlowDown', 'PriorRequestNotComplete'])
+
+SUMMARY_HEADER = ['Service', 'Operation', 'Calls', 'Errors', 'Total (s)',
+                  'Avg (ms)', 'Max (ms)', 'Retries', 'Throttles',
+                  'Sent (KB)', 'Received (KB)']
+
+enabled = False
+calls = []
+lock = threading.Lock()
+
+
+def enable():
+    """Start recording calls (from sessions created from now on)"""
+    global enabled
+    enabled = True
+
+def record(service, operation, start, retries=0, throttles=0, sent=0,
+           received=0, error=None):
+    """Record a call, if tracing is enabled
+
+    Args:
+        service (string): Service name (e.g. 'ec2', 'slack')
+        operation (string): Operation name (e.g. 'DescribeInstances')
+        start (float): Time the call started at
+        retries (int, optional): Attempts after the first one
+        throttles (int, optional): Attempts rejected by rate limiting
+        sent (int, optional): Bytes sent over all attempts
+        received (int, optional): Bytes received over all attempts
+        error (string, optional): Error code, if the call failed
+    """
+    if not enabled:
+        return
+    call = Call(service, operation, start, time.time() - start, retries,
+                throttles, sent, received, error)
+    with lock:
+        calls.append(call)
+
+def instrument(session):
+    """Hook tracing into a boto3 session's botocore events
+
+    Args:
+        session (boto3.Session): Session whose clients are traced
+    """
+    events = session._session
+    events.register('before-parameter-build', started)
+    events.register('request-created', request_created)
+    events.register('response-received', response_received)
+    events.register('after-call', after_call)
+    events.register('after-call-error', after_call_error)
+
+def started(context, **kwargs):
+    context['trace'] = {'start': time.time(), 'attempts': 0, 'throttles': 0,
+                        'sent': 0, 'received': 0}
+
+def request_created(request, **kwargs):
+    stats = getattr(request, 'context', {}).get('trace')
+    if stats is not None:
+        stats['attempts'] += 1
+        stats['sent'] += len(request.body or '')
+
+def response_received(context, response_dict=None, parsed_response=None,
+                      **kwargs):
+    stats = context.get('trace')
+    if stats is None:
+        return
+    if response_dict:
+        stats['received'] += len(response_dict.get('body') or '')
+        if response_dict.get('status_code') == 429:
+            stats['throttles'] += 1
+            return
+    code = (parsed_response or {}).get('Error', {}).get('Code')
+    if code in THROTTLE_CODES:
+        stats['throttles'] += 1
+
+def finished(event_name, context, error):
+    stats = context.get('trace')
+    if stats is None:
+        return
+    _, service, operation = event_name.split('.', 2)
+    record(service, operation, stats['start'],
+           max(stats['attempts'] - 1, 0), stats['throttles'],
+           stats['sent'], stats['received'], error)
+
+def after_call(event_name, context, parsed=None, **kwargs):
+    finished(event_name, context,
+             (parsed or {}).get('Error', {}).get('Code'))
+
+def after_call_error(event_name, context, exception=None, **kwargs):
+    finished(event_name, context, type(exception).__name__)
+
+def summary():
+    """Aggregate recorded calls per service and operation
+
+    Returns:
+        list: Rows (see SUMMARY_HEADER), slowest operations first
+    """
+    groups = collections.OrderedDict()
+    with lock:
+        for c in calls:
+            groups.setdefault((c.service, c.operation), []).append(c)
+    rows = []
+    for (service, operation), group in groups.items():
+        total = sum(c.latency for c in group)
+        rows.append([service, operation, len(group),
+                     sum(1 for c in group if c.error),
+                     round(total, 3),
+                     int(total * 1000 / len(group)),
+                     int(max(c.latency for c in group) * 1000),
+                     sum(c.retries for c in group),
+                     sum(c.throttles for c in group),
+                     round(sum(c.sent for c in group) / 1024.0, 1),
+                     round(sum(c.received for c in group) / 1024.0, 1)])
+    return sorted(rows, key=lambda r: -r[4])
+
+def write(path):
+    """Write all recorded calls and their summary as JSON
+
+    Args:
+        path (string): Output file path
+    """
+    with lock:
+        recorded = [c._asdict() for c in calls]
+    with open(path, 'w') as f:
+        json.dump({'calls': recorded,
+                   'summary': [dict(zip(SUMMARY_HEADER, row))
+                               for row in summary()]}, f, indent=2)
@@ -0,0 +1,151 @@
+""" Waiting for many images or instances to settle
+
+Every tick polls all tracked resources with a single describe call.
+Ticks are spaced with exponential backoff and jitter, and every
+resource has its own deadline.
+
+Attributes:
+    KINDS (dict): Per resource kind, describe operation, filter name,
+        response keys and the states considered as still waiting
+"""
+
+import sys
+import time
+import random
+
+import clients
+import helpers
+import cassette
+from config import config
+
+KINDS = {
+    'image': {
+        'operation': 'describe_images',
+        'filter': 'image-id',
+        'waiting': ['pending']
+    },
+    'instance': {
+        'operation': 'describe_instances',
+        'filter': 'instance-id',
+        'waiting': ['pending']
+    }
+}
+
+
+def backoff(delay=None, max_delay=None):
+    """Generate delays growing exponentially, with jitter
+
+    Each delay is picked at random between half and all of the current
+    backoff, so that concurrent pollers don't tick in lockstep.
+
+    Args:
+        delay (float, optional): Initial delay in seconds
+        max_delay (float, optional): Upper bound on delays in seconds
+
+    Yields:
+        float: Seconds to sleep before the next tick
+    """
+    delay = delay or config['waiter']['delay']
+    max_delay = max_delay or config['waiter']['max_delay']
+    while True:
+        yield random.uniform(delay / 2.0, delay)
+        delay = min(delay * 2, max_delay)
+
+def states(client, kind, ids):
+    """Get states of many resources with a single describe call
+
+    Filters are used rather than IDs, so that resources not yet
+    visible to the API don't fail the call.
+
+    Args:
+        client (EC2.Client): boto3 EC2 client
+        kind (string): 'image' or 'instance'
+        ids (list): Resource IDs
+
+    Returns:
+        dict: ID -> (state, reason, resource) for resources found
+    """
+    found = {}
+    filters = [{'Name': KINDS[kind]['filter'], 'Values': ids}]
+    for page in helpers.paginate(client, KINDS[kind]['operation'],
+                                 Filters=filters):
+        if kind == 'image':
+            for i in page['Images']:
+                reason = i.get('StateReason', {}).get('Message', '')
+                found[i['ImageId']] = (i['State'], reason, i)
+        else:
+            for r in page['Reservations']:
+                for i in r['Instances']:
+                    reason = i.get('StateReason', {}).get('Message', '')
+                    found[i['InstanceId']] = (i['State']['Name'], reason, i)
+    return found
+
+def progress(settled, waiting, elapsed):
+    """Default progress callback, printing a status line"""
+    sys.stdout.write('\r{} done, {} pending ({}s elapsed) '.format(
+        settled, waiting, int(elapsed)))
+    if not waiting:
+        sys.stdout.write('\n')
+    sys.stdout.flush()
+
+def poll(kind, ids, timeout=None, callback=None):
+    """Wait for resources to leave their waiting state
+
+    IDs are removed from the given set as they settle. IDs may also be
+    added to it while iterating; they are tracked from the next tick,
+    with their own deadline.
+
+    Args:
+        kind (string): 'image' or 'instance'
+        ids (set): IDs of resources to wait for
+        timeout (int, optional): Seconds to wait for each resource
+        callback (function, optional): Called after every tick with the
+            number of settled and waiting resources and elapsed seconds
+
+    Yields:
+        tuple: (ID, state, reason, resource) as soon as a resource
+            settles, resource being its details from the last describe
+            call. State is 'timed out' for resources past their deadline.
+    """
+    timeout = timeout or config['waiter']['timeout']
+    client = clients.client('ec2')
+    delays = backoff()
+    start_time = time.time()
+    started = {}
+    settled = 0
+    while ids:
+        now = time.time()
+        for i in ids:
+            started.setdefault(i, now)
+        cassette.pause(next(delays))
+
+        found = states(client, kind, list(ids))
+        now = time.time()
+        for i in list(ids):
+            state, reason, resource = found.get(i, ('pending', '', None))
+            if state in KINDS[kind]['waiting']:
+                if now - started[i] < timeout:
+                    continue
+                state = 'timed out'
+                reason = 'Waited {} seconds'.format(timeout)
+            ids.discard(i)
+            settled += 1
+            yield i, state, reason, resource
+        if callback:
+            callback(settled, len(ids), time.time() - start_time)
+
+def wait(kind, ids, timeout=None, callback=None):
+    """Wait for a fixed set of resources to settle
+
+    Args:
+        kind (string): 'image' or 'instance'
+        ids (list): IDs of resources to wait for
+        timeout (int, optional): Seconds to wait for each resource
+        callback (function, optional): Progress callback (see poll)
+
+    Returns:
+        dict: ID -> (state, reason, resource)
+    """
+    return dict((i, (state, reason, resource))
+                for i, state, reason, resource
+                in poll(kind, set(ids), timeout, callback))
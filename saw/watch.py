@@ -0,0 +1,215 @@
+""" Watching instances change state
+
+The watched instances are listed once. Afterwards, every tick fetches
+only their states with describe_instance_status, and full details only
+for the instances whose state changed. Only changed rows are printed,
+with their state transition highlighted. A full listing picks up new
+instances and changes to other attributes every few seconds (the
+rescan_interval setting), however far the backoff went, so instances
+launched meanwhile show up while still pending.
+
+Ticks are spaced with backoff (see waiters.backoff), reset to the
+shortest delay as soon as something changes.
+
+Attributes:
+    Entry (namedtuple): State and record (see records) of an instance
+    COLORS (dict): State -> ANSI color code of its highlight
+    BATCH_SIZE (int): Most Instance IDs per describe_instance_status call
+"""
+
+import sys
+import time
+import collections
+
+import lazy
+import clients
+import helpers
+import records
+import tabularize
+import waiters
+from config import config
+
+exceptions = lazy.module('botocore.exceptions')
+
+Entry = collections.namedtuple('Entry', ['state', 'record'])
+
+COLORS = {
+    'pending': 33,
+    'running': 32,
+    'stopping': 33,
+    'stopped': 31,
+    'shutting-down': 33,
+    'terminated': 31,
+    'gone': 31
+}
+BATCH_SIZE = 100
+
+
+def entries(instances):
+    """Index instances by Instance ID
+
+    Args:
+        instances (iterable): Instance dicts
+
+    Returns:
+        dict: Instance ID -> Entry
+    """
+    instances = list(instances)
+    rows = records.project(instances, config['instance_attributes'])
+    return dict((i['InstanceId'], Entry(i['State']['Name'], row))
+                for i, row in zip(instances, rows))
+
+def scan(client, filters=None, predicate=None):
+    """List all watched instances
+
+    Args:
+        client (EC2.Client): boto3 EC2 client
+        filters (list, optional): EC2 Filters
+        predicate (function, optional): Client-side filter (see filters)
+
+    Returns:
+        dict: Instance ID -> Entry
+    """
+    pages = helpers.paginate(client, 'describe_instances',
+                             config['page_size'], Filters=filters or [])
+    return entries(i for page in pages for r in page['Reservations']
+                   for i in r['Instances']
+                   if not predicate or predicate(i))
+
+def states(client, ids):
+    """Get current states of instances
+
+    Args:
+        client (EC2.Client): boto3 EC2 client
+        ids (list): Instance IDs
+
+    Returns:
+        dict: Instance ID -> state name, for instances still known to EC2
+    """
+    found = {}
+    for n in range(0, len(ids), BATCH_SIZE):
+        response = client.describe_instance_status(
+            InstanceIds=ids[n:n + BATCH_SIZE], IncludeAllInstances=True)
+        for s in response['InstanceStatuses']:
+            found[s['InstanceId']] = s['InstanceState']['Name']
+    return found
+
+def details(client, ids):
+    """Get full details of instances, as entries"""
+    found = {}
+    for n in range(0, len(ids), BATCH_SIZE):
+        response = client.describe_instances(InstanceIds=ids[n:n + BATCH_SIZE])
+        found.update(entries(i for r in response['Reservations']
+                             for i in r['Instances']))
+    return found
+
+def diff(previous, current):
+    """Compare two snapshots of instances
+
+    Args:
+        previous (dict): Instance ID -> Entry, before
+        current (dict): Instance ID -> Entry, after. Instances missing
+            from it are left out, unless their entry is None (gone).
+
+    Returns:
+        list: (Instance ID, Entry before, Entry after) for changed
+            instances. Entries are None for new and gone instances.
+    """
+    return [(i, previous.get(i), entry) for i, entry in current.items()
+            if previous.get(i) != entry]
+
+def tick(client, previous, rescan=False, filters=None, predicate=None):
+    """Fetch changes to watched instances
+
+    Args:
+        client (EC2.Client): boto3 EC2 client
+        previous (dict): Instance ID -> Entry, updated in place
+        rescan (bool, optional): List all instances again, rather than
+            only checking the states of known ones
+        filters (list, optional): EC2 Filters, for rescans
+        predicate (function, optional): Client-side filter, for rescans
+
+    Returns:
+        list: Changes (see diff)
+    """
+    if rescan:
+        current = scan(client, filters, predicate)
+        # Watched instances no longer matching filters stay watched
+        missing = [i for i in previous if i not in current]
+        current.update(details(client, missing) if missing else {})
+    else:
+        try:
+            found = states(client, previous.keys())
+        except exceptions.ClientError as e:
+            if e.response['Error']['Code'] != 'InvalidInstanceID.NotFound':
+                raise
+            return tick(client, previous, True, filters, predicate)
+        changed = [i for i in previous if found.get(i) != previous[i].state]
+        current = details(client, [i for i in changed if i in found])
+    for i in previous:
+        if i not in current and (rescan or i not in found):
+            current[i] = None
+
+    changes = diff(previous, current)
+    for i, _, entry in changes:
+        if entry is None:
+            previous.pop(i, None)
+        else:
+            previous[i] = entry
+    return changes
+
+def highlight(state, color=False):
+    """Highlight a state with its ANSI color"""
+    if not color or state not in COLORS:
+        return state
+    return '\033[1;{}m{}\033[0m'.format(COLORS[state], state)
+
+def render(changes, color=False, stream=None):
+    """Print a line for every changed instance
+
+    Args:
+        changes (list): Changes (see diff)
+        color (bool, optional): Highlight states with ANSI colors
+        stream (file, optional): Output stream. sys.stdout if None.
+    """
+    stream = stream or sys.stdout
+    stamp = time.strftime('%H:%M:%S')
+    for i, before, after in sorted(changes):
+        old = before.state if before else 'new'
+        new = after.state if after else 'gone'
+        entry = after or before
+        values = [v for a, v in zip(config['instance_attributes'],
+                                    entry.record) if a != 'State']
+        transition = new if old == new else '{} -> {}'.format(
+            highlight(old, color), highlight(new, color))
+        stream.write('{}  {}  {}\n'.format(stamp, transition,
+                                           '  '.join(values)))
+    stream.flush()
+
+def watch(filters=None, predicate=None):
+    """Watch instances until interrupted
+
+    Args:
+        filters (list, optional): EC2 Filters selecting instances
+        predicate (function, optional): Client-side filter (see filters)
+    """
+    settings = config['watch']
+    client = clients.client('ec2')
+    current = scan(client, filters, predicate)
+    tabularize.show(config['instance_attributes'],
+                    [[e.record for e in current.values()]], 'instances',
+                    numbered=True)
+    color = sys.stdout.isatty()
+    delays = waiters.backoff(settings['min_delay'], settings['max_delay'])
+    due = time.time() + settings['rescan_interval']
+    while True:
+        # Never sleep past the next full listing
+        time.sleep(max(0, min(next(delays), due - time.time())))
+        rescan = time.time() >= due
+        if rescan:
+            due = time.time() + settings['rescan_interval']
+        changes = tick(client, current, rescan, filters, predicate)
+        if changes:
+            render(changes, color)
+            delays = waiters.backoff(settings['min_delay'],
+                                     settings['max_delay'])
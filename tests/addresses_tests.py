@@ -0,0 +1,52 @@
+import sys
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+from nose.tools import *
+
+from saw import addresses, clients
+
+class EC2(object):
+    def __init__(self, addresses):
+        self.addresses = addresses
+        self.allocated = 0
+
+    def describe_addresses(self):
+        return {'Addresses': [dict(a) for a in self.addresses]}
+
+    def allocate_address(self, Domain):
+        self.allocated += 1
+        address = {'PublicIp': '52.0.0.{}'.format(len(self.addresses)),
+                   'AllocationId': 'eipalloc-{}'.format(len(self.addresses)),
+                   'Domain': Domain}
+        self.addresses.append(address)
+        return dict(address)
+
+    def associate_address(self, InstanceId, AllocationId, AllowReassociation):
+        for a in self.addresses:
+            if a.get('AllocationId') == AllocationId:
+                a.update(InstanceId=InstanceId, AssociationId='eipassoc')
+        return {'AssociationId': 'eipassoc'}
+
+def test_assign():
+    ec2 = EC2([{'PublicIp': '52.0.0.0', 'AllocationId': 'eipalloc-0',
+                'Domain': 'vpc', 'InstanceId': 'i-1',
+                'AssociationId': 'eipassoc'},
+               {'PublicIp': '52.0.0.1', 'AllocationId': 'eipalloc-1',
+                'Domain': 'vpc'},
+               {'PublicIp': '54.0.0.1', 'Domain': 'standard'}])
+    clients.registry[('client', 'ec2', 'test-1', None)] = ec2
+    try:
+        results = addresses.assign(['i-1', 'i-2', 'i-3'], 'test-1')
+        assert_equal([(r['InstanceId'], r['PublicIp'], r['State'])
+                      for r in results],
+                     [('i-1', '52.0.0.0', 'existing'),
+                      ('i-2', '52.0.0.1', 'associated'),
+                      ('i-3', '52.0.0.3', 'associated')])
+        assert_equal(ec2.allocated, 1)
+
+        results = addresses.assign(['i-1', 'i-2', 'i-3'], 'test-1')
+        assert_equal([r['State'] for r in results], ['existing'] * 3)
+        assert_equal(ec2.allocated, 1)
+    finally:
+        clients.registry.pop(('client', 'ec2', 'test-1', None))
@@ -0,0 +1,102 @@
+import sys
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+from botocore.exceptions import ClientError
+from nose.tools import *
+
+from saw import backups, clients, saw
+
+def test_image_name():
+    assert_equal(backups.image_name('BACKUP', 'web', 1476800000),
+                 'BACKUP_web_1476800000')
+
+class EC2(object):
+    def __init__(self, instances=(), failing=()):
+        self.instances = list(instances)
+        self.failing = failing
+        self.images = []
+        self.most_pending = 0
+
+    def can_paginate(self, operation):
+        return False
+
+    def describe_instances(self, Filters):
+        values = dict((f['Name'], f['Values']) for f in Filters)
+        return {'Reservations': [{'Instances': [
+            i for i in self.instances
+            if i['State']['Name'] in values['instance-state-name']]}]}
+
+    def create_image(self, InstanceId, Name, Description, NoReboot):
+        if InstanceId in self.failing:
+            raise ClientError({'Error': {'Code': 'IncorrectState',
+                                         'Message': 'Instance is busy'}},
+                              'CreateImage')
+        image = {'ImageId': 'ami-' + InstanceId, 'Name': Name,
+                 'State': 'pending'}
+        self.images.append(image)
+        pending = [i for i in self.images if i['State'] == 'pending']
+        self.most_pending = max(self.most_pending, len(pending))
+        return {'ImageId': image['ImageId']}
+
+    def describe_images(self, Filters):
+        # Images become available once they've been seen pending
+        found = [dict(i) for i in self.images
+                 if i['ImageId'] in Filters[0]['Values']]
+        for i in self.images:
+            i['State'] = 'available'
+        return {'Images': found}
+
+def run(ec2, *args, **kwargs):
+    key = ('client', 'ec2', None, saw.config['clients']['profile'])
+    delay = saw.config['waiter']['delay']
+    clients.registry[key] = ec2
+    saw.config['waiter']['delay'] = 0.01
+    try:
+        return backups.run(*args, **kwargs)
+    finally:
+        saw.config['waiter']['delay'] = delay
+        clients.registry.pop(key)
+
+def test_run():
+    ec2 = EC2(failing=['i-3'])
+    targets = [('i-{}'.format(n), 'BACKUP_{}'.format(n)) for n in range(5)]
+    results = run(ec2, targets, max_in_flight=2)
+    assert_equal(ec2.most_pending, 2)
+    assert_equal([(r['InstanceId'], r['State']) for r in results],
+                 [('i-0', 'available'), ('i-1', 'available'),
+                  ('i-2', 'available'), ('i-3', 'failed'),
+                  ('i-4', 'available')])
+    assert_equal(results[3]['Reason'], 'Instance is busy')
+    assert_equal(results[3]['ImageId'], '')
+    assert_equal(results[0]['Image']['Name'], 'BACKUP_0')
+
+def test_targets_from_filters():
+    ec2 = EC2(instances=[{'InstanceId': 'i-1', 'State': {'Name': 'running'}},
+                         {'InstanceId': 'i-2', 'State': {'Name': 'stopped'}}])
+    key = ('client', 'ec2', None, saw.config['clients']['profile'])
+    clients.registry[key] = ec2
+    try:
+        assert_equal(saw.backup_targets({'--all-running': True}), ['i-1'])
+    finally:
+        clients.registry.pop(key)
+
+@raises(SystemExit)
+def test_tag_without_value():
+    saw.backup_targets({'--tag': 'Team'})
+
+def test_backup_asks_first():
+    ec2 = EC2(instances=[{'InstanceId': 'i-1', 'State': {'Name': 'running'}},
+                         {'InstanceId': 'i-2', 'State': {'Name': 'running'}}])
+    key = ('client', 'ec2', None, saw.config['clients']['profile'])
+    asked = []
+    confirm_backup = saw.helpers.confirm_backup
+    saw.helpers.confirm_backup = lambda *args: asked.append(args)
+    clients.registry[key] = ec2
+    try:
+        assert_is_none(saw.backup({'--all-running': True}))
+    finally:
+        saw.helpers.confirm_backup = confirm_backup
+        clients.registry.pop(key)
+    assert_equal(asked, [(2, True)])
+    assert_equal(ec2.images, [])
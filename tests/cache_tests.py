@@ -0,0 +1,65 @@
+import sys
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+import os
+import shutil
+import tempfile
+from nose.tools import *
+
+from saw import cache
+
+pages = [{'Addresses': [{'PublicIp': '10.0.0.1'}]},
+         {'Addresses': [{'PublicIp': '10.0.0.2'}]}]
+
+def use_temp_dir():
+    cache.CACHE_DIR = tempfile.mkdtemp()
+
+def remove_temp_dir():
+    shutil.rmtree(cache.CACHE_DIR)
+
+@with_setup(use_temp_dir, remove_temp_dir)
+def test_write_and_read():
+    assert_equal(list(cache.write('k', iter(pages))), pages)
+    assert_equal(list(cache.read('k', ttl=60)), pages)
+
+@with_setup(use_temp_dir, remove_temp_dir)
+def test_read_stale_entry():
+    list(cache.write('k', iter(pages)))
+    os.utime(cache.entry_path('k'), (0, 0))
+    assert_is_none(cache.read('k', ttl=60))
+    assert_equal(list(cache.read('k')), pages)
+
+@with_setup(use_temp_dir, remove_temp_dir)
+def test_interrupted_write_is_discarded():
+    g = cache.write('k', iter(pages))
+    next(g)
+    g.close()
+    assert_is_none(cache.read('k'))
+    assert_equal(os.listdir(cache.CACHE_DIR), [])
+
+@with_setup(use_temp_dir, remove_temp_dir)
+def test_evict_least_recently_used():
+    list(cache.write('old', iter(pages)))
+    list(cache.write('new', iter(pages)))
+    os.utime(cache.entry_path('old'), (0, 0))
+    cache.evict(max_size=os.path.getsize(cache.entry_path('new')))
+    assert_is_none(cache.read('old'))
+    assert_is_not_none(cache.read('new'))
+
+@with_setup(use_temp_dir, remove_temp_dir)
+def test_invalidate():
+    list(cache.write('k', iter(pages)))
+    cache.invalidate()
+    assert_is_none(cache.read('k'))
+
+@with_setup(use_temp_dir, remove_temp_dir)
+def test_held_until_entry_changes():
+    import collections
+    cache.memory = collections.OrderedDict()
+    try:
+        held = cache.held('k', 1.0, iter(pages))
+        assert_is(cache.held('k', 1.0, iter([])), held)
+        assert_equal(cache.held('k', 2.0, iter(pages[:1])), pages[:1])
+    finally:
+        cache.memory = None
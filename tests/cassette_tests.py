@@ -0,0 +1,109 @@
+import sys
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+import os
+import json
+import shutil
+import datetime
+import tempfile
+from nose.tools import *
+
+from saw import cassette, clients, scheduler
+
+directory = None
+
+def use_temp_dir():
+    global directory
+    directory = tempfile.mkdtemp()
+
+def remove_temp_dir():
+    cassette.stop()
+    shutil.rmtree(directory)
+
+def write_cassette(name, interactions):
+    cassette_path = path.join(directory, name)
+    with cassette.open_cassette(cassette_path, 'w') as f:
+        for interaction in interactions:
+            f.write(json.dumps(interaction) + '\n')
+    return cassette_path
+
+def described(instance_id):
+    return {'service': 'ec2', 'operation': 'DescribeInstances',
+            'params': {'InstanceIds': [instance_id]}, 'status': 200,
+            'response': {'Reservations': [{'Instances': [
+                {'InstanceId': instance_id}]}]},
+            'seconds': 0.5}
+
+@with_setup(use_temp_dir, remove_temp_dir)
+def test_replay_closest_call():
+    cassette.replay(write_cassette('c.jsonl.gz', [
+        described('i-1'), described('i-2')]))
+    client = clients.client('ec2', 'us-east-1')
+    response = client.describe_instances(InstanceIds=['i-2'])
+    assert_equal(response['Reservations'][0]['Instances'][0]['InstanceId'],
+                 'i-2')
+    # Calls nothing matches get the earliest call left
+    response = client.describe_instances(InstanceIds=['i-3'])
+    assert_equal(response['Reservations'][0]['Instances'][0]['InstanceId'],
+                 'i-1')
+    assert_raises(LookupError, client.describe_instances)
+    assert_equal(scheduler.state('ec2')['active'], 0)
+
+@with_setup(use_temp_dir, remove_temp_dir)
+def test_replay_error():
+    from botocore.exceptions import ClientError
+    cassette.replay(write_cassette('c.jsonl', [{
+        'service': 'ec2', 'operation': 'DescribeImages', 'params': {},
+        'status': 400, 'response': {'Error': {
+            'Code': 'RequestLimitExceeded', 'Message': 'Slow down'}},
+        'seconds': 0.1}]))
+    client = clients.client('ec2', 'us-east-1')
+    with assert_raises(ClientError) as raised:
+        client.describe_images()
+    assert_equal(raised.exception.response['Error']['Code'],
+                 'RequestLimitExceeded')
+
+@with_setup(use_temp_dir, remove_temp_dir)
+def test_record():
+    from botocore.stub import Stubber
+    cassette_path = path.join(directory, 'c.jsonl')
+    cassette.record(cassette_path)
+    client = clients.client('ec2', 'us-east-1')
+    launched = datetime.datetime(2017, 6, 12, 9, 41, 7)
+    with Stubber(client) as stubber:
+        stubber.add_response('describe_instances', {'Reservations': [
+            {'Instances': [{'InstanceId': 'i-1', 'LaunchTime': launched}]}]},
+            {'InstanceIds': ['i-1']})
+        client.describe_instances(InstanceIds=['i-1'])
+    cassette.stop()
+    with open(cassette_path) as f:
+        interaction = json.loads(f.readline())
+    assert_equal(interaction['operation'], 'DescribeInstances')
+    assert_equal(interaction['params'], {'InstanceIds': ['i-1']})
+    assert_equal(interaction['response']['Reservations'][0]['Instances'],
+                 [{'InstanceId': 'i-1', 'LaunchTime': launched.isoformat()}])
+
+@with_setup(use_temp_dir, remove_temp_dir)
+def test_slack_post():
+    class Session(object):
+        def post(self, url, **kwargs):
+            return cassette.Response(200, 'ok', {})
+
+    cassette_path = path.join(directory, 'c.jsonl')
+    cassette.record(cassette_path)
+    cassette.post(Session(), 'https://hooks.slack.com/x', data='{}')
+    cassette.replay(cassette_path, latency_factor=0.01)
+    r = cassette.post(None, 'https://hooks.slack.com/x', data='{}')
+    assert_equal((r.status_code, r.content), (200, 'ok'))
+
+def test_from_environment():
+    cassette.from_environment({'SAW_REPLAY': path.join(
+        path.dirname(path.abspath(__file__)), 'cassettes', 'inventory.jsonl'),
+        'SAW_REPLAY_LATENCY': '0.5'})
+    try:
+        assert_equal((cassette.mode, cassette.latency), ('replay', 0.5))
+    finally:
+        cassette.stop()
+    cassette.from_environment({})
+    assert_is_none(cassette.mode)
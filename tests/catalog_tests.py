@@ -0,0 +1,62 @@
+import sys
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+import shutil
+import tempfile
+from nose.tools import *
+
+from saw import catalog, clients
+
+def instance_type(name, vcpus, mib, current=True):
+    return {'InstanceType': name, 'CurrentGeneration': current,
+            'VCpuInfo': {'DefaultVCpus': vcpus},
+            'MemoryInfo': {'SizeInMiB': mib},
+            'ProcessorInfo': {'SupportedArchitectures': ['x86_64']}}
+
+class EC2(object):
+    def can_paginate(self, operation):
+        return False
+
+    def describe_instance_types(self):
+        return {'InstanceTypes': [instance_type('r5.xlarge', 4, 32768),
+                                  instance_type('m4.2xlarge', 8, 32768,
+                                                current=False),
+                                  instance_type('t2.medium', 2, 4096),
+                                  instance_type('m5.2xlarge', 8, 32768)]}
+
+def use_temp_dir():
+    catalog.CATALOG_DIR = tempfile.mkdtemp()
+    catalog.catalogs.clear()
+    clients.registry[('client', 'ec2', 'test-1', None)] = EC2()
+
+def remove_temp_dir():
+    shutil.rmtree(catalog.CATALOG_DIR)
+    catalog.catalogs.clear()
+    clients.registry.pop(('client', 'ec2', 'test-1', None), None)
+
+def test_spec():
+    details = instance_type('c5d.large', 2, 4096)
+    details.update(InstanceStorageSupported=True,
+                   InstanceStorageInfo={'TotalSizeInGB': 50})
+    s = catalog.spec(details)
+    assert_equal((s.name, s.vcpus, s.memory, s.storage, s.architectures),
+                 ('c5d.large', 2, 4096, '50', 'x86_64'))
+    assert_equal(catalog.row(catalog.spec(instance_type('t3.nano', 2, 512))),
+                 ['t3.nano', '2', '0.5', 'EBS', '', '', 'x86_64'])
+
+@with_setup(use_temp_dir, remove_temp_dir)
+def test_lookup():
+    assert_is_none(catalog.lookup('t2.medium', 'test-1'))
+    assert_equal(catalog.refresh('test-1'), 4)
+    for name in ['m4.2xlarge', 'm5.2xlarge', 'r5.xlarge', 't2.medium']:
+        assert_equal(catalog.lookup(name, 'test-1').name, name)
+    assert_is_none(catalog.lookup('x1.32xlarge', 'test-1'))
+
+@with_setup(use_temp_dir, remove_temp_dir)
+def test_query():
+    catalog.refresh('test-1')
+    assert_equal(catalog.smallest(8, 32, 'test-1').name, 'm5.2xlarge')
+    assert_equal([s.name for s in catalog.query(4, 16, 'test-1')],
+                 ['r5.xlarge', 'm5.2xlarge', 'm4.2xlarge'])
+    assert_is_none(catalog.smallest(16, 0, 'test-1'))
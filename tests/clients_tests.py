@@ -0,0 +1,14 @@
+import sys
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+from nose.tools import *
+
+from saw import clients
+
+def test_client_reused():
+    a = clients.client('ec2', 'ap-south-1')
+    assert_is(clients.client('ec2', 'ap-south-1'), a)
+    assert_is_not(clients.client('ec2', 'eu-west-1'), a)
+    assert_equal(a.meta.config.max_pool_connections,
+                 clients.config['clients']['max_pool_connections'])
@@ -0,0 +1,111 @@
+import sys
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+from StringIO import StringIO
+from nose.tools import *
+
+from saw import daemon, cache, clients, resolver
+
+def test_forwarded():
+    assert_true(daemon.forwarded(['instances', 'filter', '--name=web']))
+    assert_true(daemon.forwarded(['images', '--output', 'csv']))
+    assert_false(daemon.forwarded(['instances', '--watch']))
+    assert_false(daemon.forwarded(['images', 'prune', '--dry-run']))
+    assert_false(daemon.forwarded(['instances', '--trace-json=calls.json']))
+    assert_false(daemon.forwarded(['launch', '--name', 'web']))
+    assert_false(daemon.forwarded([]))
+
+def test_run():
+    def command(argv):
+        print ' '.join(argv)
+        sys.stdout.flush()
+        print 'done'
+        sys.exit('failed')
+    resolver.add('image', 'ami-1', 'golden')
+    frames = []
+    daemon.run(command, ['instances', 'filter'], frames.append)
+    assert_equal(frames, [{'stdout': 'instances filter\n'},
+                          {'stdout': 'done\n'}, {'stderr': 'failed\n'},
+                          {'status': 1}])
+    assert_equal(resolver.index['image']['ids'], {})
+
+def test_run_in_chunks():
+    def command(argv):
+        for i in range(4):
+            print 'row'
+    frames = []
+    chunk = daemon.config['daemon']['chunk']
+    daemon.config['daemon']['chunk'] = 8
+    try:
+        daemon.run(command, ['instances'], frames.append)
+    finally:
+        daemon.config['daemon']['chunk'] = chunk
+    assert_equal(frames, [{'stdout': 'row\nrow\n'}, {'stdout': 'row\nrow\n'},
+                          {'status': 0}])
+
+def test_serve_and_forward():
+    directory = tempfile.mkdtemp()
+    socket_path = os.path.join(directory, 'saw.sock')
+    received = []
+
+    def command(argv):
+        received.append(argv)
+        print 'listing'
+
+    stdout = sys.stdout
+    server = threading.Thread(target=daemon.serve,
+                              args=(command, socket_path))
+    server.daemon = True
+    # No region needed
+    key = ('client', 'ec2', None, daemon.config['clients']['profile'])
+    fake = key not in clients.registry
+    clients.registry.setdefault(key, object())
+    try:
+        server.start()
+        while not os.path.exists(socket_path):
+            time.sleep(0.01)
+        assert_is_none(daemon.forward(['launch'], socket_path))
+        assert_equal(daemon.forward(['instances'], socket_path), 0)
+    finally:
+        sys.stdout = stdout
+        cache.memory = None
+        if fake:
+            clients.registry.pop(key)
+        shutil.rmtree(directory)
+    assert_equal(received, [['instances']])
+    # Without a daemon, commands run in process
+    assert_is_none(daemon.forward(['instances'], socket_path))
+
+def test_forward_cut_short():
+    directory = tempfile.mkdtemp()
+    socket_path = os.path.join(directory, 'saw.sock')
+    server = daemon.listen(socket_path)
+
+    def answer():
+        connection, _ = server.accept()
+        connection.makefile('rb').readline()
+        connection.sendall('{"stdout": "listing\\n"}\n')
+        connection.close()
+
+    thread = threading.Thread(target=answer)
+    thread.start()
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = StringIO(), StringIO()
+    try:
+        status = daemon.forward(['instances'], socket_path)
+        out, err = sys.stdout.getvalue(), sys.stderr.getvalue()
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+        thread.join()
+        server.close()
+        shutil.rmtree(directory)
+    # The listing is printed already, so it doesn't run again in process
+    assert_equal(status, 1)
+    assert_equal(out, 'listing\n')
+    assert_equal(err, 'The daemon stopped answering\n')
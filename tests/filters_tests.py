@@ -0,0 +1,67 @@
+import sys
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+from nose.tools import *
+
+from saw import filters
+
+
+def test_parse():
+    terms = filters.parse(
+        'tag:Team=data AND state IN (running, stopped) and type~m5.*')
+    assert_equal(terms, [
+        filters.Term('tag:Team', '=', ['data']),
+        filters.Term('state', 'in', ['running', 'stopped']),
+        filters.Term('type', '~', ['m5.*'])
+    ])
+
+def test_parse_invalid():
+    assert_raises(ValueError, filters.parse, 'state=running OR state=stopped')
+    assert_raises(ValueError, filters.parse, 'state running')
+
+def test_compile_query():
+    query = filters.compile_query(
+        'tag:Team=data AND state IN (running,stopped) AND type~m5.* '
+        'AND name!=web AND key~(dev|prod)', 'instance')
+    assert_equal(query.filters, [
+        {'Name': 'tag:Team', 'Values': ['data']},
+        {'Name': 'instance-state-name', 'Values': ['running', 'stopped']},
+        {'Name': 'instance-type', 'Values': ['m5*']}
+    ])
+    assert_equal([t.field for t in query.client], ['name', 'key'])
+
+def test_compile_query_given_terms():
+    query = filters.compile_query(
+        'tag:Team=a*', 'image', [filters.Term('name', 'in', ['BACKUP_*'])])
+    assert_equal(query.filters, [
+        {'Name': 'name', 'Values': ['BACKUP_*']},
+        {'Name': 'tag:Team', 'Values': ['a\\*']}
+    ])
+
+def test_compile_query_unknown_field():
+    assert_raises(ValueError, filters.compile_query, 'color=red', 'image')
+
+def test_predicate():
+    query = filters.compile_query('state=running AND state!=stopped '
+                                  'AND tag:Team NOT IN (ops)', 'instance')
+    match = filters.predicate(query)
+    assert_true(match({'State': {'Name': 'running'},
+                       'Tags': [{'Key': 'Team', 'Value': 'data'}]}))
+    assert_false(match({'State': {'Name': 'running'},
+                        'Tags': [{'Key': 'Team', 'Value': 'ops'}]}))
+    assert_is_none(filters.predicate(
+        filters.compile_query('state=running', 'instance')))
+
+def test_to_wildcard():
+    assert_equal(filters.to_wildcard(r'web-\d'), None)
+    assert_equal(filters.to_wildcard(r'BACKUP_.*_1\.0'), 'BACKUP_*_1.0')
+
+def test_from_wildcard():
+    assert_true(filters.wildcards('BACKUP_*'))
+    assert_false(filters.wildcards('BACKUP_\\*'))
+    assert_true(filters.from_wildcard('t2*').match('t2.micro'))
+    assert_true(filters.from_wildcard('web-?').match('web-1'))
+    assert_false(filters.from_wildcard('web-?').match('web-10'))
+    assert_true(filters.from_wildcard('a\\*b').match('a*b'))
+    assert_false(filters.from_wildcard('a\\*b').match('axb'))
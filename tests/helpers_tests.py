@@ -1,15 +1,15 @@
 import sys
+import time
+import threading
 from os import path
 sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
 
-import boto3
 from nose.tools import *
 
-from saw import helpers
+from saw import helpers, clients, cassette
 
-instance_id = ''
-ec2 = boto3.resource('ec2')
-instance = ec2.Instance(instance_id)
+CASSETTE = path.join(path.dirname(path.abspath(__file__)), 'cassettes',
+                     'inventory.jsonl')
 
 def test_generate_pm2_config():
     helpers.generate_pm2_config({'host': '192.168.0.1'})
@@ -17,7 +17,10 @@ def test_generate_pm2_config():
 def test_confirm_launch():
     assert_true(helpers.confirm_launch())
 
+@with_setup(lambda: cassette.replay(CASSETTE), cassette.stop)
 def test_compose_public_dns_name():
+    ec2 = clients.resource('ec2', 'ap-south-1')
+    instance = ec2.Instance('i-0a1b2c3d4e5f60718')
     fn_dns_name = helpers.compose_public_dns_name(instance)
     fn_region = fn_dns_name.split('.')[1]
     fn_ip = '.'.join(fn_dns_name.split('.')[0].split('-')[1:])
@@ -30,3 +33,41 @@ def test_compose_public_dns_name():
     assert_equal(fn_region, region)
     assert_equal(fn_ip, ip)
 
+
+def test_fan_out():
+    def pages(n):
+        for i in range(n):
+            yield i
+    results = sorted(helpers.fan_out([1, 2, 3], pages, max_workers=2))
+    assert_equal(results, [(1, 0), (2, 0), (2, 1), (3, 0), (3, 1), (3, 2)])
+
+@raises(ValueError)
+def test_fan_out_raises():
+    def fail(item):
+        raise ValueError(item)
+        yield
+    list(helpers.fan_out(['a'], fail))
+
+def test_fan_out_closed_early():
+    def endless(item):
+        while True:
+            yield item
+    before = threading.active_count()
+    results = helpers.fan_out([1, 2], endless, max_workers=2)
+    next(results)
+    results.close()
+    for _ in range(50):
+        if threading.active_count() == before:
+            break
+        time.sleep(0.1)
+    assert_equal(threading.active_count(), before)
+
+def test_generate_filters():
+    query = helpers.generate_filters({'instances': True, 'filter': True,
+                                      '--name': ['web'], '--user': 'dev',
+                                      '--where': 'type~t2.*'})
+    assert_equal(query.filters, [
+        {'Name': 'tag:Name', 'Values': ['web']},
+        {'Name': 'tag:User', 'Values': ['dev']},
+        {'Name': 'instance-type', 'Values': ['t2*']}
+    ])
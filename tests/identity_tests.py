@@ -0,0 +1,68 @@
+import sys
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+import os
+import shutil
+import tempfile
+from nose.tools import *
+
+from saw import clients, identity
+
+class STS(object):
+    calls = 0
+
+    def get_caller_identity(self):
+        STS.calls += 1
+        return {'Account': '123456789012', 'UserId': 'AROA:alice@corp.com',
+                'Arn': 'arn:aws:sts::123456789012:assumed-role/'
+                       'AWSReservedSSO_Admin/alice@corp.com'}
+
+def use_temp_dir():
+    identity.IDENTITY_DIR = tempfile.mkdtemp()
+    identity.identities.clear()
+    clients.registry[('client', 'sts', None, 'ci')] = STS()
+    clients.accounts['ci'] = 'ci:AKIAEXAMPLE1'
+    STS.calls = 0
+
+def remove_temp_dir():
+    shutil.rmtree(identity.IDENTITY_DIR)
+    identity.identities.clear()
+    clients.registry.pop(('client', 'sts', None, 'ci'), None)
+    clients.accounts.pop('ci', None)
+
+def test_username_from_arn():
+    assert_equal(identity.username_from_arn(
+        'arn:aws:iam::123456789012:user/ops/bob'), 'bob')
+    assert_equal(identity.username_from_arn(
+        'arn:aws:sts::123456789012:assumed-role/Deploy/ci-runner'),
+        'ci-runner')
+    assert_equal(identity.username_from_arn(
+        'arn:aws:sts::123456789012:federated-user/carol'), 'carol')
+    assert_equal(identity.username_from_arn(
+        'arn:aws:iam::123456789012:root'), 'root')
+
+@with_setup(use_temp_dir, remove_temp_dir)
+def test_caller_is_cached_on_disk():
+    assert_equal(identity.username('ci'), 'alice')
+    identity.identities.clear()
+    assert_equal(identity.caller('ci')['Account'], '123456789012')
+    assert_equal(STS.calls, 1)
+
+@with_setup(use_temp_dir, remove_temp_dir)
+def test_stale_caller_is_looked_up_again():
+    identity.username('ci')
+    identity.identities.clear()
+    os.utime(identity.identity_path('ci:AKIAEXAMPLE1'), (0, 0))
+    identity.username('ci')
+    assert_equal(STS.calls, 2)
+
+@with_setup(use_temp_dir, remove_temp_dir)
+def test_other_credentials_are_looked_up_again():
+    identity.username('ci')
+    clients.accounts['ci'] = 'ci:AKIAEXAMPLE2'
+    identity.username('ci')
+    assert_equal(STS.calls, 2)
+    clients.accounts['ci'] = 'ci:AKIAEXAMPLE1'
+    identity.username('ci')
+    assert_equal(STS.calls, 2)
@@ -0,0 +1,24 @@
+import sys
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+import json
+from StringIO import StringIO
+from nose.tools import *
+
+from saw import output
+
+header = ['InstanceId', 'State']
+pages = [[['i-1', 'running']], [], [['i-2', 'stopped']]]
+
+def test_jsonl():
+    stream = StringIO()
+    assert_equal(output.write(header, iter(pages), 'jsonl', stream), 2)
+    records = [json.loads(l) for l in stream.getvalue().splitlines()]
+    assert_equal(records[1], {'InstanceId': 'i-2', 'State': 'stopped'})
+
+def test_tsv():
+    stream = StringIO()
+    output.write(header, iter(pages), 'tsv', stream)
+    assert_equal(stream.getvalue(),
+                 'InstanceId\tState\ni-1\trunning\ni-2\tstopped\n')
@@ -0,0 +1,28 @@
+import sys
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+import datetime
+from nose.tools import *
+
+from saw import records
+
+
+def test_project():
+    instances = [{'InstanceId': 'i-1', 'State': {'Name': 'running'},
+                  'Tags': [{'Key': 'Name', 'Value': 'web'},
+                           {'Key': 'User', 'Value': 'dev'}],
+                  'LaunchTime': datetime.datetime(2017, 1, 1),
+                  'BlockDeviceMappings': [{'DeviceName': '/dev/sda1'}]}]
+    rows = records.project(instances, ['Name', 'InstanceId', 'State',
+                                       'Tags', 'PublicIpAddress'])
+    assert_equal(rows[0], ('web', 'i-1', 'running',
+                           'Name = web, User = dev', ''))
+    assert_equal(rows[0].State, 'running')
+
+def test_project_with_region():
+    rows = records.project([{'ImageId': 'ami-1', 'Name': 'backup'}],
+                           ['Name', 'ImageId'], 'us-east-1')
+    assert_equal(rows[0], ('us-east-1', 'backup', 'ami-1'))
+    assert_is(type(rows[0]),
+              records.record_type(['Region', 'Name', 'ImageId']))
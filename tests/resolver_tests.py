@@ -0,0 +1,57 @@
+import sys
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+from nose.tools import *
+
+from saw import resolver
+
+def reset_index():
+    for entries in resolver.index.values():
+        entries['ids'].clear()
+        entries['names'].clear()
+
+def test_tag_name():
+    tags = [{'Key': 'User', 'Value': 'aayush'},
+            {'Key': 'Name', 'Value': 'web'}]
+    assert_equal(resolver.tag_name(tags), 'web')
+    assert_is_none(resolver.tag_name(None))
+
+@with_setup(reset_index)
+def test_resolve_batches_and_memoizes():
+    calls = []
+    def describe(filters):
+        calls.append(filters)
+        resolver.add_instances([
+            {'InstanceId': 'i-1', 'Tags': [{'Key': 'Name', 'Value': 'a'}]},
+            {'InstanceId': 'i-2', 'Tags': [{'Key': 'Name', 'Value': 'b'}]}])
+
+    entries = resolver.resolve('instance', ['a', 'b', 'c'], 'ids',
+                               describe, 'tag:Name')
+    assert_equal(calls, [[{'Name': 'tag:Name', 'Values': ['a', 'b', 'c']}]])
+    assert_equal(entries['a'], ['i-1'])
+    assert_equal(entries['c'], [])
+
+    resolver.resolve('instance', ['a', 'c'], 'ids', describe, 'tag:Name')
+    resolver.resolve('instance', ['i-2'], 'names', describe, 'instance-id')
+    assert_equal(len(calls), 1)
+    assert_equal(resolver.index['instance']['names']['i-2'], 'b')
+
+@with_setup(reset_index)
+def test_resolve_wildcards():
+    calls = []
+    def describe(filters):
+        calls.append(filters)
+        resolver.add_images([{'ImageId': 'ami-1', 'Name': 'foo1'},
+                             {'ImageId': 'ami-2', 'Name': 'foo2'}])
+
+    assert_equal(resolver.resolve('image', ['foo*'], 'ids', describe,
+                                  'name'), {'foo*': ['ami-1', 'ami-2']})
+    entries = resolver.resolve('image', ['foo?', 'foo1'], 'ids', describe,
+                               'name')
+    assert_equal(entries, {'foo?': ['ami-1', 'ami-2'], 'foo1': ['ami-1']})
+    # Patterns are looked up every time, never as misses
+    assert_equal(calls[1], [{'Name': 'name', 'Values': ['foo?']}])
+    assert_not_in('foo*', resolver.index['image']['ids'])
+    assert_equal(resolver.resolve('image', ['foo\\*'], 'ids', describe,
+                                  'name'), {'foo\\*': []})
@@ -0,0 +1,109 @@
+import sys
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+from nose.tools import *
+
+from saw import clients, retention
+
+DAY = 86400
+NOW = 1500000000
+
+def image(n, name):
+    mappings = [{'Ebs': {'SnapshotId': 'snap-{}'.format(n)}},
+                {'VirtualName': 'ephemeral0'}]
+    return {'ImageId': 'ami-{}'.format(n), 'Name': name,
+            'BlockDeviceMappings': mappings}
+
+def test_parse():
+    b = retention.parse(image(1, 'BACKUP_web_prod_DEV_1500000000'),
+                        sources={'web_prod'})
+    assert_equal((b.source, b.user, b.time), ('web_prod', 'DEV', NOW))
+    b = retention.parse(image(1, 'BACKUP_web_prod_DEV_1500000000'),
+                        sources={'web_prod_DEV'})
+    assert_equal((b.source, b.user), ('web_prod_DEV', ''))
+    b = retention.parse(image(1, 'BACKUP_web_prod_DEV_1500000000'))
+    assert_equal((b.source, b.time), (None, NOW))
+    b = retention.parse(image(2, 'BACKUP_web_1_1500000000'))
+    assert_equal((b.source, b.user), ('web_1', ''))
+    b = retention.parse(image(3, 'NIGHTLY_db_1500000000'), 'NIGHTLY')
+    assert_equal(b.source, 'db')
+    assert_is_none(retention.parse(image(4, 'BACKUP_web')))
+    assert_is_none(retention.parse(image(5, 'golden-1500000000')))
+
+def test_retain():
+    backups = [retention.parse(image(n, 'BACKUP_web_{}'.format(
+                   NOW - n * DAY))) for n in range(0, 60, 2)]
+    kept = retention.retain(backups, keep=2, now=NOW)
+    assert_equal(sorted(kept), ['ami-0', 'ami-2'])
+    kept = retention.retain(backups, keep=0, days=5, now=NOW)
+    assert_equal(sorted(kept), ['ami-0', 'ami-2', 'ami-4'])
+    # 2017-07-14 is a Friday
+    kept = retention.retain(backups, keep=0, daily=2, weekly=3, monthly=2,
+                            now=NOW)
+    assert_equal(kept['ami-0'], ['daily', 'weekly', 'monthly'])
+    assert_equal(kept['ami-2'], ['daily'])
+    assert_equal(kept['ami-6'], ['weekly'])
+    assert_equal(kept['ami-14'], ['monthly'])
+    assert_equal(len(kept), 5)
+
+def test_plan():
+    images = [image(1, 'BACKUP_web_1500000000'),
+              image(2, 'BACKUP_web_DEV_1400000000'),
+              image(3, 'BACKUP_db_1300000000'),
+              image(4, 'golden')]
+    decisions = retention.plan(images, sources={'web'}, keep=1, now=NOW)
+    assert_equal([(b.image['ImageId'], bool(kept)) for b, kept in decisions],
+                 [('ami-3', True), ('ami-1', True), ('ami-2', False)])
+
+def test_plan_ambiguous_names():
+    # api_V2 may be an instance, or api's backup published by V2
+    images = [image(1, 'BACKUP_api_1500000000'),
+              image(2, 'BACKUP_api_V2_1500000100'),
+              image(3, 'BACKUP_api_V2_1400000000')]
+    assert_equal(retention.candidates(images), ['api', 'api_V2'])
+    for sources in ({'api', 'api_V2'}, set()):
+        decisions = retention.plan(images, sources=sources, keep=1, now=NOW)
+        assert_equal([(b.image['ImageId'], kept) for b, kept in decisions],
+                     [('ami-1', ['last 1']),
+                      ('ami-2', [retention.AMBIGUOUS]),
+                      ('ami-3', [retention.AMBIGUOUS])])
+    decisions = retention.plan(images, sources={'api', 'db'}, keep=1,
+                               now=NOW)
+    assert_equal([(b.image['ImageId'], bool(kept)) for b, kept in decisions],
+                 [('ami-2', True), ('ami-1', False), ('ami-3', False)])
+    # api was removed, and V2 is a known user
+    decisions = retention.plan([image(2, 'BACKUP_api_V2_1500000100'),
+                                image(3, 'BACKUP_api_V2_1400000000')],
+                               sources=set(), users={'V2'}, keep=1, now=NOW)
+    assert_equal([(b.source, b.user, b.image['ImageId'], bool(kept))
+                  for b, kept in decisions],
+                 [('api', 'V2', 'ami-2', True), ('api', 'V2', 'ami-3', False)])
+    decisions = retention.plan(images, sources={'api_V2'}, keep=1, now=NOW)
+    assert_equal([(b.source, b.image['ImageId'], bool(kept))
+                  for b, kept in decisions],
+                 [('api', 'ami-1', True), ('api_V2', 'ami-2', True),
+                  ('api_V2', 'ami-3', False)])
+
+class EC2(object):
+    def __init__(self):
+        self.calls = []
+
+    def deregister_image(self, ImageId):
+        self.calls.append(ImageId)
+
+    def delete_snapshot(self, SnapshotId):
+        self.calls.append(SnapshotId)
+
+def test_prune():
+    ec2 = EC2()
+    clients.registry[('client', 'ec2', None, None)] = ec2
+    try:
+        results = retention.prune([image(1, 'BACKUP_web_1'),
+                                   image(2, 'BACKUP_web_2')])
+    finally:
+        clients.registry.pop(('client', 'ec2', None, None))
+    assert_equal([(r['ImageId'], r['Snapshots'], r['State'])
+                  for r in results],
+                 [('ami-1', 1, 'deleted'), ('ami-2', 1, 'deleted')])
+    assert_less(ec2.calls.index('ami-1'), ec2.calls.index('snap-1'))
@@ -3,6 +3,9 @@ from os import path
 sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
 
 import json
+import shutil
+import tempfile
+import StringIO
 import boto3
 from nose.tools import *
 
@@ -14,3 +17,92 @@ def test_launch_instance():
     if helpers.confirm_launch():
         i = saw.launch_instances({'--name': 'TESTS'})
         tabularize.instances(i)
+
+def test_help_skips_heavy_imports():
+    import subprocess
+    script = ("import sys; from saw import saw; "
+              "print [m for m in ('boto3', 'requests', 'terminaltables') "
+              "if m in sys.modules]")
+    root = path.dirname(path.dirname(path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, '-c', script],
+                                     cwd=root)
+    assert_equal(output.strip(), '[]')
+
+def test_launch_configs():
+    configs = saw.launch_configs(['web', 'db', 'web'], 'dev', 'ami-1')
+    assert_equal(configs.keys(), ['web', 'db'])
+    assert_equal(configs['web']['MaxCount'], 2)
+    assert_equal(configs['db']['MaxCount'], 1)
+    assert_equal(configs['web']['ImageId'], 'ami-1')
+    assert_equal(configs['db']['TagSpecifications'][0]['Tags'],
+                 [{'Key': 'Name', 'Value': 'db'},
+                  {'Key': 'User', 'Value': 'dev'}])
+    assert_not_equal(saw.config['launch'].get('ImageId'), 'ami-1')
+
+def test_parse_args():
+    args = saw.parse_args(['images', 'prune', '--keep', '3', '--dry-run'])
+    assert_true(args['prune'] and args['--dry-run'])
+    assert_equal(args['--keep'], '3')
+    assert_not_in('launch', args)
+    assert_in('saw launch', saw.command_usage('nonsense'))
+    assert_not_in('saw launch', saw.command_usage('images'))
+    args = saw.parse_args(['instances', 'filter', '--name', 'web'])
+    assert_equal(args['--name'], ['web'])
+    assert_equal(saw.parse_args(['backup', '--all-running'])['--name'], [])
+
+class EC2(object):
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.instances = []
+
+    def run_instances(self, **kwargs):
+        name = kwargs['TagSpecifications'][0]['Tags'][0]['Value']
+        if name in self.failing:
+            raise RuntimeError('Cannot launch ' + name)
+        launched = [{'InstanceId': 'i-{}{}'.format(name, n),
+                     'State': {'Name': 'running'}}
+                    for n in range(kwargs['MaxCount'])]
+        self.instances.extend(launched)
+        return {'Instances': launched}
+
+    def can_paginate(self, operation):
+        return False
+
+    def describe_instances(self, Filters):
+        return {'Reservations': [{'Instances': [
+            i for i in self.instances
+            if i['InstanceId'] in Filters[0]['Values']]}]}
+
+def start_instances(ec2, names):
+    key = ('client', 'ec2', None, saw.config['clients']['profile'])
+    delay = saw.config['waiter']['delay']
+    cache_dir = saw.cache.CACHE_DIR
+    saw.clients.registry[key] = ec2
+    saw.config['waiter']['delay'] = 0.01
+    # Launches invalidate the cache: keep the developer's one
+    saw.cache.CACHE_DIR = tempfile.mkdtemp()
+    try:
+        return saw.start_instances(saw.launch_configs(names, 'dev', 'ami-1'))
+    finally:
+        shutil.rmtree(saw.cache.CACHE_DIR)
+        saw.cache.CACHE_DIR = cache_dir
+        saw.config['waiter']['delay'] = delay
+        saw.clients.registry.pop(key)
+
+def test_start_instances():
+    launched = start_instances(EC2(), ['web', 'db', 'web'])
+    assert_equal(launched.kind, 'instance')
+    assert_equal([i['InstanceId'] for i in launched.resources],
+                 ['i-web0', 'i-web1', 'i-db0'])
+
+def test_start_instances_reports_launched():
+    ec2 = EC2(failing=['db'])
+    stdout = sys.stdout
+    sys.stdout = StringIO.StringIO()
+    try:
+        assert_raises(RuntimeError, start_instances, ec2, ['web', 'db'])
+        printed = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+    assert_in('Launched web: i-web0', printed)
+    assert_in('Launching db failed.', printed)
@@ -0,0 +1,58 @@
+import sys
+import time
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+from nose.tools import *
+
+from saw import scheduler
+
+def test_token_bucket():
+    acquire = scheduler.token_bucket(rate=100, burst=5)
+    start = time.time()
+    for _ in range(5):
+        acquire()
+    assert_less(time.time() - start, 0.02)
+    for _ in range(5):
+        acquire()
+    assert_greater_equal(time.time() - start, 0.04)
+
+def test_category():
+    assert_equal(scheduler.category('ec2', 'DescribeInstances'), 'describe')
+    assert_equal(scheduler.category('sts', 'GetCallerIdentity'), 'describe')
+    assert_equal(scheduler.category('ec2', 'RunInstances'), 'mutating')
+    assert_equal(scheduler.category('slack', 'post'), 'slack')
+
+def test_concurrency():
+    scheduler.services.pop('test', None)
+    s = scheduler.state('test')
+    s['limit'] = 4.0
+    tickets = [scheduler.acquire('test', 'DescribeTest') for _ in range(4)]
+    scheduler.throttled(tickets[0])
+    scheduler.throttled(tickets[0])
+    assert_equal(s['limit'], 2.0)
+    for ticket in tickets:
+        scheduler.release(ticket)
+    # Three calls went through, adding a slot over two rounds
+    assert_greater(s['limit'], 3.0)
+    assert_less(s['limit'], 4.0)
+    assert_equal(scheduler.metrics()[-1][:3], ['test', 4, 2])
+    scheduler.services.pop('test')
+
+def test_slot_freed_when_handler_raises():
+    import boto3
+    session = boto3.Session(region_name='us-east-1',
+                            aws_access_key_id='test',
+                            aws_secret_access_key='test')
+    scheduler.install(session)
+
+    def fail(**kwargs):
+        raise LookupError('no answer')
+    session.events.register('before-call.ec2.DescribeRegions', fail)
+    ec2 = session.client('ec2')
+    s = scheduler.state('ec2')
+    calls = s['calls']
+    for _ in range(3):
+        assert_raises(LookupError, ec2.describe_regions)
+    assert_equal(s['active'], 0)
+    assert_equal(s['calls'], calls + 3)
@@ -3,21 +3,43 @@ from os import path
 sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
 
 import json
-import boto3
 from nose.tools import *
 
-from saw import slack, helpers, tabularize
+from saw import slack, helpers, tabularize, snapshot, clients, cassette
 
+CASSETTE = path.join(path.dirname(path.abspath(__file__)), 'cassettes',
+                     'inventory.jsonl')
+
+@with_setup(lambda: cassette.replay(CASSETTE), cassette.stop)
 def test_parse():
-    ec2 = boto3.resource('ec2')
+    ec2 = clients.resource('ec2', 'ap-south-1')
     instances = ec2.instances.filter(Filters=[{
                                         'Name': 'tag-value',
                                         'Values': ['MYTAG']
                                     }])
     # tabularize.instances([i.instance_id for i in instances])
-    slack.parse(instances)
+    slack.parse(snapshot.instances(i.meta.data for i in instances))
     # image = ec2.Image('<AMI ID>')
     # parsed = slack.parse(image)
     # print parsed
     # slack.post(parsed)
 
+
+def test_batch():
+    a = {'text': 'a'}
+    b = {'text': 'b'}
+    assert_equal(slack.batch([a]), a)
+    assert_equal(slack.batch([a, b])['attachments'], [a, b])
+
+def test_parse_snapshot():
+    data = snapshot.instances([{
+        'InstanceId': 'i-1',
+        'State': {'Name': 'running'},
+        'Tags': [{'Key': 'Name', 'Value': 'web'}]
+    }])
+    payloads = slack.parse(data)
+    assert_equal(len(payloads), 1)
+    values = dict((f['title'], f['value']) for f in payloads[0]['fields'])
+    assert_equal(values['Name'], 'web')
+    assert_equal(values['State'], 'running')
+    assert_equal(values['PublicIpAddress'], '')
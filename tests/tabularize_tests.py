@@ -2,10 +2,34 @@ import sys
 from os import path
 sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
 
-import boto3
+import shutil
+import tempfile
 from nose.tools import *
 
-from saw import tabularize
+from saw import tabularize, cassette, cache
+
+CASSETTE = path.join(path.dirname(path.abspath(__file__)), 'cassettes',
+                     'inventory.jsonl')
+
+saved = {}
+
+def replay():
+    # Listings go through the cache, so keep it out of ~/.saw and make
+    # every listing call the cassette
+    saved['dir'] = cache.CACHE_DIR
+    saved['mode'] = cache.config['cache'].get('mode')
+    cache.CACHE_DIR = tempfile.mkdtemp()
+    cache.config['cache']['mode'] = 'refresh'
+    cassette.replay(CASSETTE)
+
+def stop():
+    cassette.stop()
+    shutil.rmtree(cache.CACHE_DIR)
+    cache.CACHE_DIR = saved['dir']
+    if saved['mode'] is None:
+        cache.config['cache'].pop('mode')
+    else:
+        cache.config['cache']['mode'] = saved['mode']
 
 
 def test_tabularize():
@@ -14,8 +38,30 @@ def test_tabularize():
         ['John', '21']
     ])
 
+@with_setup(replay, stop)
 def test_images():
-    tabularize.images()
+    tabularize.images(regions=['ap-south-1'])
 
+@with_setup(replay, stop)
 def test_instances():
-    tabularize.instances()
+    tabularize.instances(regions=['ap-south-1'])
+
+def test_instance_rows():
+    pages = [
+        (None, {'Reservations': [{'Instances': [
+            {'InstanceId': 'i-1', 'State': {'Name': 'running'},
+             'Tags': [{'Key': 'Name', 'Value': 'web'}]}]}]}),
+        (None, {'Reservations': [{'Instances': [
+            {'InstanceId': 'i-2', 'State': {'Name': 'stopped'}}]}]})
+    ]
+    rows = list(tabularize.instance_rows(pages))
+    assert_equal(len(rows), 2)
+    assert_equal(rows[0][0][:2], ('web', 'i-1'))
+    assert_equal(rows[1][0][:2], ('', 'i-2'))
+
+def test_instance_rows_with_region():
+    pages = [('ap-south-1', {'Reservations': [{'Instances': [
+        {'InstanceId': 'i-1', 'State': {'Name': 'running'}}]}]})]
+    rows = list(tabularize.instance_rows(pages))
+    assert_equal(rows[0][0][:3], ('ap-south-1', '', 'i-1'))
+    assert_equal(rows[0][0].Region, 'ap-south-1')
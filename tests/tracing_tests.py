@@ -0,0 +1,44 @@
+import sys
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+from nose.tools import *
+
+from saw import tracing
+
+
+def reset():
+    tracing.enabled = False
+    del tracing.calls[:]
+
+class Request(object):
+    def __init__(self, context, body):
+        self.context = context
+        self.body = body
+
+@with_setup(reset, reset)
+def test_record_disabled():
+    tracing.record('ec2', 'DescribeInstances', 0)
+    assert_equal(tracing.calls, [])
+
+@with_setup(reset, reset)
+def test_throttled_call():
+    tracing.enable()
+    context = {}
+    tracing.started(context=context)
+    for status, code in [(503, 'RequestLimitExceeded'), (200, None)]:
+        tracing.request_created(Request(context, 'Action=RunInstances'))
+        tracing.response_received(
+            context=context,
+            response_dict={'status_code': status, 'body': 'x' * 512},
+            parsed_response={'Error': {'Code': code}} if code else {})
+    tracing.after_call(event_name='after-call.ec2.RunInstances',
+                       context=context, parsed={})
+
+    call = tracing.calls[0]
+    assert_equal((call.service, call.operation), ('ec2', 'RunInstances'))
+    assert_equal((call.retries, call.throttles), (1, 1))
+    assert_equal((call.sent, call.received), (38, 1024))
+    assert_is_none(call.error)
+    row = tracing.summary()[0]
+    assert_equal(row[:4], ['ec2', 'RunInstances', 1, 0])
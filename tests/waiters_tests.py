@@ -0,0 +1,69 @@
+import sys
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+import itertools
+from nose.tools import *
+
+from saw import waiters
+
+def test_backoff():
+    delays = list(itertools.islice(waiters.backoff(2, 10), 5))
+    for delay, limit in zip(delays, [2, 4, 8, 10, 10]):
+        assert_true(limit / 2.0 <= delay <= limit)
+
+class EC2(object):
+    """Images going through given states, one per describe call"""
+    def __init__(self, states):
+        self.states = states
+        self.ticks = 0
+
+    def can_paginate(self, operation):
+        return False
+
+    def describe_images(self, Filters):
+        self.ticks += 1
+        images = []
+        for image_id in Filters[0]['Values']:
+            states = self.states.get(image_id, [])
+            state = states[min(self.ticks, len(states)) - 1] if states else None
+            # None: not visible to the API yet
+            if state:
+                images.append({'ImageId': image_id, 'State': state})
+        return {'Images': images}
+
+def poll(ec2, ids, timeout=None):
+    key = ('client', 'ec2', None, waiters.config['clients']['profile'])
+    delay = waiters.config['waiter']['delay']
+    waiters.clients.registry[key] = ec2
+    waiters.config['waiter']['delay'] = 0.001
+    try:
+        for settled in waiters.poll('image', ids, timeout):
+            yield settled
+    finally:
+        waiters.config['waiter']['delay'] = delay
+        waiters.clients.registry.pop(key)
+
+def test_poll_times_out():
+    ec2 = EC2({'ami-1': ['pending'], 'ami-2': ['pending', 'available']})
+    settled = [(i, state) for i, state, _, _ in
+               poll(ec2, set(['ami-1', 'ami-2']), timeout=0.05)]
+    assert_equal(settled, [('ami-2', 'available'), ('ami-1', 'timed out')])
+
+def test_poll_ids_added_while_polling():
+    ec2 = EC2({'ami-1': ['available'], 'ami-2': ['pending', 'available']})
+    ids = set(['ami-1'])
+    settled = []
+    for i, state, _, image in poll(ec2, ids):
+        settled.append((i, state))
+        if i == 'ami-1':
+            ids.add('ami-2')
+    assert_equal(settled, [('ami-1', 'available'), ('ami-2', 'available')])
+
+def test_poll_invisible_ids_are_pending():
+    ec2 = EC2({'ami-1': [None, None, 'failed']})
+    settled = list(poll(ec2, set(['ami-1']), timeout=60))
+    assert_equal([(i, state) for i, state, _, _ in settled],
+                 [('ami-1', 'failed')])
+    assert_equal(settled[0][3], {'ImageId': 'ami-1', 'State': 'failed'})
+    assert_equal(ec2.ticks, 3)
@@ -0,0 +1,95 @@
+import sys
+from os import path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
+from StringIO import StringIO
+from nose.tools import *
+
+from saw import watch
+
+
+def instance(instance_id, state):
+    return {'InstanceId': instance_id, 'State': {'Name': state},
+            'Tags': [{'Key': 'Name', 'Value': 'web'}]}
+
+class Client(object):
+    """EC2 client serving fixed instances, counting calls"""
+
+    def __init__(self, instances):
+        self.instances = instances
+        self.calls = []
+
+    def describe_instance_status(self, InstanceIds, IncludeAllInstances):
+        self.calls.append(('status', InstanceIds))
+        return {'InstanceStatuses': [
+            {'InstanceId': i['InstanceId'], 'InstanceState': i['State']}
+            for i in self.instances if i['InstanceId'] in InstanceIds]}
+
+    def describe_instances(self, InstanceIds):
+        self.calls.append(('describe', InstanceIds))
+        return {'Reservations': [{'Instances': [
+            i for i in self.instances if i['InstanceId'] in InstanceIds]}]}
+
+def test_tick():
+    previous = watch.entries([instance('i-1', 'pending'),
+                              instance('i-2', 'running'),
+                              instance('i-3', 'stopping')])
+    client = Client([instance('i-1', 'running'), instance('i-2', 'running')])
+    changes = watch.tick(client, previous)
+
+    assert_equal(sorted((i, b.state, a and a.state) for i, b, a in changes),
+                 [('i-1', 'pending', 'running'), ('i-3', 'stopping', None)])
+    # Only the changed instance is described again
+    assert_equal(client.calls[1], ('describe', ['i-1']))
+    assert_equal(sorted(previous), ['i-1', 'i-2'])
+    assert_equal(watch.tick(client, previous), [])
+
+def test_render():
+    before = watch.entries([instance('i-1', 'pending')])['i-1']
+    after = watch.entries([instance('i-1', 'running')])['i-1']
+    stream = StringIO()
+    watch.render([('i-1', before, after)], stream=stream)
+    line = stream.getvalue()
+    assert_in('pending -> running', line)
+    assert_in('i-1', line)
+
+class Clock(object):
+    """Stands in for the time module, stopping after some sleeps"""
+    class Stop(Exception):
+        pass
+
+    def __init__(self, sleeps):
+        self.now = 0.0
+        self.sleeps = sleeps
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if not self.sleeps:
+            raise Clock.Stop()
+        self.sleeps -= 1
+        self.now += seconds
+
+    def strftime(self, fmt):
+        return '00:00:00'
+
+def test_watch_rescans_on_time():
+    clock = Clock(sleeps=20)
+    rescans = []
+    saved = watch.time, watch.scan, watch.tick, watch.clients.client
+    watch.time = clock
+    watch.scan = lambda *args: {}
+    watch.tick = lambda client, current, rescan, *args: rescans.append(
+        (clock.now, rescan)) or []
+    watch.clients.client = lambda service: None
+    try:
+        assert_raises(Clock.Stop, watch.watch)
+    finally:
+        watch.time, watch.scan, watch.tick, watch.clients.client = saved
+    # However long the backoff, listings are at most rescan_interval apart
+    times = [0.0] + [t for t, rescan in rescans if rescan]
+    interval = watch.config['watch']['rescan_interval']
+    assert_true(all(b - a <= interval + 1e-6
+                    for a, b in zip(times, times[1:])))
+    assert_greater(len(times), 5)